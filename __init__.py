@@ -1,5 +1,13 @@
 from flask import Flask
-from database import db
+from database import db, configure_sqlite
+from audio_cache import audio_cache
+from ingest import activity_ingest
+from scores import leaderboards, score_ingest
+from stats_cache import stats_cache
+from metrics import metrics
+from assets import assets
+import audio_warmup
+import rollups
 import os
 
 def create_app():
@@ -8,19 +16,60 @@ def create_app():
     # Database configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/learning_lab.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ECHO'] = True
+    # Statement logging is costly on the hot path; SQLALCHEMY_ECHO=1 turns it on
+    app.config['SQLALCHEMY_ECHO'] = os.environ.get('SQLALCHEMY_ECHO') == '1'
+    app.config['AUDIO_CACHE_DIR'] = os.environ.get('AUDIO_CACHE_DIR', os.path.join('instance', 'audio_cache'))
+    app.config['AUDIO_WARMUP_ON_START'] = os.environ.get('AUDIO_WARMUP_ON_START') == '1'
+    app.config['AUDIO_WARMUP_WORKERS'] = int(os.environ.get('AUDIO_WARMUP_WORKERS', 4))
+    # PROFILE_SLOW_REQUEST_MS=500 samples stacks of requests slower than 500 ms
+    app.config['PROFILE_SLOW_REQUEST_MS'] = float(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0))
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0))
+    # Shared directory where each worker process leaves its metrics for /metrics to sum
+    app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    app.config['METRICS_SNAPSHOT_SECONDS'] = float(os.environ.get('METRICS_SNAPSHOT_SECONDS', 5))
+    # Content-hashed, precompressed copies of static/ served from /assets
+    app.config['ASSETS_FINGERPRINT'] = os.environ.get('ASSETS_FINGERPRINT', '1') == '1'
+    app.config['ASSETS_DIR'] = os.path.join('instance', 'assets')
+    app.config['PROFILE_DIR'] = os.path.join('instance', 'profiles')
 
     # Initialize the database
     db.init_app(app)
+    configure_sqlite(app)
+
+    # Latency histograms, DB query timing and /metrics
+    metrics.init_app(app)
 
     # Make sure instance folder exists
     if not os.path.exists('instance'):
         os.makedirs('instance')
 
+    # Synthesized speech cache (memory LRU backed by instance/audio_cache)
+    audio_cache.init_app(app)
+
+    # Write-behind queue for /api/stats/ingest
+    activity_ingest.init_app(app)
+
+    # Per-user /api/stats payloads, refreshed by the write paths
+    stats_cache.init_app(app)
+
+    # Write-behind score log and in-memory top-K leaderboards
+    score_ingest.init_app(app)
+    leaderboards.init_app(app)
+
+    # Fingerprinted static assets, built at startup (or by `flask assets-build`)
+    assets.init_app(app)
+
     # Import routes after db initialization
-    from routes import register_routes
+    from routes import register_routes, warmup_texts
     register_routes(app)
 
+    # Pre-synthesized audio for spelling words and topic facts
+    audio_warmup.init_app(app, warmup_texts)
+
+    # `flask rollups-backfill` rebuilds daily_rollups from activity_events;
+    # `flask activities-backfill` first imports the old learning_stats history
+    rollups.init_app(app)
+
     # Create database tables
     with app.app_context():
         db.create_all()
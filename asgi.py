@@ -0,0 +1,22 @@
+"""One ASGI app serving both stacks.
+
+The FastAPI router (AI, speech, health checks) is mounted under /api/ai;
+every other path goes to the Flask app, which runs in a thread pool so a
+slow gTTS call ties up one thread instead of the whole server.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 3000 --workers 2
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI
+
+from run import app as flask_app
+from src.api.routes import router
+
+# Threads available to Flask per worker process
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 32))
+
+app = FastAPI(title="Learning Lab")
+app.include_router(router, prefix="/api/ai")
+app.mount("/", WSGIMiddleware(flask_app, workers=WSGI_THREADS))
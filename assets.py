@@ -0,0 +1,240 @@
+"""Fingerprinted, precompressed static assets.
+
+Every file under the static folder is copied to ASSETS_DIR under a
+content-hashed name (js/main.js -> js/main.1f2e3d4c5b6a.js), next to gzip
+and brotli (when the brotli package is installed) variants of text files.
+/assets/<name> serves the best encoding the client accepts with
+`Cache-Control: immutable`, so a browser never asks for the same bytes
+twice.
+
+HTML pages get their /static/... references rewritten to the hashed names
+and the manifest injected as window.ASSET_MANIFEST. main.js looks up
+scripts and views it loads at runtime in that manifest (assetUrl()). The
+pages themselves keep their names and are served with an ETag.
+
+The build runs at startup and skips files whose hashed copy already
+exists. `flask assets-build` runs it ahead of time and prunes stale copies.
+ASSETS_FINGERPRINT=0 serves /static as-is, e.g. while editing JS.
+"""
+from flask import Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 12
+COMPRESSIBLE = ('.js', '.css', '.html', '.json', '.svg', '.txt', '.xml', '.map')
+# Below this, compression doesn't pay for the extra header and lookup
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+_STATIC_REFERENCE = re.compile(r'''(?<=["'(])/static/([^"'()?#\s]+)''')
+_HEAD = re.compile(r'<head[^>]*>', re.IGNORECASE)
+
+
+def fingerprint(path, data):
+    """`dir/name.ext` -> `dir/name.<hash>.ext`"""
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+
+def compress(data):
+    """{encoding: bytes} for the variants worth serving"""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def accepted_encodings():
+    accepted = request.accept_encodings
+    return [encoding for encoding in ENCODINGS if accepted[encoding] > 0]
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetPipeline:
+    def __init__(self):
+        self.enabled = True
+        self.static_folder = None
+        self.directory = None
+        self.manifest = {}
+        self._pages = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSETS_FINGERPRINT', True)
+        self.static_folder = app.static_folder
+        self.directory = app.config.get('ASSETS_DIR', os.path.join('instance', 'assets'))
+        app.extensions['assets'] = self
+
+        @app.cli.command('assets-build')
+        def build_command():
+            """Fingerprint and precompress static files, dropping stale copies."""
+            started = time.perf_counter()
+            written = self.build()
+            removed = self.prune()
+            print(json.dumps({
+                'assets': len(self.manifest),
+                'written': written,
+                'pruned': removed,
+                'brotli': brotli is not None,
+                'seconds': round(time.perf_counter() - started, 3)
+            }))
+
+        if not self.enabled:
+            return
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send_asset)
+        started = time.perf_counter()
+        written = self.build()
+        logger.info(f"Built {len(self.manifest)} assets ({written} new) in "
+                    f"{time.perf_counter() - started:.2f}s")
+
+    def build(self):
+        """Fingerprint every static file; returns how many copies were written.
+
+        Pages are rewritten after everything else so they can point at the
+        other files' hashed names.
+        """
+        files = []
+        for root, _, names in os.walk(self.static_folder):
+            for name in names:
+                full = os.path.join(root, name)
+                files.append(os.path.relpath(full, self.static_folder).replace(os.sep, '/'))
+        pages = sorted(path for path in files if path.endswith('.html'))
+        others = sorted(path for path in files if not path.endswith('.html'))
+
+        manifest = {}
+        written = 0
+        for path in others:
+            with open(os.path.join(self.static_folder, path), 'rb') as f:
+                data = f.read()
+            manifest[path], new = self._store(path, data)
+            written += new
+
+        page_data = {}
+        for path in pages:
+            with open(os.path.join(self.static_folder, path), 'rb') as f:
+                page_data[path] = self.rewrite(f.read().decode('utf-8'), manifest)
+        # Views are fetched by name at runtime, so they need hashed copies too
+        for path, html in page_data.items():
+            manifest[path], new = self._store(path, html.encode('utf-8'))
+            written += new
+
+        self.manifest = manifest
+        # Top-level pages carry the manifest and keep their own URLs
+        self._pages = {}
+        for path, html in page_data.items():
+            if '/' not in path:
+                body = self.inject_manifest(html).encode('utf-8')
+                self._pages[path] = {
+                    'identity': body,
+                    'etag': hashlib.sha256(body).hexdigest()[:HASH_LENGTH],
+                    **compress(body)
+                }
+        return written
+
+    def prune(self):
+        """Delete hashed copies the current manifest no longer references"""
+        keep = set()
+        for hashed in self.manifest.values():
+            keep.add(hashed)
+            keep.update(hashed + suffix for suffix in ENCODINGS.values())
+        removed = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full = os.path.join(root, name)
+                if os.path.relpath(full, self.directory).replace(os.sep, '/') not in keep:
+                    os.unlink(full)
+                    removed += 1
+        return removed
+
+    def rewrite(self, html, manifest):
+        """Point /static/... references in `html` at their hashed names"""
+        def replace(match):
+            hashed = manifest.get(match.group(1))
+            return f'/assets/{hashed}' if hashed else match.group(0)
+        return _STATIC_REFERENCE.sub(replace, html)
+
+    def inject_manifest(self, html):
+        urls = {path: f'/assets/{hashed}' for path, hashed in self.manifest.items()}
+        # `</` can't appear inside an inline script
+        payload = json.dumps(urls, separators=(',', ':')).replace('</', '<\\/')
+        script = f'<script>window.ASSET_MANIFEST = {payload};</script>'
+        head = _HEAD.search(html)
+        if head is None:
+            return script + html
+        return html[:head.end()] + script + html[head.end():]
+
+    def send_asset(self, filename):
+        # Copies from earlier builds stay servable for pages already out there
+        full = safe_join(self.directory, filename)
+        if full is None or not os.path.isfile(full):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding in accepted_encodings():
+            if os.path.isfile(full + ENCODINGS[encoding]):
+                response = send_file(full + ENCODINGS[encoding], mimetype=mimetype,
+                                     conditional=False, etag=False)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_file(full, mimetype=mimetype, conditional=False, etag=False)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def page_response(self, path):
+        """A top-level page with rewritten references; revalidated by ETag"""
+        page = self._pages.get(path) if self.enabled else None
+        if page is None:
+            return current_app.send_static_file(path)
+        if page['etag'] in request.if_none_match:
+            response = Response(status=304)
+        else:
+            encoding = next((e for e in accepted_encodings() if e in page), 'identity')
+            response = Response(page[encoding], mimetype='text/html')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(page['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def _store(self, path, data):
+        """Write the hashed copy and its compressed variants unless present;
+        returns (hashed name, whether anything was written)"""
+        hashed = fingerprint(path, data)
+        target = os.path.join(self.directory, hashed)
+        if os.path.isfile(target):
+            return hashed, False
+        if path.endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_BYTES:
+            for encoding, body in compress(data).items():
+                _write_atomic(target + ENCODINGS[encoding], body)
+        # The plain copy goes last: its presence marks the set as complete
+        _write_atomic(target, data)
+        return hashed, True
+
+
+assets = AssetPipeline()
@@ -0,0 +1,252 @@
+from flask import Response, request
+from gtts import gTTS
+from metrics import tts_seconds, tts_text_length
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BYTES = 32 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(text, lang='en', slow=False, engine='gtts'):
+    """Content address for a synthesized clip"""
+    payload = json.dumps([text, lang, bool(slow), engine], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def synthesize_gtts(text, lang='en', slow=False):
+    """Run gTTS and return the MP3 bytes"""
+    mp3_fp = io.BytesIO()
+    tts_text_length.observe(len(text), 'gtts')
+    with tts_seconds.time('gtts'):
+        gTTS(text=text, lang=lang, slow=slow).write_to_fp(mp3_fp)
+    return mp3_fp.getvalue()
+
+
+class AudioCache:
+    """Two-tier audio cache: a byte-bounded in-memory LRU in front of an
+    on-disk store. Entries are addressed by `cache_key`."""
+
+    def __init__(self, directory=None, max_memory_bytes=DEFAULT_MEMORY_BYTES,
+                 max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.directory = app.config.get('AUDIO_CACHE_DIR', self.directory)
+        self.max_memory_bytes = app.config.get('AUDIO_CACHE_MEMORY_BYTES', self.max_memory_bytes)
+        self.max_disk_bytes = app.config.get('AUDIO_CACHE_DISK_BYTES', self.max_disk_bytes)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.extensions['audio_cache'] = self
+
+    def get(self, key):
+        """Return cached bytes for `key` or None, promoting disk hits into memory"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+        self._write_disk(key, data)
+
+    def get_or_create(self, key, factory):
+        """Return cached bytes for `key`, calling `factory()` once on a miss.
+
+        Concurrent misses for the same key wait for the first caller instead
+        of synthesizing the same clip twice.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    data = self._memory.get(key)
+                if data is None:
+                    data = self._read_disk(key)
+                if data is None:
+                    data = factory()
+                    self.put(key, data)
+        finally:
+            # Also when factory() raises, or the lock entries pile up
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return data
+
+    def contains(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        path = self._path(key)
+        return path is not None and os.path.exists(path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes or 0
+            }
+
+    def _remember(self, key, data):
+        # Clips larger than the whole memory tier only live on disk
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the file so disk eviction is least-recently-used
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read cached audio {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cached audio {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            elif not existed:
+                self._disk_bytes += len(data)
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        # Trim to 90% of the budget so we don't evict on every write
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._disk_bytes = total
+
+
+audio_cache = AudioCache()
+
+
+def audio_response(key, data, mimetype='audio/mpeg', download_name=None, max_age=86400):
+    """Build a response for cached audio with its content key as the ETag"""
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if download_name:
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response.make_conditional(request)
+
+
+def speech_response(text, lang='en', slow=False, download_name=None):
+    """Serve gTTS audio for `text`, answering 304 when the client already has it"""
+    key = cache_key(text, lang, slow, 'gtts')
+    if key in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+
+    data = audio_cache.get_or_create(key, lambda: synthesize_gtts(text, lang, slow))
+    return audio_response(key, data, download_name=download_name)
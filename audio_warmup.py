@@ -0,0 +1,134 @@
+from flask import Response
+from audio_cache import audio_cache, cache_key, synthesize_gtts
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+# Last warm-up run, reported by GET /api/audio/warmup
+warmup_status = {'state': 'idle'}
+_warmup_lock = threading.Lock()
+
+
+def synthesize_many(texts, lang='en', slow=False, max_workers=DEFAULT_WORKERS):
+    """Return [(text, key, audio or None)] for `texts`, synthesizing misses on
+    a bounded worker pool. Cached clips never touch the pool."""
+    results = {}
+    missing = []
+    for text in dict.fromkeys(texts):
+        key = cache_key(text, lang, slow, 'gtts')
+        data = audio_cache.get(key)
+        if data is None:
+            missing.append((text, key))
+        else:
+            results[text] = (key, data)
+
+    def synthesize(item):
+        text, key = item
+        try:
+            return text, key, audio_cache.get_or_create(key, lambda: synthesize_gtts(text, lang, slow))
+        except Exception as e:
+            logger.error(f"Error synthesizing {text!r}: {str(e)}")
+            return text, key, None
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            for text, key, data in pool.map(synthesize, missing):
+                results[text] = (key, data)
+
+    return [(text,) + results[text] for text in texts]
+
+
+def warm_audio_cache(texts, max_workers=DEFAULT_WORKERS):
+    """Pre-synthesize `texts` into the audio cache and return a summary"""
+    if not _warmup_lock.acquire(blocking=False):
+        return dict(warmup_status)
+    try:
+        texts = list(dict.fromkeys(texts))
+        started = time.perf_counter()
+        cached = sum(1 for text in texts if audio_cache.contains(cache_key(text)))
+        warmup_status.clear()
+        warmup_status.update({'state': 'running', 'total': len(texts)})
+
+        clips = synthesize_many(texts, max_workers=max_workers)
+        failed = sum(1 for _, _, data in clips if data is None)
+        warmup_status.update({
+            'state': 'done',
+            'already_cached': cached,
+            'synthesized': len(texts) - cached - failed,
+            'failed': failed,
+            'seconds': round(time.perf_counter() - started, 3)
+        })
+        logger.info(f"Audio warm-up finished: {warmup_status}")
+        return dict(warmup_status)
+    finally:
+        _warmup_lock.release()
+
+
+def start_warmup(app, texts):
+    """Run `warm_audio_cache` on a background thread"""
+    max_workers = app.config.get('AUDIO_WARMUP_WORKERS', DEFAULT_WORKERS)
+    thread = threading.Thread(
+        target=warm_audio_cache,
+        args=(list(texts), max_workers),
+        name='audio-warmup',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def init_app(app, texts_fn):
+    """Register `flask warm-audio` and optionally warm the cache at startup.
+
+    `texts_fn` returns the texts to pre-synthesize.
+    """
+    @app.cli.command('warm-audio')
+    def warm_audio_command():
+        """Pre-synthesize spelling words and topic facts."""
+        summary = warm_audio_cache(texts_fn(), app.config.get('AUDIO_WARMUP_WORKERS', DEFAULT_WORKERS))
+        print(json.dumps(summary))
+
+    if app.config.get('AUDIO_WARMUP_ON_START'):
+        start_warmup(app, texts_fn())
+
+
+def multipart_audio_response(clips):
+    """Pack clips into one multipart/form-data body.
+
+    Part "index" is a JSON list of {text, etag, part}; each clip is a part
+    named by its position so the browser can read it with `response.formData()`.
+    """
+    boundary = uuid.uuid4().hex
+    index = []
+    parts = []
+    for position, (text, key, data) in enumerate(clips):
+        if data is None:
+            index.append({'text': text, 'etag': key, 'part': None})
+            continue
+        name = str(position)
+        index.append({'text': text, 'etag': key, 'part': name})
+        parts.append((
+            f'Content-Disposition: form-data; name="{name}"; filename="{name}.mp3"\r\n'
+            'Content-Type: audio/mpeg\r\n\r\n',
+            data
+        ))
+
+    body = [
+        f'--{boundary}\r\n'.encode(),
+        b'Content-Disposition: form-data; name="index"\r\n'
+        b'Content-Type: application/json\r\n\r\n',
+        json.dumps(index).encode('utf-8'),
+        b'\r\n'
+    ]
+    for headers, data in parts:
+        body += [f'--{boundary}\r\n'.encode(), headers.encode(), data, b'\r\n']
+    body.append(f'--{boundary}--\r\n'.encode())
+
+    return Response(b''.join(body), mimetype=f'multipart/form-data; boundary={boundary}')
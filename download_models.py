@@ -1,32 +1,431 @@
+"""Download the model files listed in models/manifest.json.
+
+Files are fetched concurrently; large files are split into HTTP Range
+segments. Progress is kept next to each file (`<file>.part` plus
+`<file>.part.json`), so an interrupted download resumes where it stopped.
+Every file is checked against the manifest's sha256 and size before it
+is moved into place, and entries without them are refused.
+
+Pinning records what a download must match. `--pin` resolves each Hugging Face entry's revision to a commit,
+points its URLs at that commit and records the sizes and LFS sha256s the
+Hub reports. Files without an LFS hash (small configs), and entries from
+elsewhere, are hashed after downloading from the now-immutable URL.
+Without `--pin`, unpinned entries make the script exit with status 2
+(other failures exit 1), which setup.sh uses to pin a checkout whose
+manifest doesn't carry the values yet.
+
+    python download_models.py
+    python download_models.py --models opt-350m --workers 8
+    python download_models.py --mirror /mnt/usb/models        # local copy
+    python download_models.py --mirror http://lab-server:8000  # LAN mirror
+    python download_models.py --pin   # maintainers: pin unpinned entries, then commit the manifest
+"""
+import argparse
+import json
 import os
-import requests
+import re
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def download_file(url, destination):
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    os.makedirs(os.path.dirname(destination), exist_ok=True)
-    
-    with open(destination, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-
-def setup_models():
-    # Define your model files and their URLs
-    models = {
-        'models/phi-1_5/model.safetensors': 'YOUR_HOSTING_URL/phi-1_5/model.safetensors',
-        'models/vosk-model-small-en-us-0.15/model.bin': 'YOUR_HOSTING_URL/vosk-model/model.bin',
-        # Add other model files here
-    }
-    
-    for path, url in models.items():
-        if not os.path.exists(path):
-            print(f"Downloading {path}...")
-            download_file(url, path)
-            print(f"Downloaded {path}")
-        else:
-            print(f"{path} already exists")
+import requests
+
+from model_registry import MANIFEST_PATH, MODELS_DIR, sha256_file
+
+# Network reads are small so little is lost when a connection drops
+READ_SIZE = 64 << 10
+SEGMENT_SIZE = 64 << 20
+# How often partial progress is written to the .part.json state file
+STATE_EVERY = 8 << 20
+# Exit status when the manifest has unpinned entries and --pin wasn't given
+EXIT_UNPINNED = 2
+
+HF_URL = "https://huggingface.co"
+_HF_RESOLVE = re.compile(r"^https://huggingface\.co/(?P<repo>[^/]+/[^/]+)/resolve/(?P<revision>[^/]+)/(?P<file>.+)$")
+_COMMIT = re.compile(r"^[0-9a-f]{40}$")
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_files(manifest, names=None):
+    """(model name, file entry) pairs for the requested models; entries
+    built locally by src/scripts/convert_model.py have nothing to fetch"""
+    for name, model in manifest["models"].items():
+        if (names and name not in names) or model.get("build"):
+            continue
+        for entry in model["files"]:
+            yield name, entry
+
+
+def unpinned_reason(entry):
+    """Why `entry` can't be verified, or None when it is fully pinned"""
+    if not entry.get("sha256") or entry.get("size") is None:
+        return "no sha256 and size"
+    match = _HF_RESOLVE.match(entry.get("url") or "")
+    if match and not _COMMIT.match(match["revision"]):
+        return f"URL follows the moving revision {match['revision']!r}"
+    return None
+
+
+def resolve_revisions(manifest, names=None, session=None):
+    """Pin each Hugging Face model (entries with a "repo") to a commit.
+
+    The model's "version" (a commit, or "main" when unset) is resolved
+    through the Hub API; URLs are rewritten to that commit and missing
+    sizes and LFS sha256s are filled in from the Hub's file listing.
+    Returns the names of the models changed.
+    """
+    session = session or requests.Session()
+    changed = []
+    for name, model in manifest["models"].items():
+        if (names and name not in names) or not model.get("repo") or model.get("build"):
+            continue
+        if not any(unpinned_reason(entry) for entry in model["files"]):
+            continue
+        revision = model.get("version") or "main"
+        response = session.get(f"{HF_URL}/api/models/{model['repo']}/revision/{revision}",
+                               params={"blobs": "true"}, timeout=30)
+        response.raise_for_status()
+        info = response.json()
+        commit = info["sha"]
+        siblings = {sibling["rfilename"]: sibling for sibling in info.get("siblings", [])}
+        for entry in model["files"]:
+            match = _HF_RESOLVE.match(entry["url"])
+            if not match:
+                continue
+            sibling = siblings.get(match["file"])
+            if sibling is None:
+                raise ChecksumMismatch(f"{entry['path']}: {match['file']} is not in {model['repo']}@{commit}")
+            entry["url"] = f"{HF_URL}/{model['repo']}/resolve/{commit}/{match['file']}"
+            lfs = sibling.get("lfs") or {}
+            size = lfs.get("size", sibling.get("size"))
+            if entry.get("size") is None and size is not None:
+                entry["size"] = size
+            if not entry.get("sha256") and lfs.get("sha256"):
+                entry["sha256"] = lfs["sha256"]
+        model["version"] = commit
+        changed.append(name)
+    return changed
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+def source_for(entry, mirror=None):
+    """Where to fetch `entry`: a local path, or a URL"""
+    if mirror is None:
+        return entry["url"]
+    if "://" not in mirror:
+        return os.path.join(mirror, entry["path"])
+    return f"{mirror.rstrip('/')}/{entry['path']}"
+
+
+class Progress:
+    """Byte counter shared by all downloads, printed at most twice a second"""
+
+    def __init__(self, total, quiet=False):
+        self.total = total
+        self.done = 0
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._printed = 0.0
+
+    def add(self, count):
+        with self._lock:
+            self.done += count
+            now = time.monotonic()
+            if self.quiet or now - self._printed < 0.5:
+                return
+            self._printed = now
+        rate = self.done / max(now - self._started, 1e-6)
+        total = f"/{self.total / 1e6:.1f}" if self.total else ""
+        sys.stderr.write(f"\r{self.done / 1e6:.1f}{total} MB  {rate / 1e6:.1f} MB/s   ")
+        sys.stderr.flush()
+
+    def finish(self):
+        if not self.quiet:
+            sys.stderr.write("\n")
+
+
+class FileDownload:
+    """One manifest entry being fetched into `<dest>.part`"""
+
+    def __init__(self, entry, source, dest, segment_size):
+        self.entry = entry
+        self.source = source
+        self.dest = Path(dest)
+        self.part = self.dest.with_name(self.dest.name + ".part")
+        self.state_path = self.dest.with_name(self.dest.name + ".part.json")
+        self.segment_size = segment_size
+        self.size = entry.get("size")
+        self.ranges = False
+        self.segments = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+
+    def plan(self, session):
+        """Work out the segments still missing; returns their (start, end) list"""
+        response = session.head(self.source, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length is not None:
+            if self.size is not None and int(length) != self.size:
+                raise ChecksumMismatch(f"{self.entry['path']}: server has {length} bytes, manifest says {self.size}")
+            self.size = int(length)
+        self.ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes" and self.size is not None
+
+        state = self._load_state()
+        if not self.ranges or state.get("size") != self.size or not self.part.exists():
+            # Nothing resumable: start over
+            state = {"size": self.size, "segments": {}}
+            self.part.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.part, "wb") as f:
+                if self.size:
+                    f.truncate(self.size)
+        self.segments = {int(start): done for start, done in state["segments"].items()}
+
+        if not self.ranges:
+            return [(0, None)]
+        pending = []
+        for start in range(0, self.size, self.segment_size):
+            end = min(start + self.segment_size, self.size)
+            done = self.segments.setdefault(start, 0)
+            if start + done < end:
+                pending.append((start, end))
+        self._save_state()
+        return pending
+
+    def fetch(self, session, start, end, progress):
+        """Download bytes [start, end) (or the whole file when end is None)"""
+        offset = start + self.segments.get(start, 0) if end is not None else 0
+        headers = {"Range": f"bytes={offset}-{end - 1}"} if end is not None else {}
+        try:
+            with session.get(self.source, headers=headers, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                if end is not None and response.status_code != 206:
+                    raise IOError(f"{self.source} ignored the Range header")
+                with open(self.part, "r+b") as f:
+                    f.seek(offset)
+                    for chunk in response.iter_content(READ_SIZE):
+                        f.write(chunk)
+                        progress.add(len(chunk))
+                        if end is not None:
+                            self._advance(start, len(chunk))
+        finally:
+            # Record what arrived, including after a dropped connection
+            if end is not None:
+                self._save_state()
+
+    def _advance(self, start, count):
+        with self._lock:
+            self.segments[start] += count
+            self._unsaved += count
+            if self._unsaved < STATE_EVERY:
+                return
+            self._unsaved = 0
+        self._save_state()
+
+    def finalize(self):
+        """Verify the finished .part file and move it into place"""
+        expected = self.entry.get("sha256")
+        actual = sha256_file(self.part)
+        if expected and actual != expected:
+            self.part.unlink()
+            self.state_path.unlink(missing_ok=True)
+            raise ChecksumMismatch(f"{self.entry['path']}: sha256 {actual}, expected {expected}")
+        os.replace(self.part, self.dest)
+        self.state_path.unlink(missing_ok=True)
+        return actual
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        with self._lock:
+            state = {"size": self.size, "segments": {str(k): v for k, v in self.segments.items()}}
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with self._save_lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+
+
+def is_current(entry, dest):
+    """True when `dest` already holds the manifest's file; a file with no
+    recorded hash is never trusted and gets fetched again"""
+    if not dest.exists() or not entry.get("sha256"):
+        return False
+    if entry.get("size") is not None and dest.stat().st_size != entry["size"]:
+        return False
+    return sha256_file(dest) == entry["sha256"]
+
+
+def copy_local(entry, source, dest):
+    """Fetch from a mirror directory; verified like a download"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+    shutil.copyfile(source, part)
+    actual = sha256_file(part)
+    if entry.get("sha256") and actual != entry["sha256"]:
+        part.unlink()
+        raise ChecksumMismatch(f"{entry['path']}: sha256 {actual}, expected {entry['sha256']}")
+    os.replace(part, dest)
+    return actual
+
+
+def extract(entry, dest, models_dir):
+    """Unpack a verified archive into models_dir; `extract` names the
+    directory it creates, and an existing one is left alone"""
+    if (Path(models_dir) / entry["extract"]).is_dir():
+        return
+    with zipfile.ZipFile(dest) as archive:
+        archive.extractall(models_dir)
+
+
+def download(entries, models_dir=MODELS_DIR, mirror=None, workers=4,
+             segment_size=SEGMENT_SIZE, quiet=False):
+    """Fetch every (model, entry) pair that isn't already in place.
+
+    Returns {path: sha256} for the files fetched. Raises on the first
+    failure after the other transfers have finished; their progress is
+    kept for the next run.
+    """
+    models_dir = Path(models_dir)
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    todo = []
+    for _, entry in entries:
+        dest = models_dir / entry["path"]
+        if is_current(entry, dest):
+            if not quiet:
+                print(f"{entry['path']} is up to date")
+            continue
+        todo.append((entry, source_for(entry, mirror), dest))
+
+    hashes = {}
+    errors = []
+    local_copies = [item for item in todo if "://" not in item[1]]
+    remote = [FileDownload(entry, source, dest, segment_size)
+              for entry, source, dest in todo if "://" in source]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        copies = {pool.submit(copy_local, entry, source, dest): entry for entry, source, dest in local_copies}
+
+        # Plan every file first so segments of all files share the pool
+        plans = list(zip(remote, pool.map(lambda d: d.plan(session()), remote)))
+        progress = Progress(sum(d.size or 0 for d in remote), quiet=quiet)
+        progress.add(sum(sum(d.segments.values()) for d in remote))
+
+        remaining = {id(d): len(segments) for d, segments in plans}
+        lock = threading.Lock()
+
+        def run_segment(item, start, end):
+            item.fetch(session(), start, end, progress)
+            with lock:
+                remaining[id(item)] -= 1
+                last = remaining[id(item)] == 0
+            if last:
+                hashes[item.entry["path"]] = item.finalize()
+
+        futures = []
+        for item, segments in plans:
+            if not segments:
+                hashes[item.entry["path"]] = item.finalize()
+            for start, end in segments:
+                futures.append(pool.submit(run_segment, item, start, end))
+        for future in futures + list(copies):
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if future in copies:
+                hashes[copies[future]["path"]] = result
+    if remote:
+        progress.finish()
+    if errors:
+        raise errors[0]
+
+    for _, entry in entries:
+        if entry.get("extract"):
+            extract(entry, models_dir / entry["path"], models_dir)
+    return hashes
+
+
+def pin(manifest_path, manifest, hashes, models_dir=MODELS_DIR, changed=False):
+    """Fill in missing sha256/size fields from the files now on disk and
+    save the manifest if anything (including `changed`) was updated"""
+    for _, entry in manifest_files(manifest):
+        dest = Path(models_dir) / entry["path"]
+        if (not entry.get("sha256") or entry.get("size") is None) and dest.exists():
+            entry["sha256"] = entry.get("sha256") or hashes.get(entry["path"]) or sha256_file(dest)
+            entry["size"] = dest.stat().st_size
+            changed = True
+    if changed:
+        save_manifest(manifest, manifest_path)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", default=str(MANIFEST_PATH))
+    parser.add_argument("--models-dir", default=str(MODELS_DIR))
+    parser.add_argument("--models", nargs="+", help="only these manifest entries")
+    parser.add_argument("--mirror", help="local directory or base URL laid out like the models directory")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent connections")
+    parser.add_argument("--segment-mb", type=int, default=SEGMENT_SIZE >> 20,
+                        help="files larger than this are fetched in parallel Range segments")
+    parser.add_argument("--pin", action="store_true",
+                        help="pin unpinned entries to a commit, sha256 and size and rewrite the manifest")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    entries = list(manifest_files(manifest, args.models))
+    unpinned = [(entry["path"], unpinned_reason(entry)) for _, entry in entries if unpinned_reason(entry)]
+    if unpinned and not args.pin:
+        for path, reason in unpinned:
+            print(f"error: {path} is not pinned ({reason})", file=sys.stderr)
+        print(f"Refusing to download unverifiable files; pin them with --pin and commit {args.manifest}",
+              file=sys.stderr)
+        sys.exit(EXIT_UNPINNED)
+
+    try:
+        revised = resolve_revisions(manifest, args.models) if args.pin else []
+        hashes = download(entries, args.models_dir, args.mirror, args.workers,
+                          args.segment_mb << 20, args.quiet)
+    except (ChecksumMismatch, requests.RequestException, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.pin and pin(args.manifest, manifest, hashes, args.models_dir, changed=bool(revised)):
+        print(f"Pinned {args.manifest}; review and commit it")
+
 
 if __name__ == "__main__":
-    setup_models() 
\ No newline at end of file
+    main()
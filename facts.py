@@ -0,0 +1,60 @@
+import json
+import os
+import random
+import re
+import threading
+
+FACTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'facts.json')
+
+
+class FactStore:
+    """Topic facts shared by the Flask and FastAPI apps.
+
+    All aliases are compiled into one regex alternation, so finding the topic
+    in a question is a single scan of the text. The leftmost alias wins, and
+    the longest alias wins at the same position ("human body" over "body").
+    """
+
+    def __init__(self, categories):
+        self.facts = {name: tuple(category['facts']) for name, category in categories.items()}
+        self._alias_to_category = {}
+        for name, category in categories.items():
+            for alias in category['aliases']:
+                self._alias_to_category[' '.join(alias.lower().split())] = name
+
+        aliases = sorted(self._alias_to_category, key=len, reverse=True)
+        alternation = '|'.join(r'\s+'.join(map(re.escape, alias.split())) for alias in aliases)
+        self._pattern = re.compile(rf'\b(?:{alternation})\b', re.IGNORECASE)
+
+    @classmethod
+    def load(cls, path=FACTS_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['categories'])
+
+    def match(self, text):
+        """Return the category mentioned in `text`, or None"""
+        found = self._pattern.search(text)
+        if found is None:
+            return None
+        return self._alias_to_category[' '.join(found.group(0).lower().split())]
+
+    def random_fact(self, category):
+        return random.choice(self.facts[category])
+
+    def all_facts(self):
+        for facts in self.facts.values():
+            yield from facts
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fact_store():
+    """The process-wide FactStore, loaded from data/facts.json on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FactStore.load()
+    return _store
@@ -0,0 +1,40 @@
+"""gunicorn settings for preload-and-fork mode (PRELOAD=true ./manage.sh start).
+
+The master imports asgi:app, loads models and static data once and forks
+uvicorn workers that share them; see prefork.py.
+
+    gunicorn -c gunicorn.conf.py asgi:app
+"""
+import os
+import shutil
+
+import prefork
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3000)}"
+workers = int(os.environ.get('WORKERS', 2))
+worker_class = 'uvicorn_worker.UvicornWorker'
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+pidfile = os.environ.get('PIDFILE')
+
+# Runs in the master before the app is imported
+prefork.disable_gc()
+
+# Start /metrics from zero: drop snapshots left by a previous run's workers
+metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if metrics_dir:
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # The app is already imported (preload_app); workers are forked next
+    if os.environ.get('PRELOAD_MODELS', '1') == '1':
+        prefork.preload()
+    prefork.freeze()
+
+
+def post_fork(server, worker):
+    from run import app
+    prefork.reinit_worker(app)
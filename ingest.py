@@ -0,0 +1,247 @@
+from database import db
+from models import ActivityEvent, LearningStats
+from rollups import record_activity
+from stats_cache import stats_cache
+from collections import deque
+from datetime import datetime
+import atexit
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Buffers items in memory and hands them to `flush_fn(items)` in batches.
+
+    A background thread flushes once `max_items` are waiting or `max_delay`
+    seconds after the oldest buffered item arrived, whichever comes first.
+    Whatever is still buffered is flushed at interpreter exit.
+
+    When a batch fails, its items are retried one at a time so a single bad
+    item can't hold back the rest; an item that has failed `max_attempts`
+    times is dropped into `dead_letters`. At most `max_pending` items are
+    held; `put` refuses more.
+    """
+
+    def __init__(self, flush_fn, max_items=500, max_delay=1.0, name='write-behind',
+                 max_pending=50000, max_attempts=5):
+        self._flush_fn = flush_fn
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.name = name
+
+        self._items = []
+        # (attempts so far, item) for items that failed on their own
+        self._retries = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.dead_letters = deque(maxlen=100)
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+        atexit.register(self.flush)
+
+    def put(self, item):
+        """Buffer `item`; returns False when the queue is full"""
+        self._ensure_worker()
+        with self._cond:
+            if len(self._items) + len(self._retries) >= self.max_pending:
+                self.rejected += 1
+                return False
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.append(item)
+            self.accepted += 1
+            if len(self._items) >= self.max_items:
+                self._cond.notify()
+            return True
+
+    def flush(self):
+        """Write everything buffered right now, on the calling thread"""
+        with self._flush_lock:
+            with self._cond:
+                retries, self._retries = self._retries, []
+                items, self._items, self._oldest = self._items, [], None
+            batch = [item for _, item in retries] + items
+            if not batch:
+                return 0
+            try:
+                self._flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"{self.name}: failed to flush {len(batch)} items, retrying them "
+                             f"one at a time: {str(e)}", exc_info=True)
+                return self._flush_each(retries + [(0, item) for item in items])
+            self.flushed += len(batch)
+            self.flushes += 1
+            return len(batch)
+
+    def _flush_each(self, pending):
+        written = 0
+        failed = []
+        for attempts, item in pending:
+            try:
+                self._flush_fn([item])
+            except Exception as e:
+                attempts += 1
+                if attempts < self.max_attempts:
+                    failed.append((attempts, item))
+                    continue
+                self.dropped += 1
+                self.dead_letters.append(item)
+                logger.error(f"{self.name}: dropping an item after {attempts} failed attempts: {str(e)}")
+                continue
+            written += 1
+        if written:
+            self.flushed += written
+            self.flushes += 1
+        if failed:
+            # Back in front, ahead of anything that arrived meanwhile
+            with self._cond:
+                self._retries[:0] = failed
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+        return written
+
+    def stats(self):
+        with self._cond:
+            return {
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'flushed': self.flushed,
+                'flushes': self.flushes,
+                'failures': self.failures,
+                'dropped': self.dropped,
+                'pending': len(self._items) + len(self._retries)
+            }
+
+    def _ensure_worker(self):
+        # Restart the flusher in a forked child, where the parent's thread is gone
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._items) >= self.max_items:
+                        break
+                    if self._items or self._retries:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+            failures = self.failures
+            self.flush()
+            if self.failures != failures:
+                # Back off after a failed flush instead of spinning
+                time.sleep(self.max_delay)
+
+
+def coalesce_activity(events):
+    """Collapse raw stats events into one counters update per user.
+
+    Counter totals are last-write-wins and the latest event time becomes the
+    visit time. Activities are not coalesced: each one becomes its own
+    activity_events row.
+    """
+    updates = {}
+    activity_rows = []
+    for event in events:
+        update = updates.setdefault(event['user_id'], {
+            'topics_explored': None,
+            'games_played': None,
+            'time': event['time']
+        })
+        for counter in ('topics_explored', 'games_played'):
+            if event.get(counter) is not None:
+                update[counter] = event[counter]
+        if event.get('activity'):
+            activity_rows.append(ActivityEvent.row(event['user_id'], event['activity'], event['time']))
+        update['time'] = max(update['time'], event['time'])
+    return updates, activity_rows
+
+
+class ActivityIngestor:
+    """Write-behind path for /api/stats/ingest: events are queued in memory
+    and written per user in a single transaction per flush."""
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+
+    def init_app(self, app):
+        self.app = app
+        self.queue = WriteBehindQueue(
+            self._write,
+            max_items=app.config.get('INGEST_MAX_EVENTS', 500),
+            max_delay=app.config.get('INGEST_MAX_DELAY', 1.0),
+            max_pending=app.config.get('INGEST_MAX_PENDING', 50000),
+            name='activity-ingest'
+        )
+        app.extensions['activity_ingest'] = self
+
+    def submit(self, user_id, topics_explored=None, games_played=None, activity=None):
+        """Queue one event; returns False when the queue is full"""
+        return self.queue.put({
+            'user_id': user_id,
+            'topics_explored': topics_explored,
+            'games_played': games_played,
+            'activity': activity,
+            'time': datetime.utcnow()
+        })
+
+    def flush(self):
+        return self.queue.flush()
+
+    def _write(self, events):
+        updates, activity_rows = coalesce_activity(events)
+        with self.app.app_context():
+            try:
+                rows = {
+                    stats.user_id: stats
+                    for stats in LearningStats.query.filter(LearningStats.user_id.in_(list(updates)))
+                }
+                for user_id, update in updates.items():
+                    stats = rows.get(user_id)
+                    if stats is None:
+                        stats = LearningStats(user_id=user_id)
+                        db.session.add(stats)
+                    stats.apply_update(
+                        update['time'],
+                        topics_explored=update['topics_explored'],
+                        games_played=update['games_played']
+                    )
+                if activity_rows:
+                    record_activity(activity_rows)
+                    # One executemany for the whole batch
+                    db.session.execute(db.insert(ActivityEvent), activity_rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        stats_cache.invalidate(*updates)
+        logger.debug(f"Flushed {len(events)} events for {len(updates)} users")
+
+
+activity_ingest = ActivityIngestor()
@@ -0,0 +1,319 @@
+"""Game of Life engine for /games/api/life/step.
+
+Two engines behind one API. Each advances any number of generations per
+call and returns the cells that changed, not the whole board.
+
+LifeBoard is a fixed-size board held as a NumPy bool array. By default it
+wraps around like the browser game. Each generation counts neighbours for
+the whole board at once: the 3x3 box sum, taken as a row sum then a column
+sum.
+
+HashLife is Gosper's algorithm on an unbounded plane. Space and time are
+quadtrees of hash-consed nodes, with the result of advancing each node
+memoized, so repetitive patterns advance 2^k generations in roughly the
+time of one. It suits huge, sparse patterns, while dense random boards are
+faster on LifeBoard.
+"""
+import time
+
+import numpy as np
+
+MIN_LEVEL = 3
+
+
+class LifeTooComplex(Exception):
+    """Raised when a HashLife run needs more nodes, cells or time than allowed"""
+
+
+def step_board(board, generations=1, wrap=True):
+    """Advance a 2-D bool array `generations` times; returns a new array"""
+    board = np.array(board, dtype=bool)
+    height, width = board.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    rows = np.empty((height + 2, width), dtype=np.uint8)
+    box = np.empty((height, width), dtype=np.uint8)
+    for _ in range(generations):
+        padded[1:-1, 1:-1] = board
+        if wrap:
+            padded[0, 1:-1] = board[-1]
+            padded[-1, 1:-1] = board[0]
+            padded[:, 0] = padded[:, -2]
+            padded[:, -1] = padded[:, 1]
+        # 3x3 box sums (the cell plus its eight neighbours)
+        np.add(padded[:, :-2], padded[:, 1:-1], out=rows)
+        rows += padded[:, 2:]
+        np.add(rows[:-2], rows[1:-1], out=box)
+        box += rows[2:]
+        # Alive next: 3 in the box, or 4 in the box with the cell itself alive
+        board = (box == 3) | (board & (box == 4))
+    return board
+
+
+def _diff(generation, population, born, died):
+    return {
+        'generation': generation,
+        'population': population,
+        'born': born,
+        'died': died
+    }
+
+
+class LifeBoard:
+    """A width x height board; cells are (row, col)"""
+
+    def __init__(self, width, height, cells=(), wrap=True):
+        self.board = np.zeros((height, width), dtype=bool)
+        self.wrap = wrap
+        self.generation = 0
+        cells = np.asarray(list(cells), dtype=np.int64).reshape(-1, 2)
+        if len(cells):
+            if (cells < 0).any() or (cells[:, 0] >= height).any() or (cells[:, 1] >= width).any():
+                raise ValueError('cells must lie on the board')
+            self.board[cells[:, 0], cells[:, 1]] = True
+
+    @property
+    def population(self):
+        return int(np.count_nonzero(self.board))
+
+    def cells(self):
+        return np.argwhere(self.board).tolist()
+
+    def step(self, generations=1):
+        """Advance `generations` and return the cells born and died since the last call"""
+        before = self.board
+        self.board = step_board(before, generations, self.wrap)
+        self.generation += generations
+        return _diff(
+            self.generation,
+            self.population,
+            np.argwhere(self.board & ~before).tolist(),
+            np.argwhere(before & ~self.board).tolist()
+        )
+
+
+class _Node:
+    """Quadtree node covering 2^level x 2^level cells; leaves are level 0"""
+
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+
+
+class HashLife:
+    """Unbounded universe advanced with HashLife; cells are (row, col).
+
+    Nodes are canonical (one object per distinct subtree), so they are
+    compared and hashed by identity. The caches live on the instance and are
+    freed with it; `max_nodes` bounds them, `max_population` bounds the
+    cells a step may return and `max_seconds` bounds the time spent building
+    the tree and, separately, advancing each step.
+    """
+
+    def __init__(self, cells=(), max_nodes=2_000_000, max_population=None, max_seconds=None):
+        self.max_nodes = max_nodes
+        self.max_population = max_population
+        self.max_seconds = max_seconds
+        self._deadline = None
+        self._start_clock()
+        self.generation = 0
+        self._joins = {}
+        self._successors = {}
+        self._dead = _Node(0, None, None, None, None, 0)
+        self._alive = _Node(0, None, None, None, None, 1)
+        self._zeros = [self._dead]
+        self.root, self.origin = self._build(cells)
+
+    @property
+    def population(self):
+        return self.root.population
+
+    def cells(self):
+        found = []
+        self._collect(self.root, self.origin[0], self.origin[1], found)
+        return found
+
+    def step(self, generations=1):
+        """Advance `generations` and return the cells born and died since the last call"""
+        before = set(self.cells())
+        self._advance(generations)
+        if self.max_population is not None and self.population > self.max_population:
+            raise LifeTooComplex(f'pattern grew to {self.population} cells')
+        after = set(self.cells())
+        return _diff(
+            self.generation,
+            self.population,
+            sorted(list(cell) for cell in after - before),
+            sorted(list(cell) for cell in before - after)
+        )
+
+    def _join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self._joins.get(key)
+        if node is None:
+            self._check_clock()
+            if len(self._joins) >= self.max_nodes:
+                raise LifeTooComplex(f'pattern needs more than {self.max_nodes} nodes')
+            node = self._joins[key] = _Node(
+                nw.level + 1, nw, ne, sw, se,
+                nw.population + ne.population + sw.population + se.population
+            )
+        return node
+
+    def _start_clock(self):
+        if self.max_seconds is not None:
+            self._deadline = time.monotonic() + self.max_seconds
+
+    def _check_clock(self):
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise LifeTooComplex(f'pattern needs more than {self.max_seconds}s')
+
+    def _zero(self, level):
+        while len(self._zeros) <= level:
+            zero = self._zeros[-1]
+            self._zeros.append(self._join(zero, zero, zero, zero))
+        return self._zeros[level]
+
+    def _build(self, cells):
+        cells = [(int(row), int(col)) for row, col in cells]
+        if not cells:
+            return self._zero(MIN_LEVEL), (0, 0)
+        top = min(row for row, _ in cells)
+        left = min(col for _, col in cells)
+        extent = max(max(row - top, col - left) for row, col in cells) + 1
+        level = max(MIN_LEVEL, (extent - 1).bit_length())
+        return self._build_node(level, top, left, cells), (top, left)
+
+    def _build_node(self, level, top, left, cells):
+        if not cells:
+            return self._zero(level)
+        if level == 0:
+            return self._alive
+        half = 1 << (level - 1)
+        quadrants = ([], [], [], [])
+        for row, col in cells:
+            quadrants[(row >= top + half) * 2 + (col >= left + half)].append((row, col))
+        return self._join(
+            self._build_node(level - 1, top, left, quadrants[0]),
+            self._build_node(level - 1, top, left + half, quadrants[1]),
+            self._build_node(level - 1, top + half, left, quadrants[2]),
+            self._build_node(level - 1, top + half, left + half, quadrants[3])
+        )
+
+    def _collect(self, node, top, left, found):
+        if node.population == 0:
+            return
+        if node.level == 0:
+            found.append((top, left))
+            return
+        half = 1 << (node.level - 1)
+        self._collect(node.nw, top, left, found)
+        self._collect(node.ne, top, left + half, found)
+        self._collect(node.sw, top + half, left, found)
+        self._collect(node.se, top + half, left + half, found)
+
+    def _centre(self, node):
+        """`node` in the middle of an empty node one level up"""
+        zero = self._zero(node.level - 1)
+        return self._join(
+            self._join(zero, zero, zero, node.nw),
+            self._join(zero, zero, node.ne, zero),
+            self._join(zero, node.sw, zero, zero),
+            self._join(node.se, zero, zero, zero)
+        )
+
+    def _inner(self, node):
+        """The middle half of `node`, one level down"""
+        return self._join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _life_4x4(self, node):
+        """The middle 2x2 of a 4x4 node, one generation on"""
+        grid = [
+            [node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne],
+            [node.nw.sw, node.nw.se, node.ne.sw, node.ne.se],
+            [node.sw.nw, node.sw.ne, node.se.nw, node.se.ne],
+            [node.sw.sw, node.sw.se, node.se.sw, node.se.se]
+        ]
+        bits = [[cell.population for cell in row] for row in grid]
+        middle = []
+        for row in (1, 2):
+            for col in (1, 2):
+                box = sum(bits[r][c] for r in (row - 1, row, row + 1) for c in (col - 1, col, col + 1))
+                alive = box == 3 or (box == 4 and bits[row][col])
+                middle.append(self._alive if alive else self._dead)
+        return self._join(*middle)
+
+    def _successor(self, node, j):
+        """The middle half of `node`, 2^j generations on (j <= level - 2)"""
+        key = (node, j)
+        result = self._successors.get(key)
+        if result is not None:
+            return result
+        self._check_clock()
+
+        if node.population == 0:
+            result = node.nw
+        elif node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            step = min(j, node.level - 3)
+            # Nine overlapping subnodes, each advanced 2^step
+            c1 = self._successor(nw, step)
+            c2 = self._successor(self._join(nw.ne, ne.nw, nw.se, ne.sw), step)
+            c3 = self._successor(ne, step)
+            c4 = self._successor(self._join(nw.sw, nw.se, sw.nw, sw.ne), step)
+            c5 = self._successor(self._join(nw.se, ne.sw, sw.ne, se.nw), step)
+            c6 = self._successor(self._join(ne.sw, ne.se, se.nw, se.ne), step)
+            c7 = self._successor(sw, step)
+            c8 = self._successor(self._join(sw.ne, se.nw, sw.se, se.sw), step)
+            c9 = self._successor(se, step)
+            if j < node.level - 2:
+                # Already far enough: take the middles without stepping again
+                result = self._join(
+                    self._join(c1.se, c2.sw, c4.ne, c5.nw),
+                    self._join(c2.se, c3.sw, c5.ne, c6.nw),
+                    self._join(c4.se, c5.sw, c7.ne, c8.nw),
+                    self._join(c5.se, c6.sw, c8.ne, c9.nw)
+                )
+            else:
+                result = self._join(
+                    self._successor(self._join(c1, c2, c4, c5), step),
+                    self._successor(self._join(c2, c3, c5, c6), step),
+                    self._successor(self._join(c4, c5, c7, c8), step),
+                    self._successor(self._join(c5, c6, c8, c9), step)
+                )
+
+        self._successors[key] = result
+        return result
+
+    def _advance(self, generations):
+        self._start_clock()
+        node, (top, left) = self.root, self.origin
+        j = 0
+        remaining = generations
+        while remaining:
+            if remaining & 1:
+                # Pad so the pattern can grow 2^j cells each way and stay
+                # inside the successor's middle half
+                while node.level < j + 1:
+                    shift = 1 << (node.level - 1)
+                    node, top, left = self._centre(node), top - shift, left - shift
+                for _ in range(2):
+                    shift = 1 << (node.level - 1)
+                    node, top, left = self._centre(node), top - shift, left - shift
+                shift = 1 << (node.level - 2)
+                node, top, left = self._successor(node, j), top + shift, left + shift
+                # Drop empty borders so the next step doesn't start larger
+                while node.level > MIN_LEVEL and self._inner(node).population == node.population:
+                    shift = 1 << (node.level - 2)
+                    node, top, left = self._inner(node), top + shift, left + shift
+            remaining >>= 1
+            j += 1
+        self.root, self.origin = node, (top, left)
+        self.generation += generations
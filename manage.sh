@@ -7,6 +7,13 @@ DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 export FLASK_APP=src.main:app
 export PYTHONPATH=$DIR
 export PORT=3000
+# uvicorn worker processes; each one runs Flask in a thread pool of WSGI_THREADS
+export WORKERS=${WORKERS:-2}
+# PRELOAD=true loads models once in a gunicorn master and forks the workers
+# from it, so they share the weights (see gunicorn.conf.py)
+export PRELOAD=${PRELOAD:-false}
+# Each worker writes its metrics here and /metrics adds them all up
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-$DIR/instance/metrics}
 
 # Ensure instance directory exists and is writable
 ensure_instance_dir() {
@@ -27,30 +34,39 @@ check_port() {
 start_server() {
     check_port
     ensure_instance_dir
+    # Counters restart with the server
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
     echo "Starting server on port $PORT..."
     if [ "$DEBUG" = "true" ]; then
         python run.py
+    elif [ "$PRELOAD" = "true" ]; then
+        cd "$DIR"
+        echo $$ > "$DIR/server.pid"
+        exec gunicorn -c gunicorn.conf.py 'asgi:app'
     else
-        gunicorn \
-            --bind 0.0.0.0:$PORT \
-            --chdir "$DIR" \
-            --timeout 120 \
-            --workers 1 \
-            --worker-class sync \
-            --pid "$DIR/gunicorn.pid" \
-            --log-level debug \
-            'run:app'
+        cd "$DIR"
+        # exec keeps this shell's PID, so the pid file points at uvicorn
+        echo $$ > "$DIR/server.pid"
+        exec uvicorn \
+            --host 0.0.0.0 \
+            --port $PORT \
+            --workers $WORKERS \
+            --timeout-keep-alive 30 \
+            --log-level info \
+            'asgi:app'
     fi
 }
 
 stop_server() {
     echo "Stopping server..."
-    if [ -f "$DIR/gunicorn.pid" ]; then
-        pid=$(cat "$DIR/gunicorn.pid")
-        kill -9 $pid 2>/dev/null
-        rm "$DIR/gunicorn.pid"
+    if [ -f "$DIR/server.pid" ]; then
+        pid=$(cat "$DIR/server.pid")
+        kill $pid 2>/dev/null
+        rm "$DIR/server.pid"
     fi
-    pkill -f "gunicorn.*run:app"
+    pkill -f "uvicorn.*asgi:app"
+    pkill -f "gunicorn.*asgi:app"
     pkill -f "python.*run.py"
     check_port
     echo "Server stopped"
@@ -84,8 +100,8 @@ case "$1" in
         start_server
         ;;
     "status")
-        if [ -f "$DIR/gunicorn.pid" ] && ps -p $(cat "$DIR/gunicorn.pid") > /dev/null; then
-            echo "Server is running on port $PORT (PID: $(cat "$DIR/gunicorn.pid"))"
+        if [ -f "$DIR/server.pid" ] && ps -p $(cat "$DIR/server.pid") > /dev/null; then
+            echo "Server is running on port $PORT (PID: $(cat "$DIR/server.pid"))"
             lsof -i :$PORT
         else
             echo "Server is not running"
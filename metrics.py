@@ -0,0 +1,521 @@
+"""Hot-path instrumentation, exposed in Prometheus text format on /metrics.
+
+Recording is a lock and a few integer increments per observation, so it
+stays on in production. Covered:
+
+- per-route latency of the Flask app and the FastAPI router
+- TTS synthesis time and text length (cache misses only)
+- audio, stats and generation cache hits and misses (read at scrape time
+  from the caches' own counters, so lookups pay nothing extra)
+- DB query count and time, in total and per Flask request
+- model load and inference time
+
+Every worker process keeps its own numbers. With PROMETHEUS_MULTIPROC_DIR
+set (manage.sh and gunicorn.conf.py do), each process also writes them to
+<dir>/<pid>.json every METRICS_SNAPSHOT_SECONDS and at exit, and a scrape
+sums every file there, so whichever worker answers reports the whole
+server and counters never jump backwards. Files of exited workers are kept
+for the same reason; the directory is emptied when the server starts.
+Forked workers drop what they inherited from the master (after_fork),
+whose own file already holds it.
+
+Setting PROFILE_SLOW_REQUEST_MS turns on a sampling profiler. For slow Flask
+requests it writes folded stacks (flamegraph.pl/speedscope input) to
+instance/profiles.
+"""
+from flask import Response, g, request
+from database import db
+from sqlalchemy import event
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+TEXT_LENGTH_BUCKETS = (10, 25, 50, 100, 200, 500, 1000, 2500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# [query count, query seconds] for the Flask request running in this context
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket histogram with one series per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Bucket counts (the last one is +Inf), then sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def dump(self):
+        """{json label values: bucket counts + sum}"""
+        with self._lock:
+            return {json.dumps(labels): list(values) for labels, values in self._series.items()}
+
+    def merge(self, merged, key, values):
+        current = merged.get(key)
+        merged[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def samples(self, dumped=None):
+        series = {tuple(json.loads(key)): values for key, values in (dumped or self.dump()).items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}'
+            labels = _labels(self.label_names, label_values)
+            yield f'{self.name}_sum{labels} {_number(values[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Total:
+    """Monotonic counter with one series per label combination"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def dump(self):
+        with self._lock:
+            return {json.dumps(labels): value for labels, value in self._series.items()}
+
+    def merge(self, merged, key, value):
+        merged[key] = merged.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def samples(self, dumped=None):
+        series = {tuple(json.loads(key)): value for key, value in (dumped or self.dump()).items()}
+        for label_values, value in sorted(series.items()):
+            yield f'{self.name}{_labels(self.label_names, label_values)} {_number(value)}'
+
+
+class SlowRequestProfiler:
+    """Sampling profiler for slow requests.
+
+    A fraction (`rate`) of requests register their thread. While any are
+    running, a daemon thread records their stacks every `interval` seconds.
+    Requests that end up slower than `threshold` seconds have their samples
+    written as folded stacks to `directory`. Only the newest `max_profiles`
+    files are kept.
+    """
+
+    def __init__(self, threshold, directory, rate=1.0, interval=0.005, max_profiles=200):
+        self.threshold = threshold
+        self.directory = directory
+        self.rate = rate
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Start sampling the calling thread; returns a token for `finish`"""
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return None
+        self._ensure_sampler()
+        ident = threading.get_ident()
+        samples = Counter()
+        with self._lock:
+            self._active[ident] = samples
+        self._wake.set()
+        return ident, samples
+
+    def finish(self, token, label, duration):
+        if token is None:
+            return
+        ident, samples = token
+        with self._lock:
+            self._active.pop(ident, None)
+        if duration < self.threshold or not samples:
+            return
+        try:
+            path = self._write(label, samples)
+        except OSError as e:
+            logger.warning(f"Could not write profile for {label}: {str(e)}")
+            return
+        logger.warning(f"Slow request {label} took {duration * 1000:.0f} ms; profile in {path}")
+
+    def _write(self, label, samples):
+        os.makedirs(self.directory, exist_ok=True)
+        safe = ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:80]
+        path = os.path.join(self.directory, f'{time.time():.3f}-{os.getpid()}-{safe}.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        profiles = sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.endswith('.folded')
+        )
+        for old in profiles[:-self.max_profiles]:
+            try:
+                os.unlink(old)
+            except FileNotFoundError:
+                pass
+        return path
+
+    def _ensure_sampler(self):
+        # Restart the sampler in a forked child, where the parent's thread is gone
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for ident, samples in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class Metrics:
+    """Registry of every metric in the process and the Flask hooks that feed it"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._instrumented_engines = set()
+        self.profiler = None
+        self.multiproc_dir = None
+        self.snapshot_seconds = 5.0
+        self._writer = None
+        self._writer_pid = None
+        # Collector values inherited from the master at fork, counted in its file
+        self._collected_baseline = {}
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def total(self, name, help, labels=()):
+        return self._metrics.setdefault(name, Total(name, help, labels))
+
+    def collector(self, name, fn):
+        """Register `fn()`, called at scrape time, yielding
+        (metric name, type, help, [(labels dict, value), ...])"""
+        self._collectors[name] = fn
+
+    def init_app(self, app):
+        threshold = app.config.get('PROFILE_SLOW_REQUEST_MS')
+        if threshold:
+            self.profiler = SlowRequestProfiler(
+                threshold / 1000.0,
+                app.config.get('PROFILE_DIR', os.path.join('instance', 'profiles')),
+                rate=app.config.get('PROFILE_SAMPLE_RATE', 1.0)
+            )
+
+        with app.app_context():
+            self.instrument_engine(db.engine)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+        self.collector('flask_caches', lambda: _cache_samples(app))
+        app.extensions['metrics'] = self
+
+        self.multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            self.snapshot_seconds = app.config.get('METRICS_SNAPSHOT_SECONDS', 5.0)
+            self._ensure_writer()
+            atexit.register(self.write_snapshot)
+
+    def after_fork(self):
+        """Call first thing in a forked worker: forget the master's numbers,
+        which its own snapshot file already reports"""
+        for metric in self._metrics.values():
+            metric.reset()
+        self._collected_baseline = {
+            (name, json.dumps(labels, sort_keys=True)): value
+            for name, (_, _, samples) in self._collect().items()
+            for labels, value in samples
+        }
+        if self.multiproc_dir:
+            self._ensure_writer()
+
+    def write_snapshot(self):
+        """Write this process's numbers to <multiproc dir>/<pid>.json"""
+        if not self.multiproc_dir:
+            return
+        path = os.path.join(self.multiproc_dir, f'{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {str(e)}")
+
+    def instrument_engine(self, engine):
+        """Time every statement run through `engine`"""
+        if id(engine) in self._instrumented_engines:
+            return
+        self._instrumented_engines.add(id(engine))
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def query_started(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._metrics_started = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def query_finished(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_metrics_started', None)
+            if started is None:
+                return
+            elapsed = time.perf_counter() - started
+            db_query_seconds.observe(elapsed)
+            totals = _request_db.get()
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+
+    def render(self):
+        if self.multiproc_dir:
+            self.write_snapshot()
+            snapshots = self._read_snapshots()
+        else:
+            snapshots = [self._snapshot()]
+
+        lines = []
+        for metric in self._metrics.values():
+            merged = {}
+            for snapshot in snapshots:
+                for key, values in snapshot['metrics'].get(metric.name, {}).items():
+                    metric.merge(merged, key, values)
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples(merged))
+
+        # All collected families are counters, so processes add up
+        families = {}
+        for snapshot in snapshots:
+            for name, (type, help, samples) in snapshot['collected'].items():
+                series = families.setdefault(name, (type, help, {}))[2]
+                for labels, value in samples:
+                    key = json.dumps(labels, sort_keys=True)
+                    series[key] = series.get(key, 0) + value
+        for name, (type, help, series) in families.items():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {type}')
+            for key, value in series.items():
+                labels = json.loads(key)
+                lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _collect(self):
+        """{family: (type, help, [(labels, value)])} from every collector"""
+        # Collectors may report into the same family (e.g. cache_hits_total)
+        families = {}
+        for fn in list(self._collectors.values()):
+            try:
+                collected = list(fn())
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, type, help, samples in collected:
+                families.setdefault(name, (type, help, []))[2].extend(samples)
+        return families
+
+    def _snapshot(self):
+        collected = {}
+        for name, (type, help, samples) in self._collect().items():
+            collected[name] = (type, help, [
+                (labels, value - self._collected_baseline.get((name, json.dumps(labels, sort_keys=True)), 0))
+                for labels, value in samples
+            ])
+        return {
+            'metrics': {name: metric.dump() for name, metric in self._metrics.items()},
+            'collected': collected
+        }
+
+    def _read_snapshots(self):
+        snapshots = []
+        for name in os.listdir(self.multiproc_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {name}: {str(e)}")
+        return snapshots
+
+    def _ensure_writer(self):
+        # Restart the writer in a forked child, where the parent's thread is gone
+        if self._writer is not None and self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+        self._writer = threading.Thread(target=self._write_loop, name='metrics-snapshot', daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.snapshot_seconds)
+            self.write_snapshot()
+
+    def _metrics_view(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_db = [0, 0.0]
+        g.metrics_token = _request_db.set(g.metrics_db)
+        if self.profiler is not None and request.endpoint != 'metrics':
+            g.metrics_profile = self.profiler.start()
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        # The rule, not the path, so /get_word_audio/<word> is one series
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        request_seconds.observe(duration, 'flask', request.method, route, str(response.status_code))
+        queries, query_seconds = g.metrics_db
+        request_db_queries.observe(queries, route)
+        request_db_seconds.observe(query_seconds, route)
+        return response
+
+    def _teardown_request(self, exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _request_db.reset(token)
+        # Here rather than in after_request so requests that raised are profiled too
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            duration = time.perf_counter() - g.metrics_started
+            self.profiler.finish(profile, f'{request.method} {route}', duration)
+
+
+def _cache_samples(app):
+    hits, misses, evictions = [], [], []
+    audio = app.extensions.get('audio_cache')
+    if audio is not None:
+        stats = audio.stats()
+        hits += [({'cache': 'audio', 'tier': 'memory'}, stats['memory_hits']),
+                 ({'cache': 'audio', 'tier': 'disk'}, stats['disk_hits'])]
+        misses.append(({'cache': 'audio'}, stats['misses']))
+        evictions.append(({'cache': 'audio'}, stats['evictions']))
+    stats_cache = app.extensions.get('stats_cache')
+    if stats_cache is not None:
+        stats = stats_cache.stats()
+        hits.append(({'cache': 'stats', 'tier': 'memory'}, stats['hits']))
+        misses.append(({'cache': 'stats'}, stats['misses']))
+    yield 'cache_hits_total', 'counter', 'Cache lookups answered from the cache', hits
+    yield 'cache_misses_total', 'counter', 'Cache lookups that had to compute the value', misses
+    yield 'cache_evictions_total', 'counter', 'Entries dropped to stay within the size budget', evictions
+
+
+metrics = Metrics()
+
+request_seconds = metrics.histogram(
+    'http_request_duration_seconds', 'Time until the response starts, per route',
+    ('app', 'method', 'route', 'status'))
+request_db_queries = metrics.histogram(
+    'http_request_db_queries', 'DB queries run by one Flask request', ('route',), COUNT_BUCKETS)
+request_db_seconds = metrics.histogram(
+    'http_request_db_seconds', 'Time one Flask request spent in DB queries', ('route',), QUERY_BUCKETS)
+db_query_seconds = metrics.histogram(
+    'db_query_duration_seconds', 'Time per DB statement, including background writers', (), QUERY_BUCKETS)
+tts_seconds = metrics.histogram(
+    'tts_synthesis_seconds', 'Time to synthesize one uncached clip', ('engine',))
+tts_text_length = metrics.histogram(
+    'tts_text_length_chars', 'Characters per synthesized clip', ('engine',), TEXT_LENGTH_BUCKETS)
+model_load_seconds = metrics.histogram(
+    'model_load_seconds', 'Time to load a model or handler', ('model',),
+    (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+inference_seconds = metrics.histogram(
+    'model_inference_seconds', 'Time per model call', ('model', 'mode'))
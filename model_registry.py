@@ -0,0 +1,191 @@
+"""Local model registry backed by models/manifest.json.
+
+Every model the app loads has a manifest entry recording its version (an
+immutable revision: a Hub commit, or a release number baked into the file
+name), kind, dtype, directory and files (with sha256 and size). Loaders
+resolve models only through the registry: nothing probes paths or
+downloads at startup, and a missing, incomplete or unpinned model raises
+ModelUnavailable with the command that fixes it.
+
+Entries with a "build" section are pre-converted artifacts made from
+another entry by src/scripts/convert_model.py (e.g. safetensors weights in
+the serving dtype), so loading them is just an mmap. They ship with no
+version and no files; convert_model.py fills both in (the version is the
+source's) and they are refused until it has.
+
+    python model_registry.py            # list models and whether they're usable
+    python model_registry.py --verify   # also check every sha256
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+MODELS_DIR = Path(os.environ.get("MODELS_DIR", Path(__file__).resolve().parent / "models"))
+MANIFEST_PATH = MODELS_DIR / "manifest.json"
+
+
+class ModelUnavailable(Exception):
+    """Raised when a model isn't in the manifest or isn't on disk as recorded"""
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRecord:
+    """One manifest entry"""
+
+    def __init__(self, name, entry, models_dir):
+        self.name = name
+        self.version = entry.get("version")
+        self.kind = entry.get("kind")
+        self.dtype = entry.get("dtype")
+        self.build = entry.get("build")
+        self.files = entry.get("files", [])
+        self.path = Path(models_dir) / entry["path"]
+        self.models_dir = Path(models_dir)
+
+    @property
+    def size(self):
+        return sum(f.get("size") or 0 for f in self.files)
+
+    def fix_hint(self):
+        if self.build:
+            return f"run: python -m src.scripts.convert_model {self.name}"
+        return f"run: python download_models.py --models {self.name}"
+
+    def pin_hint(self):
+        if self.build:
+            return self.fix_hint()
+        return f"pin it with: python download_models.py --pin --models {self.name}"
+
+    def check(self, verify=False):
+        """Raise ModelUnavailable unless the entry is pinned and every
+        recorded file is in place.
+
+        Sizes are always compared; `verify` also hashes every file.
+        """
+        if not self.files:
+            raise ModelUnavailable(f"{self.name} has no files in the manifest; {self.fix_hint()}")
+        if not self.version:
+            raise ModelUnavailable(f"{self.name} has no pinned version in the manifest; {self.pin_hint()}")
+        for entry in self.files:
+            if not entry.get("sha256") or entry.get("size") is None:
+                raise ModelUnavailable(f"{self.name}: {entry['path']} has no sha256 and size in the manifest; "
+                                       f"{self.pin_hint()}")
+        if not self.path.is_dir():
+            raise ModelUnavailable(f"{self.name} is not installed at {self.path}; {self.fix_hint()}")
+        for entry in self.files:
+            # Archives are checked through the directory they unpack to
+            if entry.get("extract"):
+                continue
+            file_path = self.models_dir / entry["path"]
+            if not file_path.is_file():
+                raise ModelUnavailable(f"{self.name} is missing {entry['path']}; {self.fix_hint()}")
+            if file_path.stat().st_size != entry["size"]:
+                raise ModelUnavailable(f"{self.name}: {entry['path']} has the wrong size; {self.fix_hint()}")
+            if verify and sha256_file(file_path) != entry["sha256"]:
+                raise ModelUnavailable(f"{self.name}: {entry['path']} fails its sha256 check; {self.fix_hint()}")
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "kind": self.kind,
+            "dtype": self.dtype,
+            "path": str(self.path),
+            "size": self.size
+        }
+
+
+class ModelRegistry:
+    def __init__(self, manifest_path=MANIFEST_PATH, models_dir=MODELS_DIR):
+        self.manifest_path = Path(manifest_path)
+        self.models_dir = Path(models_dir)
+        self._lock = threading.Lock()
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {"models": {}}
+
+    def names(self):
+        return list(self.manifest["models"])
+
+    def get(self, name):
+        entry = self.manifest["models"].get(name)
+        if entry is None:
+            raise ModelUnavailable(f"{name} is not in {self.manifest_path}")
+        return ModelRecord(name, entry, self.models_dir)
+
+    def resolve(self, name, verify=False):
+        """The record for `name`, after checking its files are on disk"""
+        record = self.get(name)
+        record.check(verify=verify)
+        return record
+
+    def record_files(self, name, paths, version):
+        """Pin `version` and the sha256 and size of `paths` (relative to the
+        models directory) as the files of `name` and save the manifest"""
+        files = []
+        for path in sorted(paths):
+            full = self.models_dir / path
+            files.append({"path": str(path), "sha256": sha256_file(full), "size": full.stat().st_size})
+        with self._lock:
+            self.manifest["models"][name]["version"] = version
+            self.manifest["models"][name]["files"] = files
+            self.save()
+        return self.get(name)
+
+    def save(self):
+        tmp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.write("\n")
+        os.replace(tmp, self.manifest_path)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide ModelRegistry, read from the manifest on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the models in the manifest and check they are installed")
+    parser.add_argument("--verify", action="store_true", help="hash every file against the manifest")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    missing = 0
+    for name in registry.names():
+        record = registry.get(name)
+        try:
+            record.check(verify=args.verify)
+            status = "ok"
+        except ModelUnavailable as e:
+            status = f"unavailable: {e}"
+            missing += 1
+        print(f"{name:<22} {record.version or '-':<10} {record.dtype or '-':<9} "
+              f"{record.size / 1e6:>9.1f} MB  {status}")
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from datetime import datetime
 from database import db
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 class LearningStats(db.Model):
     __tablename__ = 'learning_stats'
@@ -10,7 +12,6 @@ class LearningStats(db.Model):
     games_played = db.Column(db.Integer, default=0)
     streak_days = db.Column(db.Integer, default=0)
     last_visit = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    activities = db.Column(db.JSON, default=list)
 
     def __init__(self, user_id):
         self.user_id = user_id
@@ -18,13 +19,236 @@ class LearningStats(db.Model):
         self.games_played = 0
         self.streak_days = 0
         self.last_visit = datetime.utcnow()
-        self.activities = []
 
-    def to_dict(self):
+    def apply_update(self, current_time, topics_explored=None, games_played=None):
+        """Apply counter totals, then move the streak forward to `current_time`"""
+        if topics_explored is not None:
+            self.topics_explored = topics_explored
+        if games_played is not None:
+            self.games_played = games_played
+
+        last_visit = self.last_visit
+
+        # Ensure streak is at least 1 if there's any activity today
+        if self.streak_days == 0 and (self.topics_explored > 0 or self.games_played > 0):
+            self.streak_days = 1
+        elif last_visit:
+            # Calculate days between last activity and now
+            days_difference = (current_time.date() - last_visit.date()).days
+
+            if days_difference == 0:
+                # Same day activity, ensure streak is at least 1
+                if self.streak_days == 0:
+                    self.streak_days = 1
+            elif days_difference == 1:
+                # Activity on consecutive day, increase streak
+                self.streak_days += 1
+            elif days_difference > 1:
+                # More than one day gap, reset streak to 1 (not 0)
+                self.streak_days = 1
+
+        # Update last visit time
+        self.last_visit = current_time
+
+    COUNTERS = ('topics_explored', 'games_played')
+
+    @classmethod
+    def increment(cls, user_id, current_time, **deltas):
+        """Add `deltas` to the user's counters in one upsert, without loading
+        the row, and move the streak forward the same way `apply_update` does.
+
+        Returns the row's new (topics_explored, games_played, streak_days,
+        last_visit). The caller commits.
+        """
+        values = {counter: int(deltas.get(counter, 0)) for counter in cls.COUNTERS}
+        insert = sqlite_insert(cls).values(
+            user_id=user_id,
+            streak_days=1,
+            last_visit=current_time,
+            **values
+        )
+        days_since_visit = (
+            func.julianday(func.date(insert.excluded.last_visit))
+            - func.julianday(func.date(cls.last_visit))
+        )
+        topics = cls.topics_explored + insert.excluded.topics_explored
+        games = cls.games_played + insert.excluded.games_played
+        streak = case(
+            (and_(cls.streak_days == 0, or_(topics > 0, games > 0)), 1),
+            (days_since_visit == 0, case((cls.streak_days == 0, 1), else_=cls.streak_days)),
+            (days_since_visit == 1, cls.streak_days + 1),
+            (days_since_visit > 1, 1),
+            else_=cls.streak_days
+        )
+        statement = insert.on_conflict_do_update(
+            index_elements=[cls.user_id],
+            set_={
+                'topics_explored': topics,
+                'games_played': games,
+                'streak_days': streak,
+                'last_visit': insert.excluded.last_visit
+            }
+        ).returning(cls.topics_explored, cls.games_played, cls.streak_days, cls.last_visit)
+        return db.session.execute(statement).one()
+
+    def to_dict(self, activities=()):
         return {
             'topics_explored': self.topics_explored,
             'games_played': self.games_played,
             'streak_days': self.streak_days,
             'last_visit': self.last_visit.isoformat(),
-            'activities': self.activities or []
-        } 
\ No newline at end of file
+            'activities': [activity.to_dict() for activity in activities]
+        }
+
+class ActivityEvent(db.Model):
+    """Append-only activity history, one row per event"""
+    __tablename__ = 'activity_events'
+    __table_args__ = (
+        db.Index('ix_activity_events_user_time', 'user_id', 'timestamp'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(50), nullable=False)
+    activity_type = db.Column(db.String(32), nullable=False, default='activity')
+    description = db.Column(db.String(255), nullable=False, default='')
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @staticmethod
+    def row(user_id, activity, timestamp):
+        """Insert parameters for an activity dict as sent by main.js"""
+        return {
+            'user_id': user_id,
+            'activity_type': str(activity.get('type') or 'activity')[:32],
+            'description': str(activity.get('description') or '')[:255],
+            'timestamp': timestamp
+        }
+
+    @classmethod
+    def page(cls, user_id, limit=10, before=None):
+        """Newest-first history for `user_id`.
+
+        `before` is the (timestamp, id) of the last row of the previous page;
+        the seek uses the (user_id, timestamp) index instead of an OFFSET scan.
+        """
+        query = cls.query.filter(cls.user_id == user_id)
+        if before is not None:
+            timestamp, event_id = before
+            query = query.filter(or_(
+                cls.timestamp < timestamp,
+                and_(cls.timestamp == timestamp, cls.id < event_id)
+            ))
+        return query.order_by(cls.timestamp.desc(), cls.id.desc()).limit(limit).all()
+
+    @property
+    def cursor(self):
+        return f"{self.timestamp.isoformat()}_{self.id}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        timestamp, event_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(event_id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.activity_type,
+            'description': self.description,
+            'timestamp': self.timestamp.isoformat()
+        }
+
+
+class GameScore(db.Model):
+    """Append-only log of every score the games submit"""
+    __tablename__ = 'game_scores'
+    __table_args__ = (
+        db.Index('ix_game_scores_user_game_time', 'user_id', 'game', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(50), nullable=False)
+    game = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class PersonalBest(db.Model):
+    """Best score per user and game, raised in place as scores are written.
+
+    Leaderboards read the top rows of the (game, best_score DESC, achieved_at)
+    index rather than sorting game_scores.
+    """
+    __tablename__ = 'personal_bests'
+
+    user_id = db.Column(db.String(50), primary_key=True)
+    game = db.Column(db.String(50), primary_key=True)
+    best_score = db.Column(db.Integer, nullable=False)
+    achieved_at = db.Column(db.DateTime, nullable=False)
+    plays = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def record(cls, bests):
+        """Upsert a batch of {user_id, game, best_score, achieved_at, plays}.
+
+        An existing best is only replaced by a strictly higher score, so the
+        earlier of two equal scores keeps its place. The caller commits.
+        """
+        insert = sqlite_insert(cls).values(bests)
+        improved = insert.excluded.best_score > cls.best_score
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.game],
+            set_={
+                'best_score': case((improved, insert.excluded.best_score), else_=cls.best_score),
+                'achieved_at': case((improved, insert.excluded.achieved_at), else_=cls.achieved_at),
+                'plays': cls.plays + insert.excluded.plays
+            }
+        ))
+
+    @classmethod
+    def top(cls, game, limit=10):
+        return (cls.query.filter(cls.game == game)
+                .order_by(cls.best_score.desc(), cls.achieved_at)
+                .limit(limit).all())
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'game': self.game,
+            'best_score': self.best_score,
+            'achieved_at': self.achieved_at.isoformat(),
+            'plays': self.plays
+        }
+
+db.Index('ix_personal_bests_game_rank', PersonalBest.game, PersonalBest.best_score.desc(), PersonalBest.achieved_at)
+
+class DailyRollup(db.Model):
+    """Per-user, per-day, per-activity-type totals derived from activity_events.
+
+    Kept current by the activity write paths and rebuilt from raw events by
+    `flask rollups-backfill`. The primary key doubles as the index for
+    reading a user's date range.
+    """
+    __tablename__ = 'daily_rollups'
+
+    user_id = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    activity_type = db.Column(db.String(32), primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    active_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def add(cls, rows):
+        """Add a batch of {user_id, day, activity_type, events, active_seconds}
+        onto the stored totals. The caller commits."""
+        insert = sqlite_insert(cls).values(rows)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.day, cls.activity_type],
+            set_={
+                'events': cls.events + insert.excluded.events,
+                'active_seconds': cls.active_seconds + insert.excluded.active_seconds
+            }
+        ))
+
+    @classmethod
+    def between(cls, user_id, start, end):
+        """Rows for `user_id` with start <= day < end"""
+        return cls.query.filter(cls.user_id == user_id, cls.day >= start, cls.day < end).all()
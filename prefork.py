@@ -0,0 +1,56 @@
+"""Preload-and-fork support for multi-worker servers.
+
+The parent process loads models and static data once, then forks workers
+that share those pages copy-on-write. Following the gc.freeze() recipe:
+collection is disabled in the parent while it loads (no freed holes on
+shared pages), everything is frozen right before forking (so collections
+in the workers don't write to the parent's object headers), and each
+worker re-enables collection and drops inherited DB connections.
+"""
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def disable_gc():
+    """Call as early as possible in the parent process"""
+    gc.disable()
+
+
+def preload():
+    """Load everything workers would otherwise each load for themselves"""
+    from facts import get_fact_store
+    from src.api.handlers import HANDLERS, ai_model
+
+    get_fact_store()
+    for handler in HANDLERS:
+        try:
+            handler.get()
+        except Exception:
+            # Already logged; workers retry lazily and /ready reports it
+            pass
+    if ai_model.loaded and ai_model.get().use_model:
+        try:
+            ai_model.get().ensure_loaded()
+        except Exception as e:
+            logger.error(f"Failed to preload model weights: {str(e)}")
+
+
+def freeze():
+    """Call right before forking"""
+    gc.freeze()
+    logger.info(f"Froze {gc.get_freeze_count()} objects before forking workers")
+
+
+def reinit_worker(flask_app):
+    """Call first thing in each forked worker"""
+    from database import db
+    from metrics import metrics
+
+    gc.enable()
+    metrics.after_fork()
+    # Pooled SQLite connections opened by the parent must not be shared;
+    # close=False leaves them for the parent to close
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,215 @@
+from database import db
+from models import ActivityEvent, DailyRollup
+from datetime import datetime, timedelta, timezone
+import json
+import time
+
+# Gaps between a learner's consecutive events count as time in app up to
+# this many seconds; anything longer is treated as the app sitting idle
+ACTIVE_GAP_SECONDS = 300
+
+PERIODS = {'week': 52, 'month': 24}
+
+BACKFILL_BATCH = 5000
+# Rows per multi-row upsert, keeping bound parameters under SQLite's limit
+UPSERT_ROWS = 500
+
+
+def active_seconds(previous, timestamp):
+    if previous is None:
+        return 0
+    gap = (timestamp - previous).total_seconds()
+    return int(min(max(gap, 0), ACTIVE_GAP_SECONDS))
+
+
+def rollup_rows(events, last_seen):
+    """Fold activity event rows into DailyRollup deltas.
+
+    `last_seen` maps user_id to the timestamp of that user's newest event
+    already rolled up; it is advanced in place so batches can be chained.
+    """
+    totals = {}
+    for event in sorted(events, key=lambda e: (e['user_id'], e['timestamp'])):
+        user_id, timestamp = event['user_id'], event['timestamp']
+        key = (user_id, timestamp.date(), event['activity_type'])
+        row = totals.setdefault(key, {
+            'user_id': user_id,
+            'day': key[1],
+            'activity_type': key[2],
+            'events': 0,
+            'active_seconds': 0
+        })
+        row['events'] += 1
+        row['active_seconds'] += active_seconds(last_seen.get(user_id), timestamp)
+        last_seen[user_id] = timestamp
+    return list(totals.values())
+
+
+def record_activity(events):
+    """Roll up activity event rows that are about to be inserted.
+
+    Must run in the same transaction as the insert, before it, so the
+    previous-event lookup doesn't see the new rows.
+    """
+    if not events:
+        return
+    user_ids = {event['user_id'] for event in events}
+    # One (user_id, timestamp) index probe per user
+    last_seen = dict(
+        db.session.query(ActivityEvent.user_id, db.func.max(ActivityEvent.timestamp))
+        .filter(ActivityEvent.user_id.in_(user_ids))
+        .group_by(ActivityEvent.user_id)
+        .all()
+    )
+    DailyRollup.add(rollup_rows(events, last_seen))
+
+
+def backfill(user_id=None):
+    """Rebuild daily_rollups from activity_events; returns (events, rows) written"""
+    delete = db.delete(DailyRollup)
+    query = db.select(ActivityEvent.user_id, ActivityEvent.activity_type, ActivityEvent.timestamp)
+    if user_id is not None:
+        delete = delete.where(DailyRollup.user_id == user_id)
+        query = query.where(ActivityEvent.user_id == user_id)
+    query = query.order_by(ActivityEvent.user_id, ActivityEvent.timestamp, ActivityEvent.id)
+
+    db.session.execute(delete)
+    last_seen = {}
+    pending = {}
+    seen = 0
+    for chunk in db.session.execute(query.execution_options(yield_per=BACKFILL_BATCH)).partitions():
+        for row in rollup_rows([row._asdict() for row in chunk], last_seen):
+            key = (row['user_id'], row['day'], row['activity_type'])
+            if key in pending:
+                pending[key]['events'] += row['events']
+                pending[key]['active_seconds'] += row['active_seconds']
+            else:
+                pending[key] = row
+        seen += len(chunk)
+    rows = list(pending.values())
+    for start in range(0, len(rows), UPSERT_ROWS):
+        DailyRollup.add(rows[start:start + UPSERT_ROWS])
+    db.session.commit()
+    return seen, len(rows)
+
+
+def parse_legacy_timestamp(value, fallback):
+    """Naive UTC datetime from an ISO string as main.js sent it"""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return fallback
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def import_legacy_activities():
+    """Copy the activities JSON that learning_stats kept before
+    activity_events existed into activity_events.
+
+    Entries already present (same user, type, description and time) are
+    skipped, so this can be re-run. Returns the number of rows inserted.
+    """
+    columns = {row[1] for row in db.session.execute(db.text('PRAGMA table_info(learning_stats)'))}
+    if 'activities' not in columns:
+        return 0
+    legacy = db.session.execute(db.text(
+        'SELECT user_id, activities, last_visit FROM learning_stats WHERE activities IS NOT NULL'
+    )).all()
+
+    rows = []
+    for user_id, activities, last_visit in legacy:
+        try:
+            activities = json.loads(activities)
+        except ValueError:
+            continue
+        fallback = parse_legacy_timestamp(last_visit, datetime.utcnow())
+        for activity in activities if isinstance(activities, list) else []:
+            if not isinstance(activity, dict):
+                continue
+            row = ActivityEvent.row(user_id, activity, parse_legacy_timestamp(activity.get('timestamp'), fallback))
+            exists = db.session.query(ActivityEvent.id).filter_by(
+                user_id=row['user_id'],
+                activity_type=row['activity_type'],
+                description=row['description'],
+                timestamp=row['timestamp']
+            ).first()
+            if exists is None:
+                rows.append(row)
+    if rows:
+        db.session.execute(db.insert(ActivityEvent), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def chart(user_id, period, count, today=None):
+    """Totals for the last `count` weeks or months, oldest first, read only
+    from daily_rollups"""
+    today = today or datetime.utcnow().date()
+    starts = [period_start(today, period)]
+    for _ in range(count - 1):
+        starts.insert(0, period_start(starts[0] - timedelta(days=1), period))
+
+    buckets = {
+        start: {
+            'start': start.isoformat(),
+            'end': (next_period(start, period) - timedelta(days=1)).isoformat(),
+            'events': 0,
+            'games_played': 0,
+            'topics_explored': 0,
+            'active_seconds': 0,
+            'by_type': {}
+        }
+        for start in starts
+    }
+    for row in DailyRollup.between(user_id, starts[0], next_period(starts[-1], period)):
+        bucket = buckets[period_start(row.day, period)]
+        bucket['events'] += row.events
+        bucket['active_seconds'] += row.active_seconds
+        bucket['by_type'][row.activity_type] = bucket['by_type'].get(row.activity_type, 0) + row.events
+        if row.activity_type == 'game':
+            bucket['games_played'] += row.events
+        elif row.activity_type == 'topic':
+            bucket['topics_explored'] += row.events
+    return [buckets[start] for start in starts]
+
+
+def init_app(app):
+    """Register `flask rollups-backfill` and `flask activities-backfill`"""
+
+    @app.cli.command('rollups-backfill')
+    def backfill_command():
+        """Rebuild daily activity rollups from the raw activity_events table."""
+        started = time.perf_counter()
+        events, rows = backfill()
+        print(json.dumps({
+            'events': events,
+            'rollup_rows': rows,
+            'seconds': round(time.perf_counter() - started, 3)
+        }))
+
+    @app.cli.command('activities-backfill')
+    def activities_backfill_command():
+        """Copy pre-activity_events history from learning_stats, then rebuild rollups."""
+        started = time.perf_counter()
+        imported = import_legacy_activities()
+        events, rows = backfill()
+        print(json.dumps({
+            'imported': imported,
+            'events': events,
+            'rollup_rows': rows,
+            'seconds': round(time.perf_counter() - started, 3)
+        }))
@@ -1,85 +1,89 @@
-from flask import jsonify, request, send_file, after_this_request
+from flask import jsonify, request
 from database import db
-from models import LearningStats
+from models import ActivityEvent, LearningStats, PersonalBest
+from assets import assets
+from audio_cache import audio_cache, speech_response
+from facts import get_fact_store
+from ingest import activity_ingest
+from life import HashLife, LifeBoard, LifeTooComplex
+from scores import leaderboards, score_ingest
+from rollups import PERIODS, chart, record_activity
+from stats_cache import stats_cache, stats_response
+from tts_stream import speech_stream_response
+from audio_warmup import multipart_audio_response, start_warmup, synthesize_many, warmup_status
 from datetime import datetime, timedelta
-from gtts import gTTS
-import io
 import logging
-import random
-import os
-import tempfile
+import re
 
 logger = logging.getLogger(__name__)
 
-# Add topic-specific fun facts
-TOPIC_FACTS = {
-    'planets': [
-        "Venus spins backwards compared to most other planets!",
-        "One year on Jupiter is equal to 12 Earth years!",
-        "Saturn's rings are mostly made of ice and rock!",
-        "Mars has the largest volcano in our solar system - Olympus Mons!",
-        "Neptune has the strongest winds in the solar system, reaching 1,200 mph!"
-    ],
-    'dinosaurs': [
-        "T-Rex had teeth as long as bananas!",
-        "Some dinosaurs were as small as chickens!",
-        "Stegosaurus had a brain the size of a walnut!",
-        "Scientists think many dinosaurs had feathers!",
-        "The longest dinosaur was the Argentinosaurus, about 115 feet long!"
-    ],
-    'human body': [
-        "Your body has enough iron to make a 3-inch nail!",
-        "Your heart beats about 115,000 times each day!",
-        "Humans are the only animals that blush!",
-        "Your bones are stronger than steel, pound for pound!",
-        "You grow about 8 meters of hair every day across your entire body!"
-    ],
-    'animals': [
-        "Sloths can hold their breath for 40 minutes underwater!",
-        "Butterflies taste with their feet!",
-        "Hippos secrete their own sunscreen - a pink liquid!",
-        "A group of flamingos is called a 'flamboyance'!",
-        "Octopuses have three hearts and blue blood!"
-    ],
-    'weather': [
-        "Lightning strikes Earth about 100 times every second!",
-        "A hurricane can dump 2.4 trillion gallons of rain a day!",
-        "The fastest wind ever recorded was 253 miles per hour!",
-        "Raindrops can fall at up to 20 miles per hour!",
-        "Thunder can be heard from about 12 miles away!"
-    ],
-    'ocean life': [
-        "The blue whale's tongue weighs as much as an elephant!",
-        "Some jellyfish are immortal!",
-        "Octopuses have nine brains!",
-        "Seahorses are the only fish species where males give birth!",
-        "The loudest animal in the ocean is the sperm whale!"
-    ],
-    'plants': [
-        "Bamboo can grow up to 35 inches in a single day!",
-        "Some trees communicate with each other through their roots!",
-        "The oldest living tree is over 5,000 years old!",
-        "Plants can recognize their siblings!",
-        "Some plants can count!"
-    ],
-    'space exploration': [
-        "The first animal in space was a dog named Laika!",
-        "One day on Venus is longer than its year!",
-        "Astronauts grow taller in space!",
-        "The footprints on the Moon will last for 100 million years!",
-        "The space suit astronauts wear weighs about 280 pounds on Earth!"
-    ]
-}
+# Words used by the spelling bee (static/js/games/spelling-bee.js)
+SPELLING_WORDS = [
+    'elephant', 'giraffe', 'penguin', 'butterfly',
+    'kangaroo', 'octopus', 'dolphin', 'rhinoceros'
+]
+
+MAX_BATCH_TEXTS = 100
+
+DEFAULT_USER_ID = "luca"
+MAX_COUNTER_DELTA = 1000
+MAX_ACTIVITY_PAGE = 100
+
+GAME_NAME = re.compile(r'^[a-z0-9][a-z0-9-]{0,49}$')
+MAX_SCORE = 1000000
+MAX_SCORES_PER_REQUEST = 100
+MAX_EVENTS_PER_REQUEST = 100
+MAX_COUNTER = 1000000
+MAX_ACTIVITY_TYPE = 32
+MAX_ACTIVITY_DESCRIPTION = 255
+
+MAX_LIFE_SIDE = 1024
+MAX_LIFE_CELLS = 100000
+# Dense boards cost generations x cells; HashLife skips ahead
+# Cells move at most one step per generation, so hashlife results stay
+# within MAX_LIFE_COORDINATE + 2^52 < 2^53, exact as JS numbers
+MAX_LIFE_GENERATIONS = {'dense': 10000, 'hashlife': 2 ** 52}
+MAX_LIFE_COORDINATE = 2 ** 31
+# Cells x generations per dense request: about a quarter second of stepping
+MAX_LIFE_WORK = 2 ** 28
+# HashLife per request: quadtree nodes (~700 bytes each with their caches)
+# and compute time, whichever runs out first
+MAX_LIFE_NODES = 100000
+MAX_LIFE_SECONDS = 0.5
+
+def current_user_id():
+    """The learner a request is for: X-User-Id header, then ?user_id=, then
+    the JSON body, falling back to the original single user"""
+    body = request.get_json(silent=True) if request.is_json else None
+    user_id = (
+        request.headers.get('X-User-Id')
+        or request.args.get('user_id')
+        or (body.get('user_id') if isinstance(body, dict) else None)
+        or DEFAULT_USER_ID
+    )
+    return str(user_id).strip()[:50] or DEFAULT_USER_ID
+
+def warmup_texts():
+    """Every clip the games can ask for: spelling words and topic facts"""
+    return list(SPELLING_WORDS) + list(get_fact_store().all_facts())
 
 def register_routes(app):
     @app.route('/')
     def home():
-        return app.send_static_file('index.html')
+        # References rewritten to fingerprinted /assets URLs
+        return assets.page_response('index.html')
 
     @app.route('/api/stats', methods=['GET'])
     def get_stats():
         try:
-            user_id = "luca"
+            user_id = current_user_id()
+            current_time = datetime.utcnow()
+            
+            # Served from memory once the streak has been checked today
+            entry = stats_cache.get(user_id, current_time.date())
+            if entry is not None:
+                return stats_response(entry)
+            
             stats = LearningStats.query.filter_by(user_id=user_id).first()
             
             if not stats:
@@ -89,7 +93,6 @@ def register_routes(app):
             
             # Update streak
             last_visit = stats.last_visit
-            current_time = datetime.utcnow()
             
             if last_visit.date() < current_time.date():
                 if last_visit.date() + timedelta(days=1) == current_time.date():
@@ -100,7 +103,8 @@ def register_routes(app):
                 stats.last_visit = current_time
                 db.session.commit()
             
-            return jsonify(stats.to_dict())
+            entry = stats_cache.set(user_id, stats.to_dict(ActivityEvent.page(user_id)), current_time.date())
+            return stats_response(entry)
         except Exception as e:
             logger.error(f"Error in get_stats: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
@@ -109,9 +113,9 @@ def register_routes(app):
     def update_stats():
         try:
             data = request.json
-            logger.debug(f"Received update request with data: {data}")
+            logger.debug("Received update request with data: %s", data)
             
-            user_id = "luca"
+            user_id = current_user_id()
             stats = LearningStats.query.filter_by(user_id=user_id).first()
             
             if not stats:
@@ -120,81 +124,295 @@ def register_routes(app):
                 db.session.add(stats)
                 db.session.commit()
             
-            # Update basic stats
-            if 'topics_explored' in data:
-                stats.topics_explored = data['topics_explored']
-            if 'games_played' in data:
-                stats.games_played = data['games_played']
-            if 'activity' in data:
-                current_activities = stats.activities if stats.activities else []
-                stats.activities = [data['activity']] + current_activities[:9]
-            
-            # Update streak based on activity
             current_time = datetime.utcnow()
-            last_visit = stats.last_visit
-
-            # Ensure streak is at least 1 if there's any activity today
-            if stats.streak_days == 0 and (stats.topics_explored > 0 or stats.games_played > 0):
-                stats.streak_days = 1
-                logger.info("Started streak at 1 due to activity")
-            elif last_visit:
-                # Calculate days between last activity and now
-                days_difference = (current_time.date() - last_visit.date()).days
-                
-                if days_difference == 0:
-                    # Same day activity, ensure streak is at least 1
-                    if stats.streak_days == 0:
-                        stats.streak_days = 1
-                        logger.info("Set streak to 1 for today's activity")
-                elif days_difference == 1:
-                    # Activity on consecutive day, increase streak
-                    stats.streak_days += 1
-                    logger.info(f"Consecutive day activity, increased streak to {stats.streak_days}")
-                elif days_difference > 1:
-                    # More than one day gap, reset streak to 1 (not 0)
-                    stats.streak_days = 1
-                    logger.info("Gap in activity, reset streak to 1")
-            
-            # Update last visit time
-            stats.last_visit = current_time
+            stats.apply_update(
+                current_time,
+                topics_explored=data.get('topics_explored'),
+                games_played=data.get('games_played')
+            )
+            if data.get('activity'):
+                event = ActivityEvent.row(user_id, data['activity'], current_time)
+                record_activity([event])
+                db.session.add(ActivityEvent(**event))
             
             db.session.commit()
             logger.info("Successfully updated stats")
             
-            return jsonify(stats.to_dict())
+            # The write path refreshes the cached payload for later reads
+            entry = stats_cache.set(user_id, stats.to_dict(ActivityEvent.page(user_id)), current_time.date())
+            return jsonify(entry['payload'])
         except Exception as e:
             logger.error(f"Error in update_stats: {str(e)}", exc_info=True)
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/stats/increment', methods=['POST'])
+    def increment_stats():
+        try:
+            data = request.json or {}
+            deltas = {}
+            for counter in LearningStats.COUNTERS:
+                delta = data.get(counter, 0)
+                if isinstance(delta, bool) or not isinstance(delta, int) or not 0 <= delta <= MAX_COUNTER_DELTA:
+                    return jsonify({'error': f'{counter} must be an integer between 0 and {MAX_COUNTER_DELTA}'}), 400
+                deltas[counter] = delta
+            
+            user_id = current_user_id()
+            # Single UPDATE ... SET n = n + :delta (or INSERT) with no prior SELECT,
+            # so concurrent tabs and workers can't lose each other's increments
+            topics_explored, games_played, streak_days, last_visit = LearningStats.increment(
+                user_id, datetime.utcnow(), **deltas
+            )
+            db.session.commit()
+            stats_cache.invalidate(user_id)
+            
+            return jsonify({
+                'topics_explored': topics_explored,
+                'games_played': games_played,
+                'streak_days': streak_days,
+                'last_visit': last_visit.isoformat()
+            })
+        except Exception as e:
+            logger.error(f"Error in increment_stats: {str(e)}", exc_info=True)
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/stats/activities', methods=['GET'])
+    def get_activities():
+        try:
+            user_id = current_user_id()
+            limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_ACTIVITY_PAGE)
+            cursor = request.args.get('before')
+            try:
+                before = ActivityEvent.parse_cursor(cursor) if cursor else None
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            activities = ActivityEvent.page(user_id, limit=limit, before=before)
+            return jsonify({
+                'activities': [activity.to_dict() for activity in activities],
+                'next_cursor': activities[-1].cursor if len(activities) == limit else None
+            })
+        except Exception as e:
+            logger.error(f"Error in get_activities: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/stats/rollups', methods=['GET'])
+    def get_rollups():
+        try:
+            period = request.args.get('period', 'week')
+            if period not in PERIODS:
+                return jsonify({'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+            count = request.args.get('count', 12 if period == 'week' else 6, type=int)
+            count = max(1, min(count, PERIODS[period]))
+            
+            user_id = current_user_id()
+            return jsonify({'period': period, 'buckets': chart(user_id, period, count)})
+        except Exception as e:
+            logger.error(f"Error in get_rollups: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/stats/ingest', methods=['POST'])
+    def ingest_stats():
+        try:
+            data = request.json or {}
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object'}), 400
+            events = data.get('events', [data])
+            if not isinstance(events, list) or not 0 < len(events) <= MAX_EVENTS_PER_REQUEST:
+                return jsonify({'error': f'Send between 1 and {MAX_EVENTS_PER_REQUEST} events'}), 400
+            for event in events:
+                if not isinstance(event, dict):
+                    return jsonify({'error': 'Each event must be an object'}), 400
+                for counter in ('topics_explored', 'games_played'):
+                    value = event.get(counter)
+                    if value is not None and (isinstance(value, bool) or not isinstance(value, int)
+                                              or not 0 <= value <= MAX_COUNTER):
+                        return jsonify({'error': f'{counter} must be an integer between 0 and {MAX_COUNTER}'}), 400
+                activity = event.get('activity')
+                if activity is not None and not (
+                        isinstance(activity, dict)
+                        and isinstance(activity.get('type'), str)
+                        and 0 < len(activity['type']) <= MAX_ACTIVITY_TYPE
+                        and isinstance(activity.get('description', ''), str)
+                        and len(activity.get('description', '')) <= MAX_ACTIVITY_DESCRIPTION):
+                    return jsonify({'error': f'activity must be an object with a type of at most {MAX_ACTIVITY_TYPE} '
+                                             f'characters and a description of at most {MAX_ACTIVITY_DESCRIPTION}'}), 400
+            
+            user_id = current_user_id()
+            queued = 0
+            for event in events:
+                queued += activity_ingest.submit(
+                    user_id,
+                    topics_explored=event.get('topics_explored'),
+                    games_played=event.get('games_played'),
+                    activity=event.get('activity')
+                )
+            if queued < len(events):
+                return jsonify({'error': 'Ingest queue is full, retry later', 'queued': queued}), 503
+            
+            # Written by the background flusher; nothing touches the DB here
+            return jsonify({'queued': len(events)}), 202
+        except Exception as e:
+            logger.error(f"Error in ingest_stats: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/games/api/save-score', methods=['POST'])
+    def save_score():
+        try:
+            data = request.json or {}
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object'}), 400
+            scores = data.get('scores', [data])
+            if not isinstance(scores, list) or not 0 < len(scores) <= MAX_SCORES_PER_REQUEST:
+                return jsonify({'error': f'Send between 1 and {MAX_SCORES_PER_REQUEST} scores'}), 400
+            for entry in scores:
+                game = entry.get('game') if isinstance(entry, dict) else None
+                score = entry.get('score') if isinstance(entry, dict) else None
+                if not isinstance(game, str) or not GAME_NAME.match(game):
+                    return jsonify({'error': 'Invalid game'}), 400
+                if isinstance(score, bool) or not isinstance(score, int) or not 0 <= score <= MAX_SCORE:
+                    return jsonify({'error': f'score must be an integer between 0 and {MAX_SCORE}'}), 400
+            
+            user_id = current_user_id()
+            queued = 0
+            for entry in scores:
+                queued += score_ingest.submit(user_id, entry['game'], entry['score'],
+                                              completed=bool(entry.get('completed')))
+            if queued < len(scores):
+                return jsonify({'error': 'Score queue is full, retry later', 'queued': queued}), 503
+            
+            # Inserted and folded into leaderboards by the background flusher
+            return jsonify({'queued': len(scores)}), 202
+        except Exception as e:
+            logger.error(f"Error in save_score: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/games/api/life/step', methods=['POST'])
+    def life_step():
+        try:
+            data = request.json or {}
+            mode = data.get('mode', 'dense')
+            if mode not in MAX_LIFE_GENERATIONS:
+                return jsonify({'error': 'mode must be dense or hashlife'}), 400
+            generations = data.get('generations', 1)
+            if (isinstance(generations, bool) or not isinstance(generations, int)
+                    or not 0 <= generations <= MAX_LIFE_GENERATIONS[mode]):
+                return jsonify({'error': f'generations must be an integer between 0 and {MAX_LIFE_GENERATIONS[mode]}'}), 400
+            cells = data.get('cells', [])
+            if (not isinstance(cells, list) or len(cells) > MAX_LIFE_CELLS
+                    or not all(isinstance(cell, list) and len(cell) == 2
+                               and all(isinstance(v, int) and not isinstance(v, bool)
+                                       and abs(v) <= MAX_LIFE_COORDINATE for v in cell)
+                               for cell in cells)):
+                return jsonify({'error': f'cells must be a list of at most {MAX_LIFE_CELLS} [row, col] pairs '
+                                         f'of integers within +/-{MAX_LIFE_COORDINATE}'}), 400
+
+            if mode == 'hashlife':
+                # Unbounded plane: no width/height, coordinates may be negative
+                universe = HashLife(cells, max_nodes=MAX_LIFE_NODES, max_population=MAX_LIFE_CELLS,
+                                    max_seconds=MAX_LIFE_SECONDS)
+            else:
+                width, height = data.get('width'), data.get('height')
+                if not all(isinstance(v, int) and not isinstance(v, bool) and 0 < v <= MAX_LIFE_SIDE
+                           for v in (width, height)):
+                    return jsonify({'error': f'width and height must be integers between 1 and {MAX_LIFE_SIDE}'}), 400
+                if width * height * generations > MAX_LIFE_WORK:
+                    return jsonify({'error': f'width x height x generations must be at most {MAX_LIFE_WORK}'}), 400
+                universe = LifeBoard(width, height, cells, wrap=data.get('wrap', True) is not False)
+
+            # Only the cells that changed go back; the client applies them
+            return jsonify(universe.step(generations))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except (LifeTooComplex, RecursionError) as e:
+            return jsonify({'error': str(e) or 'pattern too complex'}), 413
+        except Exception as e:
+            logger.error(f"Error in life_step: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/games/api/leaderboard/<game>', methods=['GET'])
+    def get_leaderboard(game):
+        try:
+            if not GAME_NAME.match(game):
+                return jsonify({'error': 'Invalid game'}), 400
+            limit = min(request.args.get('limit', leaderboards.size, type=int), leaderboards.size)
+            return jsonify({'game': game, 'leaders': leaderboards.top(game, max(limit, 1))})
+        except Exception as e:
+            logger.error(f"Error in get_leaderboard: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/games/api/personal-bests', methods=['GET'])
+    def get_personal_bests():
+        try:
+            user_id = current_user_id()
+            # Primary key lookup on (user_id, game)
+            bests = PersonalBest.query.filter_by(user_id=user_id).order_by(PersonalBest.game).all()
+            return jsonify({'user_id': user_id, 'personal_bests': [best.to_dict() for best in bests]})
+        except Exception as e:
+            logger.error(f"Error in get_personal_bests: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/speak', methods=['POST'])
     def speak():
         try:
             text = request.json.get('text', '')
-            tts = gTTS(text=text, lang='en', slow=False)
-            mp3_fp = io.BytesIO()
-            tts.write_to_fp(mp3_fp)
-            mp3_fp.seek(0)
-            return send_file(mp3_fp, mimetype='audio/mpeg', as_attachment=True, download_name='speech.mp3')
+            return speech_response(text, download_name='speech.mp3')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/speak/stream', methods=['GET', 'POST'])
+    def speak_stream():
+        try:
+            if request.method == 'POST':
+                text = request.json.get('text', '')
+            else:
+                text = request.args.get('text', '')
+            return speech_stream_response(text)
+        except Exception as e:
+            logger.error(f"Error in speak_stream: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/speak/cache', methods=['GET'])
+    def speak_cache_stats():
+        return jsonify(audio_cache.stats())
+
+    @app.route('/api/audio/warmup', methods=['GET', 'POST'])
+    def audio_warmup():
+        if request.method == 'POST' and warmup_status.get('state') != 'running':
+            start_warmup(app, warmup_texts())
+            return jsonify({'state': 'started'}), 202
+        return jsonify(warmup_status)
+
+    @app.route('/api/audio/batch', methods=['POST'])
+    def audio_batch():
+        try:
+            texts = (request.json or {}).get('texts', [])
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                return jsonify({'error': 'texts must be a list of strings'}), 400
+            if len(texts) > MAX_BATCH_TEXTS:
+                return jsonify({'error': f'At most {MAX_BATCH_TEXTS} texts per batch'}), 400
+
+            clips = synthesize_many(texts, max_workers=app.config['AUDIO_WARMUP_WORKERS'])
+            return multipart_audio_response(clips)
         except Exception as e:
+            logger.error(f"Error in audio_batch: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/ask', methods=['POST'])
     def ask_question():
         try:
             data = request.json
-            topic = data.get('text', '').lower()
+            fact_store = get_fact_store()
             
             # Extract topic name from the question
-            for key in TOPIC_FACTS.keys():
-                if key in topic:
-                    facts = TOPIC_FACTS[key]
-                    response = random.choice(facts)
-                    return jsonify({
-                        'success': True,
-                        'response': response,
-                        'topic': key
-                    })
+            topic = fact_store.match(data.get('text', ''))
+            if topic is not None:
+                return jsonify({
+                    'success': True,
+                    'response': fact_store.random_fact(topic),
+                    'topic': topic
+                })
             
             # Fallback for unknown topics
             return jsonify({
@@ -213,22 +431,7 @@ def register_routes(app):
     @app.route('/get_word_audio/<word>')
     def get_word_audio(word):
         try:
-            # Create gTTS object
-            tts = gTTS(text=word, lang='en', slow=False)
-            
-            # Create a temporary file to store the audio
-            temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-            
-            # Save the audio to the temporary file
-            tts.save(temp_file.name)
-            
-            # Send the file and then clean up
-            @after_this_request
-            def remove_file(response):
-                os.unlink(temp_file.name)
-                return response
-            
-            return send_file(temp_file.name, mimetype='audio/mpeg')
+            return speech_response(word)
         except Exception as e:
             app.logger.error(f"Error generating audio: {str(e)}")
             return jsonify({"error": "Failed to generate audio"}), 500 
\ No newline at end of file
@@ -0,0 +1,178 @@
+from database import db
+from ingest import WriteBehindQueue
+from models import GameScore, PersonalBest
+from datetime import datetime
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TopK:
+    """One game's leaderboard: the best `size` personal bests, one per user,
+    kept sorted as scores arrive."""
+
+    def __init__(self, size, entries=()):
+        self.size = size
+        self._keys = []
+        self._by_user = {}
+        self.loaded = time.monotonic()
+        for entry in entries:
+            self.offer(entry['user_id'], entry['best_score'], entry['achieved_at'])
+
+    def offer(self, user_id, score, achieved_at):
+        """Account for a new score; returns True if the board changed"""
+        key = (-score, achieved_at, user_id)
+        current = self._by_user.get(user_id)
+        if current is not None:
+            if key >= current:
+                return False
+            self._keys.pop(bisect.bisect_left(self._keys, current))
+        elif len(self._keys) >= self.size:
+            if key >= self._keys[-1]:
+                return False
+            del self._by_user[self._keys.pop()[2]]
+        bisect.insort(self._keys, key)
+        self._by_user[user_id] = key
+        return True
+
+    def entries(self, limit=None):
+        return [
+            {'rank': rank, 'user_id': user_id, 'score': -score, 'achieved_at': achieved_at.isoformat()}
+            for rank, (score, achieved_at, user_id) in enumerate(self._keys[:limit], start=1)
+        ]
+
+
+class Leaderboards:
+    """Per-game top-K boards held in memory.
+
+    A board is read from the personal_bests index the first time it is asked
+    for, then updated in place by every score this process writes. Boards are
+    re-read after `max_age` seconds to pick up scores written by other
+    worker processes.
+    """
+
+    def __init__(self, size=10, max_age=30.0):
+        self.size = size
+        self.max_age = max_age
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.size = app.config.get('LEADERBOARD_SIZE', self.size)
+        self.max_age = app.config.get('LEADERBOARD_MAX_AGE', self.max_age)
+        app.extensions['leaderboards'] = self
+
+    def top(self, game, limit=None):
+        """Leaderboard entries for `game`; needs an app context on a miss"""
+        with self._lock:
+            board = self._boards.get(game)
+            if board is not None and time.monotonic() - board.loaded <= self.max_age:
+                return board.entries(limit)
+        rows = PersonalBest.top(game, self.size)
+        board = TopK(self.size, [
+            {'user_id': row.user_id, 'best_score': row.best_score, 'achieved_at': row.achieved_at}
+            for row in rows
+        ])
+        with self._lock:
+            self._boards[game] = board
+            return board.entries(limit)
+
+    def record(self, game, user_id, score, achieved_at):
+        with self._lock:
+            board = self._boards.get(game)
+            # Boards nobody has read yet are loaded from the database on demand
+            if board is not None:
+                board.offer(user_id, score, achieved_at)
+
+    def invalidate(self, *games):
+        with self._lock:
+            for game in games:
+                self._boards.pop(game, None)
+
+
+leaderboards = Leaderboards()
+
+
+def coalesce_scores(events):
+    """Best score and play count per (user, game) in a batch of score events"""
+    bests = {}
+    for event in events:
+        key = (event['user_id'], event['game'])
+        best = bests.get(key)
+        if best is None:
+            bests[key] = {
+                'user_id': event['user_id'],
+                'game': event['game'],
+                'best_score': event['score'],
+                'achieved_at': event['time'],
+                'plays': 1
+            }
+            continue
+        best['plays'] += 1
+        if event['score'] > best['best_score']:
+            best['best_score'] = event['score']
+            best['achieved_at'] = event['time']
+    return list(bests.values())
+
+
+class ScoreIngestor:
+    """Write-behind path for /games/api/save-score: scores are queued in
+    memory, then each flush inserts them with one executemany and raises
+    personal bests with one upsert."""
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+
+    def init_app(self, app):
+        self.app = app
+        self.queue = WriteBehindQueue(
+            self._write,
+            max_items=app.config.get('SCORES_MAX_EVENTS', 500),
+            max_delay=app.config.get('SCORES_MAX_DELAY', 1.0),
+            max_pending=app.config.get('SCORES_MAX_PENDING', 50000),
+            name='score-ingest'
+        )
+        app.extensions['score_ingest'] = self
+
+    def submit(self, user_id, game, score, completed=False):
+        """Queue one score; returns False when the queue is full"""
+        return self.queue.put({
+            'user_id': user_id,
+            'game': game,
+            'score': score,
+            'completed': completed,
+            'time': datetime.utcnow()
+        })
+
+    def flush(self):
+        return self.queue.flush()
+
+    def _write(self, events):
+        bests = coalesce_scores(events)
+        with self.app.app_context():
+            try:
+                db.session.execute(db.insert(GameScore), [
+                    {
+                        'user_id': event['user_id'],
+                        'game': event['game'],
+                        'score': event['score'],
+                        'completed': event['completed'],
+                        'created_at': event['time']
+                    }
+                    for event in events
+                ])
+                PersonalBest.record(bests)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        for best in bests:
+            leaderboards.record(best['game'], best['user_id'], best['best_score'], best['achieved_at'])
+        logger.debug(f"Flushed {len(events)} scores for {len(bests)} personal bests")
+
+
+score_ingest = ScoreIngestor()
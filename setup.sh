@@ -15,8 +15,8 @@ pip3 install torch torchvision torchaudio
 
 # Install basic requirements
 pip install flask==3.0.2 flask-sqlalchemy==3.1.1 
-pip install fastapi uvicorn python-multipart
-pip install numpy gTTS==2.5.1
+pip install fastapi uvicorn websockets a2wsgi gunicorn uvicorn-worker python-multipart
+pip install numpy gTTS==2.5.1 brotli
 pip install pyttsx3 vosk sounddevice
 
 # Install transformer-related packages
@@ -25,7 +25,20 @@ pip install transformers sentencepiece accelerate safetensors
 # Initialize the database
 python3 database.py
 
-# Download models
+# Download models, then build the safetensors artifacts the app loads.
+# Exit status 2 means the manifest isn't pinned yet: pin it against the Hub
+# (commit, LFS sha256s and sizes) while downloading
 python3 download_models.py
+status=$?
+if [ $status -eq 2 ]; then
+    echo "models/manifest.json is not pinned; pinning it now (commit the result)"
+    python3 download_models.py --pin || exit 1
+elif [ $status -ne 0 ]; then
+    exit 1
+fi
+python3 -m src.scripts.convert_model || exit 1
+
+# Every model must now resolve from the manifest with matching hashes
+python3 model_registry.py --verify || exit 1
 
 echo "Setup complete! Your environment is ready." 
\ No newline at end of file
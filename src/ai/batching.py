@@ -0,0 +1,97 @@
+from concurrent.futures import Future
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """Dynamic micro-batching in front of a batch function.
+
+    Requests submitted from any thread are collected for up to `max_wait_ms`
+    after the first one arrives, or until `max_batch_size` are waiting, then
+    handed to `run_batch(key, payloads)` in one call. Only requests with the
+    same key (e.g. the same sampling parameters) share a batch.
+    `run_batch` must return one result per payload, in order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10):
+        self._run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    def submit(self, payload, key=None) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((key, payload, future))
+        return future
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'queued': self._queue.qsize()
+        }
+
+    def _ensure_worker(self):
+        # Restart the worker in a forked child, where the parent's thread is gone
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name='batch-scheduler', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for key, payload, future in self._collect():
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(key, []).append((payload, future))
+
+            for key, items in groups.items():
+                self._run(key, items)
+
+    def _run(self, key, items):
+        payloads = [payload for payload, _ in items]
+        try:
+            results = self._run_batch(key, payloads)
+        except Exception as e:
+            logger.error(f"Batch of {len(items)} failed: {str(e)}")
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.requests += len(items)
+        self.largest_batch = max(self.largest_batch, len(items))
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
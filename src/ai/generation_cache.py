@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from pathlib import Path
+import atexit
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_PATH = Path(__file__).resolve().parent.parent.parent / "instance"
+
+
+def default_db_path():
+    """The app's database, resolved the way src/main.py configures it"""
+    return Path(os.environ.get("LEARNING_LAB_DB", INSTANCE_PATH / "learning_lab.db"))
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation and spacing so trivially different prompts share answers"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", prompt.lower())).strip()
+
+
+class GenerationCache:
+    """LRU + TTL memo of generated answers.
+
+    Entries are keyed by the normalized prompt, model id and sampling
+    parameters. Each entry collects up to `variants` distinct answers before
+    it starts serving hits, then picks one at random, so repeated questions
+    still get some variety. With `db_path` set, entries are reloaded from
+    SQLite on start and written behind by one writer thread on one
+    connection, so callers (the batch scheduler's done-callbacks) never wait
+    on the disk.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 7 * 24 * 3600,
+                 variants: int = 3, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants = max(1, variants)
+        self.db_path = str(db_path) if db_path else None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+        # key -> latest snapshot; rewrites of a key before a flush coalesce
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._conn = None
+        self._pid = None
+        if self.db_path:
+            atexit.register(self.flush)
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(prompt: str, model_id: str, params) -> str:
+        payload = json.dumps([normalize_prompt(prompt), model_id, sorted(dict(params).items())])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return a cached answer, or None if the entry is missing, expired or
+        still collecting variants"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None or entry["attempts"] < self.variants:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry["answers"])
+
+    def add(self, key: str, answer: str):
+        """Record a freshly generated answer for `key`"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"answers": [], "attempts": 0, "created": time.time()}
+                self._entries[key] = entry
+            # Count attempts rather than distinct answers so deterministic
+            # sampling settles after `variants` tries instead of never
+            entry["attempts"] += 1
+            if answer not in entry["answers"]:
+                entry["answers"].append(answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            snapshot = dict(entry, answers=list(entry["answers"]))
+        if self.db_path:
+            self._ensure_writer()
+            with self._cond:
+                self._pending[key] = snapshot
+                self._cond.notify()
+
+    def flush(self):
+        """Write pending entries now, on the calling thread"""
+        # Swap under the write lock so an older snapshot never lands after a newer one
+        with self._write_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            self._persist(pending)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "persistent": self.db_path is not None,
+                "pending_writes": len(self._pending)
+            }
+
+    def _connect(self, **kwargs):
+        conn = sqlite3.connect(self.db_path, timeout=5, **kwargs)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generation_cache ("
+            " key TEXT PRIMARY KEY,"
+            " answers TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        return conn
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.db_path:
+                return
+            try:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                with self._connect() as conn:
+                    cutoff = time.time() - self.ttl_seconds
+                    conn.execute("DELETE FROM generation_cache WHERE created < ?", (cutoff,))
+                    rows = conn.execute(
+                        "SELECT key, answers, attempts, created FROM generation_cache"
+                        " ORDER BY created DESC LIMIT ?",
+                        (self.max_entries,)
+                    ).fetchall()
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not load generation cache: {str(e)}")
+                return
+            for key, answers, attempts, created in reversed(rows):
+                self._entries[key] = {
+                    "answers": json.loads(answers),
+                    "attempts": attempts,
+                    "created": created
+                }
+            logger.info(f"Loaded {len(rows)} cached generations")
+
+    def _ensure_writer(self):
+        # Restart the writer in a forked child, where the parent's thread and
+        # connection are unusable
+        if self._writer is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._writer is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._conn = None
+                self._writer = threading.Thread(target=self._run, name="generation-cache-writer",
+                                                daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            self.flush()
+
+    def _persist(self, pending):
+        if not pending:
+            return
+        rows = [
+            (key, json.dumps(entry["answers"]), entry["attempts"], entry["created"])
+            for key, entry in pending.items()
+        ]
+        try:
+            if self._conn is None:
+                self._conn = self._connect(check_same_thread=False)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO generation_cache (key, answers, attempts, created)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET"
+                    " answers = excluded.answers, attempts = excluded.attempts",
+                    rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist {len(rows)} generation cache entries: {str(e)}")
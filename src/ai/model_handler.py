@@ -1,226 +1,253 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import (AutoModelForCausalLM, AutoTokenizer, StoppingCriteria,
+                          StoppingCriteriaList, TextIteratorStreamer, pipeline)
+from .batching import BatchScheduler
+from .generation_cache import GenerationCache, default_db_path
+from concurrent.futures import Future
+from facts import get_fact_store
+from metrics import inference_seconds, model_load_seconds
+from model_registry import ModelUnavailable, get_registry
 import torch
-from pathlib import Path
 import logging
+import os
+import threading
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# float32: full precision. bfloat16: half the memory, same exponent range.
+# int8: float32 weights with every Linear layer dynamically quantized (CPU only).
+LOAD_PROFILES = ("float32", "bfloat16", "int8")
+
+# Registry entry each profile loads (int8 quantizes the float32 weights)
+PROFILE_MODELS = {"float32": "opt-350m", "bfloat16": "opt-350m-bfloat16", "int8": "opt-350m"}
+
+PROMPT_TEMPLATE = (
+    "Answer the question for a curious 8-year-old in one or two short, fun sentences.\n"
+    "Question: {question}\n"
+    "Answer:"
+)
+
+class CancelledCriteria(StoppingCriteria):
+    """Stops generation as soon as `event` is set"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(),
+                          dtype=torch.bool, device=input_ids.device)
+
 class AIModel:
-    def __init__(self):
+    def __init__(self, load_profile: str = None):
         # Use a smaller model that's good at factual responses
         self.model_name = "facebook/opt-350m"  # Larger model for better quality
-        if not Path("models/opt").exists():
-            logger.info("Downloading model... This may take a few minutes.")
-            self.download_model()
-        
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"Using device: {self.device}")
-        self.load_model()
-        
-        # Pre-defined fun facts for each category
-        self.fun_facts = {
-            "planets": [
-                "Did you know that Jupiter is so big that 1,300 Earths could fit inside it!",
-                "Mars has a mountain three times taller than Mount Everest!",
-                "Saturn is so light it could float in a bathtub if there was one big enough!",
-                "One day on Venus is longer than its entire year!",
-                "It rains diamonds on Neptune!"
-            ],
-            "animals": [
-                "Octopuses have three hearts and blue blood!",
-                "Sloths are so slow that algae grows on their fur!",
-                "Penguins give each other pebbles as presents!",
-                "A giraffe's tongue is so long it can clean its own ears!",
-                "Dolphins give each other names and call to each other!"
-            ],
-            "science": [
-                "Lightning is five times hotter than the surface of the sun!",
-                "Honey never spoils - scientists found 3000-year-old honey in Egypt that's still good!",
-                "Your brain generates enough electricity to power a small light bulb!",
-                "A day on Earth is getting longer by 1.8 milliseconds every century!",
-                "Bananas glow blue under black lights!"
-            ],
-            "math": [
-                "If you multiply any number by 9, the digits in the answer will add up to 9!",
-                "The symbol for division (÷) was chosen because it looks like a fraction with dots!",
-                "Zero wasn't discovered until around 600 AD!",
-                "If you counted to a million, it would take you 23 days!",
-                "The word 'hundred' comes from an old Viking word meaning 120, not 100!"
-            ],
-            "dinosaurs": [
-                "T-Rex teeth were as long as bananas!",
-                "Some dinosaurs were smaller than chickens!",
-                "Velociraptors were actually the size of turkeys!",
-                "Scientists think many dinosaurs had colorful feathers like parrots!",
-                "The Argentinosaurus was as long as three school buses!"
-            ],
-            "countries": [
-                "In Japan, there's an island where rabbits run free!",
-                "In Norway, the sun doesn't set for 60 days during summer!",
-                "Australia has a pink lake called Lake Hillier!",
-                "In Sweden, there's a hotel made entirely of ice that's rebuilt every winter!",
-                "The Netherlands gives tulips to Canada every year as a thank you gift!"
-            ]
-        }
-    
-    def download_model(self):
+
+        self.load_profile = load_profile or os.environ.get('AI_LOAD_PROFILE', 'float32')
+        if self.load_profile not in LOAD_PROFILES:
+            raise ValueError(f"Unknown load profile {self.load_profile!r}, expected one of {LOAD_PROFILES}")
+        if self.load_profile == "int8" and self.device != "cpu":
+            raise ValueError("The int8 load profile uses dynamic quantization, which only runs on CPU")
+
+        # Entry in models/manifest.json; AI_MODEL picks a different one
+        self.registry_name = os.environ.get('AI_MODEL') or PROFILE_MODELS[self.load_profile]
+        self.model_record = None
+        # Cached answers belong to one model entry, version and load profile;
+        # switching any of them must not serve the old model's answers
         try:
-            model_path = Path("models/opt")
-            model_path.mkdir(parents=True, exist_ok=True)
-            
-            logger.info("Downloading tokenizer...")
-            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            
-            logger.info("Downloading model...")
-            model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float32
-            )
-            
-            logger.info("Saving model locally...")
-            tokenizer.save_pretrained(str(model_path))
-            model.save_pretrained(str(model_path))
-        except Exception as e:
-            logger.error(f"Error downloading model: {str(e)}")
-            raise
-    
+            version = get_registry().get(self.registry_name).version
+        except ModelUnavailable:
+            version = None
+        self.cache_model_id = f"{self.registry_name}@{version}:{self.load_profile}"
+
+        # The model is only loaded when a request actually needs it
+        self.model = None
+        self.tokenizer = None
+        self._load_lock = threading.Lock()
+
+        # AI_GENERATION=model answers /ask with the language model instead of
+        # the fact lists; concurrent prompts are batched into one generate call
+        self.use_model = os.environ.get('AI_GENERATION', 'facts') == 'model'
+        if self.use_model:
+            # Fail at startup, not on the first question, if it isn't installed
+            self.model_record = get_registry().resolve(self.registry_name)
+        self.scheduler = BatchScheduler(
+            self._run_batch,
+            max_batch_size=int(os.environ.get('AI_BATCH_MAX_SIZE', 8)),
+            max_wait_ms=float(os.environ.get('AI_BATCH_WAIT_MS', 10))
+        )
+
+        # Answers for repeated questions, persisted in the instance DB
+        self.generation_cache = GenerationCache(
+            max_entries=int(os.environ.get('GENERATION_CACHE_SIZE', 1024)),
+            ttl_seconds=float(os.environ.get('GENERATION_CACHE_TTL', 7 * 24 * 3600)),
+            variants=int(os.environ.get('GENERATION_CACHE_VARIANTS', 3)),
+            db_path=default_db_path() if os.environ.get('GENERATION_CACHE_PERSIST', '1') == '1' else None
+        )
+
+    def ensure_loaded(self):
+        """Load the model on first use; never downloads"""
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            self.load_model()
+
     def load_model(self):
         try:
-            logger.info("Loading model...")
-            model_path = str(Path("models/opt"))
+            record = self.model_record or get_registry().resolve(self.registry_name)
+            logger.info(f"Loading {record.name} ({record.version}) with the {self.load_profile} profile...")
+            model_path = str(record.path)
+            started = time.perf_counter()
             
             self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
-            self.model = AutoModelForCausalLM.from_pretrained(
+            # The registry artifact is safetensors in the serving dtype, read
+            # through mmap; low_cpu_mem_usage skips the random initialization
+            model = AutoModelForCausalLM.from_pretrained(
                 model_path,
                 local_files_only=True,
-                torch_dtype=torch.float32
-            ).to(self.device)
+                use_safetensors=True,
+                low_cpu_mem_usage=True,
+                torch_dtype=torch.bfloat16 if self.load_profile == "bfloat16" else torch.float32
+            )
+            if self.load_profile == "int8":
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.model = model.to(self.device)
+            self.model.eval()
+
+            # Decoder-only models need left padding so every prompt in a
+            # batch ends right where generation starts
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
             
+            model_load_seconds.observe(time.perf_counter() - started, record.name)
             logger.info("Model loaded successfully!")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
+    def generate_batch(self, prompts, max_new_tokens: int = 60, temperature: float = 0.7,
+                       top_p: float = 0.9):
+        """Run one padded `generate` call for all `prompts` and return the answers"""
+        self.ensure_loaded()
+        texts = [PROMPT_TEMPLATE.format(question=p.strip()) for p in prompts]
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True).to(self.device)
+
+        with torch.inference_mode(), inference_seconds.time(self.registry_name, 'batch'):
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=temperature > 0,
+                temperature=temperature if temperature > 0 else None,
+                top_p=top_p if temperature > 0 else None,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+
+        # Drop the prompt tokens and anything after the first line of the answer
+        answers = self.tokenizer.batch_decode(
+            output[:, inputs["input_ids"].shape[1]:],
+            skip_special_tokens=True
+        )
+        return [answer.strip().split("\n")[0].strip() for answer in answers]
+
+    def _run_batch(self, key, prompts):
+        return self.generate_batch(prompts, **dict(key))
+
+    def submit(self, prompt: str, max_new_tokens: int = 60, temperature: float = 0.7,
+               top_p: float = 0.9):
+        """Answer `prompt` from the generation cache or queue it for batched
+        generation; returns a concurrent Future"""
+        params = (("max_new_tokens", max_new_tokens), ("temperature", temperature), ("top_p", top_p))
+        cache_key = self.generation_cache.make_key(prompt, self.cache_model_id, params)
+        cached = self.generation_cache.get(cache_key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        def remember(done):
+            if not done.cancelled() and done.exception() is None and done.result():
+                self.generation_cache.add(cache_key, done.result())
+
+        future = self.scheduler.submit(prompt, key=params)
+        future.add_done_callback(remember)
+        return future
+
+    def stream_generate(self, prompt: str, cancel_event, max_new_tokens: int = 60,
+                        temperature: float = 0.7, top_p: float = 0.9):
+        """Start generating an answer on a background thread and return an
+        iterator of text pieces as the model produces them.
+
+        Setting `cancel_event` stops generation at the next token. Streamed
+        requests bypass the batcher; finished answers still feed the
+        generation cache.
+        """
+        self.ensure_loaded()
+        params = (("max_new_tokens", max_new_tokens), ("temperature", temperature), ("top_p", top_p))
+        cache_key = self.generation_cache.make_key(prompt, self.cache_model_id, params)
+        cached = self.generation_cache.get(cache_key)
+        if cached is not None:
+            return iter([cached])
+
+        inputs = self.tokenizer(
+            [PROMPT_TEMPLATE.format(question=prompt.strip())],
+            return_tensors="pt"
+        ).to(self.device)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        def run():
+            try:
+                with torch.inference_mode(), inference_seconds.time(self.registry_name, 'stream'):
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_new_tokens=max_new_tokens,
+                        do_sample=temperature > 0,
+                        temperature=temperature if temperature > 0 else None,
+                        top_p=top_p if temperature > 0 else None,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancel_event)])
+                    )
+            except Exception as e:
+                logger.error(f"Error in streamed generation: {str(e)}")
+                streamer.end()
+
+        threading.Thread(target=run, name="stream-generate", daemon=True).start()
+
+        def pieces():
+            # Stop at the end of the first line, like generate_batch
+            answer = ""
+            line_ended = False
+            for piece in streamer:
+                line_ended = "\n" in piece
+                piece = piece.split("\n")[0]
+                answer += piece
+                if piece:
+                    yield piece
+                if line_ended:
+                    # Nothing past the first line is used; stop the model
+                    cancel_event.set()
+                    break
+            # A cancelled stream only has part of the answer; don't cache it
+            if answer.strip() and (line_ended or not cancel_event.is_set()):
+                self.generation_cache.add(cache_key, answer.strip())
+
+        return pieces()
+
     def generate_response(self, prompt: str) -> str:
         try:
-            # Map button text to categories
-            category_map = {
-                "planets": "planets",
-                "countries": "countries",
-                "animals": "animals",
-                "science": "science",
-                "math": "math",
-                "dinosaurs": "dinosaurs",
-                "inventions": "inventions",
-                "body": "body",
-                "weather": "weather",
-                "ocean": "ocean",
-                "insects": "insects",
-                "space": "space",
-                "ancient": "ancient",
-                "volcanoes": "earth",
-                "robots": "robots",
-                "languages": "languages"
-            }
-
-            # Pre-defined fun facts for each category
-            fun_facts = {
-                "planets": [
-                    "Did you know that Jupiter has 79 moons? That's like having 79 little worlds orbiting one planet!",
-                    "Mars has a mountain three times taller than Mount Everest!",
-                    "Saturn is so light it could float in a bathtub if there was one big enough!",
-                    "Venus spins backwards compared to all other planets!"
-                ],
-                "countries": [
-                    "In Japan, there's an island full of friendly rabbits that hop around freely!",
-                    "In Norway, the sun doesn't set for 60 days during summer!",
-                    "Australia has a pink lake called Lake Hillier that looks like strawberry milkshake!"
-                ],
-                "animals": [
-                    "Octopuses have three hearts and blue blood!",
-                    "Sloths are so slow that algae grows on their fur!",
-                    "Dolphins give each other names and call to each other using special whistles!"
-                ],
-                "science": [
-                    "Lightning is five times hotter than the surface of the sun!",
-                    "Honey never spoils - scientists found 3000-year-old honey in Egypt that's still good!",
-                    "Your brain generates enough electricity to power a small light bulb!"
-                ],
-                "math": [
-                    "If you multiply any number by 9, the digits in the answer will add up to 9!",
-                    "Zero wasn't discovered until around 600 AD!",
-                    "If you counted to a million, it would take you 23 days!"
-                ],
-                "dinosaurs": [
-                    "T-Rex teeth were as long as bananas!",
-                    "Some dinosaurs were smaller than chickens!",
-                    "Scientists think many dinosaurs had colorful feathers like parrots!"
-                ],
-                "inventions": [
-                    "The first computer was so big it took up an entire room!",
-                    "The first person to invent the light bulb wasn't Thomas Edison - there were 22 other inventors before him!",
-                    "LEGO was originally a wooden toy company before making plastic bricks!"
-                ],
-                "body": [
-                    "Your body has enough iron in it to make a nail 3 inches long!",
-                    "Your heart beats about 100,000 times every day!",
-                    "Your fingernails grow faster on your dominant hand!"
-                ],
-                "weather": [
-                    "The fastest wind ever recorded was 253 miles per hour!",
-                    "Lightning strikes Earth about 100 times every second!",
-                    "Some snowflakes can be as big as a frisbee!"
-                ],
-                "ocean": [
-                    "The blue whale's tongue weighs as much as an elephant!",
-                    "There are glowing creatures at the bottom of the ocean that make their own light!",
-                    "Giant squids have eyes as big as dinner plates!"
-                ],
-                "insects": [
-                    "Bees can recognize human faces!",
-                    "Ants never sleep and they can lift 50 times their body weight!",
-                    "Some butterflies can taste with their feet!"
-                ],
-                "space": [
-                    "There's a planet made mostly of diamonds!",
-                    "One day on Venus is longer than its entire year!",
-                    "There's a giant cloud of raspberry-flavored space dust floating in our galaxy!"
-                ],
-                "ancient": [
-                    "The ancient Egyptians invented toothpaste!",
-                    "Kids in ancient Greece played with yo-yos!",
-                    "The Great Wall of China was built using sticky rice as mortar!"
-                ],
-                "earth": [
-                    "There are about 1,500 active volcanoes on Earth!",
-                    "Earthquakes can make the Earth ring like a bell for days!",
-                    "Some volcanoes erupt with blue lava!"
-                ],
-                "robots": [
-                    "There's a robot that can solve a Rubik's cube in less than a second!",
-                    "Some robots can do backflips better than Olympic gymnasts!",
-                    "There are tiny robots smaller than a grain of salt that can help doctors!"
-                ],
-                "languages": [
-                    "The most commonly used letter in English is 'E'!",
-                    "There's a language in Africa that only uses clicking sounds!",
-                    "The shortest complete sentence in English is 'Go!'"
-                ]
-            }
-
             # Determine which category was clicked
-            selected_category = None
-            for key, category in category_map.items():
-                if key in prompt.lower():
-                    selected_category = category
-                    break
+            fact_store = get_fact_store()
+            selected_category = fact_store.match(prompt)
 
             # Get a random fact from the appropriate category
-            if selected_category and selected_category in fun_facts:
-                import random
-                return random.choice(fun_facts[selected_category])
+            if selected_category is not None:
+                return fact_store.random_fact(selected_category)
             
             # Fallback response
             return "Did you know that astronauts grow taller in space? The lack of gravity makes their spine stretch out!"
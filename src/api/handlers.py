@@ -0,0 +1,109 @@
+from metrics import model_load_seconds
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyHandler:
+    """Builds an expensive handler on first use, exactly once, from any thread.
+
+    An `optional` handler backs a feature some deployments don't have, so
+    /ready doesn't wait for it.
+    """
+
+    def __init__(self, name, factory, optional=False):
+        self.name = name
+        self._factory = factory
+        self.optional = optional
+        self._instance = None
+        self._lock = threading.Lock()
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                logger.info(f"Loading {self.name}...")
+                started = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"Failed to load {self.name}: {str(e)}")
+                    raise
+                self.error = None
+                self.load_seconds = time.perf_counter() - started
+                model_load_seconds.observe(self.load_seconds, self.name)
+                logger.info(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+            return self._instance
+
+    async def aget(self):
+        """`get` for async routes; loading happens off the event loop"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get)
+
+    def status(self):
+        return {
+            'loaded': self.loaded,
+            'optional': self.optional,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
+
+
+def _load_ai_model():
+    from ..ai.model_handler import AIModel
+    return AIModel()
+
+
+def _load_speech_handler():
+    from ..speech.speech_handler import SpeechHandler
+    return SpeechHandler()
+
+
+def _load_speech_recognizer():
+    from ..speech.recognition import StreamingRecognizer
+    return StreamingRecognizer()
+
+
+ai_model = LazyHandler('ai_model', _load_ai_model)
+speech_handler = LazyHandler('speech_handler', _load_speech_handler)
+# Only /listen/stream needs it, and only where a Vosk model is installed
+speech_recognizer = LazyHandler('speech_recognizer', _load_speech_recognizer, optional=True)
+
+HANDLERS = (ai_model, speech_handler, speech_recognizer)
+
+
+def required_loaded():
+    """True once every handler /ready waits for is loaded"""
+    return all(h.loaded for h in HANDLERS if not h.optional)
+
+
+def warm_up(on_done=None):
+    """Load every handler on a background thread; `on_done()` runs afterwards"""
+    def run():
+        for handler in HANDLERS:
+            try:
+                handler.get()
+            except Exception:
+                # Already logged; /ready reports the error
+                pass
+        if on_done is not None:
+            on_done()
+
+    thread = threading.Thread(target=run, name='handler-warmup', daemon=True)
+    thread.start()
+    return thread
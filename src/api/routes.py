@@ -1,22 +1,83 @@
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
+import json
 import logging
 import asyncio
+import os
+import threading
+import time
+
+# Taken before the imports below so they count toward startup time
+_import_started = time.perf_counter()
+
+from .handlers import HANDLERS, ai_model, required_loaded, speech_handler, speech_recognizer, warm_up
+from ..speech.speech_handler import SpeechQueueFull
+from ..speech.recognition import SAMPLE_RATE, RecognizerBusy
+from metrics import metrics, request_seconds
 
-router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize handlers
-try:
-    from ..ai.model_handler import AIModel
-    from ..speech.speech_handler import SpeechHandler
-    
-    ai_model = AIModel()
-    speech_handler = SpeechHandler()
-except Exception as e:
-    logger.error(f"Failed to initialize handlers: {str(e)}")
-    raise
+# Startup timings, logged once as JSON so they can be compared across releases
+startup_timing = {'import_seconds': None, 'ready_seconds': None}
+
+# A streaming recognition client that sends nothing for this long is
+# disconnected, freeing its ASR_MAX_SESSIONS slot
+ASR_IDLE_SECONDS = float(os.environ.get('ASR_IDLE_SECONDS', 30))
+
+def _record_ready():
+    if not required_loaded():
+        return
+    startup_timing['ready_seconds'] = round(time.perf_counter() - _import_started, 3)
+    startup_timing['handlers'] = {h.name: h.load_seconds for h in HANDLERS}
+    logger.info(f"startup_timing {json.dumps(startup_timing)}")
+
+def _start_warmup():
+    # Handlers load lazily on first use; HANDLER_WARMUP=0 skips the
+    # background load at startup
+    if os.environ.get('HANDLER_WARMUP', '1') == '1':
+        warm_up(on_done=_record_ready)
+
+class TimedRoute(APIRoute):
+    """Records each request's latency in the shared /metrics histograms.
+
+    Routes are labelled relative to this router (asgi.py mounts it at
+    /api/ai) with app="fastapi".
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                request_seconds.observe(time.perf_counter() - started, 'fastapi',
+                                        request.method, self.path, str(status))
+
+        return timed_handler
+
+def _generation_cache_samples():
+    # Only reported once the model handler exists; never loads it
+    if not ai_model.loaded:
+        return
+    stats = ai_model.get().generation_cache.stats()
+    yield 'cache_hits_total', 'counter', 'Cache lookups answered from the cache', \
+        [({'cache': 'generation', 'tier': 'memory'}, stats['hits'])]
+    yield 'cache_misses_total', 'counter', 'Cache lookups that had to compute the value', \
+        [({'cache': 'generation'}, stats['misses'])]
+
+metrics.collector('generation_cache', _generation_cache_samples)
+
+router = APIRouter(on_startup=[_start_warmup], route_class=TimedRoute)
 
 class Question(BaseModel):
     text: str
@@ -27,29 +88,165 @@ class SpeechText(BaseModel):
 @router.post("/ask")
 async def ask_question(question: Question):
     try:
-        response = ai_model.generate_response(question.text)
+        model = await ai_model.aget()
+        if model.use_model:
+            response = await asyncio.wrap_future(model.submit(question.text))
+        else:
+            response = model.generate_response(question.text)
         return {"response": response}
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _stream_answer(text: str, request: Request):
+    model = await ai_model.aget()
+    cancel = threading.Event()
+    if model.use_model:
+        pieces = await asyncio.to_thread(model.stream_generate, text, cancel)
+    else:
+        pieces = iter([model.generate_response(text)])
+
+    async def events():
+        try:
+            while True:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, cancelling generation")
+                    break
+                piece = await asyncio.to_thread(next, pieces, None)
+                if piece is None:
+                    break
+                yield _sse({"token": piece})
+            yield _sse({}, event="done")
+        except Exception as e:
+            logger.error(f"Error in ask_stream: {str(e)}")
+            yield _sse({"error": str(e)}, event="error")
+        finally:
+            # Also reached when the response is torn down mid-stream
+            cancel.set()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/ask/stream")
+async def ask_stream(question: Question, request: Request):
+    return await _stream_answer(question.text, request)
+
+@router.get("/ask/stream")
+async def ask_stream_get(text: str, request: Request):
+    # GET variant for the browser's EventSource
+    return await _stream_answer(text, request)
+
+@router.get("/ask/stats")
+async def ask_stats():
+    if not ai_model.loaded:
+        return {"loaded": False}
+    model = ai_model.get()
+    return {
+        "loaded": True,
+        "generation_cache": model.generation_cache.stats(),
+        "batching": model.scheduler.stats()
+    }
+
 @router.post("/speak")
 async def speak_text(speech_text: SpeechText):
     try:
         logger.info(f"Speaking text: {speech_text.text}")
-        await speech_handler.speak(speech_text.text)
-        return {"status": "success"}
+        handler = await speech_handler.aget()
+        audio = await handler.speak(speech_text.text)
+        return Response(content=audio, media_type="audio/wav")
+    except SpeechQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error in speak_text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/speak/stream")
+async def speak_stream(speech_text: SpeechText):
+    handler = await speech_handler.aget()
+    try:
+        chunks = handler.speak_stream(speech_text.text)
+    except SpeechQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return StreamingResponse(chunks, media_type="audio/wav")
+
 @router.post("/listen")
 async def listen():
     try:
-        text = await speech_handler.listen(duration=7)
+        handler = await speech_handler.aget()
+        text = await handler.listen(duration=7)
         if not text:
             return {"text": "", "status": "no_speech_detected"}
         return {"text": text, "status": "success"}
     except Exception as e:
         logger.error(f"Error in listen: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.websocket("/listen/stream")
+async def listen_stream(websocket: WebSocket):
+    """Streaming recognition: the client sends binary frames of 16-bit mono
+    PCM (at ?sample_rate=, default 16000) and a text frame "end" when done;
+    partial and final transcripts are sent back as JSON as they change.
+    Silence longer than ASR_IDLE_SECONDS closes the session."""
+    await websocket.accept()
+    try:
+        recognizer = await speech_recognizer.aget()
+        sample_rate = int(websocket.query_params.get("sample_rate", SAMPLE_RATE))
+        session = recognizer.open(sample_rate)
+    except RecognizerBusy as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1013)  # Try again later
+        return
+    except Exception as e:
+        logger.error(f"Error opening recognition session: {str(e)}")
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1011)
+        return
+
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), ASR_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "error": f"No audio for {ASR_IDLE_SECONDS:g}s"})
+                await websocket.close(code=1001)
+                break
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                update = await session.feed(message["bytes"])
+                if update is not None:
+                    await websocket.send_json(update)
+            elif message.get("text") == "end":
+                await websocket.send_json(await session.finish())
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in listen_stream: {str(e)}")
+        await websocket.close(code=1011)
+    finally:
+        session.close()
+
+@router.get("/live")
+async def live():
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def ready():
+    handlers = {h.name: h.status() for h in HANDLERS}
+    body = {
+        "ready": required_loaded(),
+        "handlers": handlers,
+        "startup": startup_timing
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+startup_timing['import_seconds'] = round(time.perf_counter() - _import_started, 3)
@@ -0,0 +1,423 @@
+"""Offline load and micro-benchmark suite for the API endpoints.
+
+`load` starts src/scripts/benchmark_app.py under uvicorn. That is the real
+app, with gTTS, Coqui and the language model replaced by fixed-latency
+stubs, running on a throwaway database and audio cache. `load` drives each
+endpoint in turn at every requested concurrency and records throughput and
+p50/p95/p99 latency. Request mixes come from a seeded RNG, so runs with the
+same arguments send the same requests.
+
+`micro` times the hot functions in-process: topic matching,
+AIModel.generate_response, and the streak logic (apply_update in Python,
+increment as SQL).
+
+Results are written as JSON with the commit and machine they came from, and
+`compare` puts two runs side by side. Run from the repository root:
+
+    python -m src.scripts.benchmark_api load --concurrency 1 8 32 --requests 500
+    python -m src.scripts.benchmark_api load --endpoints speak word-audio --miss-rate 0.5
+    python -m src.scripts.benchmark_api micro
+    python -m src.scripts.benchmark_api compare instance/benchmarks/a.json instance/benchmarks/b.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from statistics import median
+
+RESULTS_DIR = os.path.join('instance', 'benchmarks')
+
+QUESTIONS = [
+    'Tell me about planets', 'What do you know about dinosaurs?', 'How does the human body work?',
+    'Fun facts about animals please', 'Why does the weather change?', 'What lives in the ocean?',
+    'How do plants grow?', 'Tell me about space exploration', 'What countries are there?',
+    'Teach me some science', 'What is your favourite colour?', 'Can you sing a song?'
+]
+PHRASES = [
+    'Great job!', 'Try again!', 'You found a new fact!', "Let's play a game.",
+    'Spell the word elephant.', 'Well done, you are on a streak!'
+]
+SPELLING_WORDS = ['elephant', 'giraffe', 'penguin', 'butterfly', 'kangaroo', 'octopus', 'dolphin', 'rhinoceros']
+
+
+def _unique(rng):
+    return f'word{rng.randrange(10 ** 9)}'
+
+
+# name -> (method, request builder); a builder takes (rng, users, miss_rate)
+# and returns (path, JSON body or None)
+ENDPOINTS = {
+    'ask': ('POST', lambda rng, users, miss: (
+        '/api/ask', {'text': rng.choice(QUESTIONS)})),
+    'stats': ('GET', lambda rng, users, miss: (
+        f'/api/stats?user_id=bench-{rng.randrange(users)}', None)),
+    'stats-update': ('POST', lambda rng, users, miss: (
+        '/api/stats/update', {
+            'user_id': f'bench-{rng.randrange(users)}',
+            'topics_explored': rng.randrange(100),
+            'games_played': rng.randrange(100),
+            'activity': {'type': rng.choice(['game', 'topic']), 'description': 'Benchmark activity'}
+        })),
+    'speak': ('POST', lambda rng, users, miss: (
+        '/api/speak', {'text': _unique(rng) if rng.random() < miss else rng.choice(PHRASES)})),
+    'word-audio': ('GET', lambda rng, users, miss: (
+        f'/get_word_audio/{_unique(rng) if rng.random() < miss else rng.choice(SPELLING_WORDS)}', None)),
+    # FastAPI router, behind the stubbed language model and Coqui
+    'ai-ask': ('POST', lambda rng, users, miss: (
+        '/api/ai/ask', {'text': rng.choice(QUESTIONS)})),
+    'ai-speak': ('POST', lambda rng, users, miss: (
+        '/api/ai/speak', {'text': _unique(rng) if rng.random() < miss else rng.choice(PHRASES)}))
+}
+DEFAULT_ENDPOINTS = ['ask', 'stats', 'stats-update', 'speak', 'word-audio']
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(ordered) / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'started': datetime.now().isoformat(timespec='seconds')
+    }
+
+
+def save(results, output, kind):
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print(f'Results written to {output}')
+
+
+# Load test
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, scratch):
+    port = free_port()
+    env = dict(
+        os.environ,
+        LEARNING_LAB_DB=os.path.join(scratch, 'bench.db'),
+        AUDIO_CACHE_DIR=os.path.join(scratch, 'audio_cache'),
+        BENCH_TTS_MS=str(args.tts_ms),
+        BENCH_LLM_MS=str(args.llm_ms),
+        GENERATION_CACHE_PERSIST='0',
+        HANDLER_WARMUP='0',
+        AUDIO_WARMUP_ON_START='0',
+        LOG_LEVEL='WARNING'
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log',
+         'src.scripts.benchmark_app:app'],
+        env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('benchmark server exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/ai/live')
+            if conn.getresponse().status == 200:
+                return server, port
+        except OSError:
+            pass
+        time.sleep(0.3)
+    server.terminate()
+    raise RuntimeError(f'benchmark server on port {port} did not come up')
+
+
+def drive(port, endpoint, concurrency, requests, args, seed):
+    """Send `requests` requests to `endpoint` from `concurrency` keep-alive clients"""
+    method, build = ENDPOINTS[endpoint]
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client(index):
+        rng = random.Random(f'{seed}-{endpoint}-c{concurrency}-{index}')
+        plan = [build(rng, args.users, args.miss_rate) for _ in range(per_client[index])]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        barrier.wait()
+        for path, body in plan:
+            payload = json.dumps(body).encode() if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+                continue
+            if response.status >= 400:
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - started)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    # Start the clock once every client has built its requests
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return summarize([l for per in latencies for l in per], sum(errors), elapsed)
+
+
+def run_load(args):
+    scratch = tempfile.mkdtemp(prefix='learning-lab-bench-')
+    server, port = start_server(args, scratch)
+    results = {
+        'kind': 'load',
+        'environment': environment(),
+        'settings': {key: getattr(args, key) for key in
+                     ('endpoints', 'concurrency', 'requests', 'warmup', 'workers', 'users',
+                      'miss_rate', 'tts_ms', 'llm_ms', 'seed')},
+        'results': []
+    }
+    try:
+        for endpoint in args.endpoints:
+            if args.warmup:
+                drive(port, endpoint, min(4, args.warmup), args.warmup, args, f'{args.seed}-warmup')
+            for concurrency in args.concurrency:
+                summary = drive(port, endpoint, concurrency, args.requests, args, args.seed)
+                results['results'].append({'endpoint': endpoint, 'concurrency': concurrency, **summary})
+                print(f"{endpoint:<13} c={concurrency:<4} {summary['requests_per_second']:>9} req/s  "
+                      f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+                      f"p99 {summary['p99_ms']} ms  errors {summary['errors']}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(scratch, ignore_errors=True)
+    save(results, args.output, 'load')
+
+
+# Micro-benchmarks
+
+def timed(fn, number, repeat):
+    """Best and median microseconds per call over `repeat` rounds of `number` calls"""
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+    return {'calls': number * repeat, 'best_us': round(min(rounds), 3), 'median_us': round(median(rounds), 3)}
+
+
+def bench_topic_match(number, repeat):
+    from facts import get_fact_store
+
+    fact_store = get_fact_store()
+    questions = iter(QUESTIONS * (number * repeat // len(QUESTIONS) + 1))
+    return timed(lambda: fact_store.match(next(questions)), number, repeat)
+
+
+def bench_generate_response(number, repeat):
+    os.environ.setdefault('GENERATION_CACHE_PERSIST', '0')
+    os.environ['AI_GENERATION'] = 'facts'
+    try:
+        from src.ai.model_handler import AIModel
+    except ImportError as e:
+        return {'skipped': f'AIModel needs {e.name}'}
+    model = AIModel()
+    questions = iter(QUESTIONS * (number * repeat // len(QUESTIONS) + 1))
+    return timed(lambda: model.generate_response(next(questions)), number, repeat)
+
+
+def bench_streak_apply_update(number, repeat):
+    from models import LearningStats
+
+    stats = LearningStats('bench')
+    now = datetime(2024, 1, 1, 9)
+    # Same-day, next-day and after-a-gap visits in turn
+    steps = iter([timedelta(hours=1), timedelta(days=1), timedelta(days=3)] * (number * repeat // 3 + 1))
+
+    def visit():
+        nonlocal now
+        now += next(steps)
+        stats.apply_update(now, topics_explored=stats.topics_explored + 1)
+
+    return timed(visit, number, repeat)
+
+
+def bench_streak_increment(number, repeat):
+    from flask import Flask
+    from database import db, configure_sqlite
+    from models import LearningStats
+
+    scratch = tempfile.mkdtemp(prefix='learning-lab-bench-')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    configure_sqlite(app)
+    now = datetime(2024, 1, 1, 9)
+    users = iter(range(10 ** 9))
+
+    def increment():
+        nonlocal now
+        now += timedelta(hours=7)
+        LearningStats.increment(f'bench-{next(users) % 100}', now, games_played=1)
+        db.session.commit()
+
+    try:
+        with app.app_context():
+            db.create_all()
+            return timed(increment, number, repeat)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+MICRO = {
+    'topic_match': (bench_topic_match, 20000),
+    'generate_response': (bench_generate_response, 20000),
+    'streak_apply_update': (bench_streak_apply_update, 20000),
+    'streak_increment_sql': (bench_streak_increment, 500)
+}
+
+
+def run_micro(args):
+    results = {
+        'kind': 'micro',
+        'environment': environment(),
+        'settings': {'benchmarks': args.benchmarks, 'repeat': args.repeat, 'scale': args.scale},
+        'results': {}
+    }
+    for name in args.benchmarks:
+        fn, number = MICRO[name]
+        result = fn(max(1, int(number * args.scale)), args.repeat)
+        results['results'][name] = result
+        if 'skipped' in result:
+            print(f'{name:<22} skipped: {result["skipped"]}')
+        else:
+            print(f"{name:<22} best {result['best_us']:>10.3f} us  median {result['median_us']:>10.3f} us")
+    save(results, args.output, 'micro')
+
+
+# Comparing runs
+
+def change(old, new):
+    if not old or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def run_compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+    if baseline['kind'] != candidate['kind']:
+        sys.exit('error: cannot compare a load run with a micro run')
+    print(f"baseline  {baseline['environment']['commit']}  {baseline['environment']['started']}")
+    print(f"candidate {candidate['environment']['commit']}  {candidate['environment']['started']}")
+
+    if baseline['kind'] == 'micro':
+        for name, new in candidate['results'].items():
+            old = baseline['results'].get(name, {})
+            if 'best_us' in new and 'best_us' in old:
+                print(f"{name:<22} {old['best_us']:>10.3f} -> {new['best_us']:>10.3f} us  "
+                      f"{change(old['best_us'], new['best_us'])}")
+        return
+
+    old_rows = {(r['endpoint'], r['concurrency']): r for r in baseline['results']}
+    for new in candidate['results']:
+        old = old_rows.get((new['endpoint'], new['concurrency']))
+        if old is None:
+            continue
+        print(f"{new['endpoint']:<13} c={new['concurrency']:<4} "
+              f"req/s {old['requests_per_second']} -> {new['requests_per_second']} "
+              f"{change(old['requests_per_second'], new['requests_per_second']):>8}   "
+              f"p99 {old['p99_ms']} -> {new['p99_ms']} ms {change(old['p99_ms'], new['p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='drive the HTTP endpoints')
+    load.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=DEFAULT_ENDPOINTS)
+    load.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    load.add_argument('--requests', type=int, default=500, help='requests per endpoint and concurrency level')
+    load.add_argument('--warmup', type=int, default=50, help='unmeasured requests per endpoint first')
+    load.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    load.add_argument('--users', type=int, default=50, help='distinct user ids for the stats endpoints')
+    load.add_argument('--miss-rate', type=float, default=0.1,
+                      help='fraction of speech requests for text the audio cache has not seen')
+    load.add_argument('--tts-ms', type=float, default=50, help='stub synthesis time per clip')
+    load.add_argument('--llm-ms', type=float, default=200, help='stub generation time per batch')
+    load.add_argument('--seed', default='learning-lab')
+    load.add_argument('--output', help='JSON file (default: instance/benchmarks/load-<time>.json)')
+
+    micro = commands.add_parser('micro', help='time hot functions in-process')
+    micro.add_argument('--benchmarks', nargs='+', choices=list(MICRO), default=list(MICRO))
+    micro.add_argument('--repeat', type=int, default=5)
+    micro.add_argument('--scale', type=float, default=1.0, help='multiply the calls per round')
+    micro.add_argument('--output', help='JSON file (default: instance/benchmarks/micro-<time>.json)')
+
+    compare = commands.add_parser('compare', help='compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+
+    args = parser.parse_args()
+    {'load': run_load, 'micro': run_micro, 'compare': run_compare}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
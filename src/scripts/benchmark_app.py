@@ -0,0 +1,84 @@
+"""asgi:app with gTTS, Coqui TTS and the language model replaced by offline stubs.
+
+The stubs sleep for a fixed time (BENCH_TTS_MS, BENCH_LLM_MS) and return
+deterministic output, so load tests need no network, no model files and
+give repeatable numbers. Everything else is the real app. Started by
+src/scripts/benchmark_api.py; to run it by hand, point LEARNING_LAB_DB and
+AUDIO_CACHE_DIR at scratch locations first (stub audio must not land in the
+real cache):
+
+    uvicorn src.scripts.benchmark_app:app --port 3000
+"""
+import os
+import time
+
+import numpy as np
+
+import audio_cache
+from facts import get_fact_store
+from src.ai.batching import BatchScheduler
+from src.ai.generation_cache import GenerationCache
+from src.api.handlers import ai_model
+from src.speech.speech_handler import SpeechHandler
+
+TTS_SECONDS = float(os.environ.get('BENCH_TTS_MS', 50)) / 1000.0
+LLM_SECONDS = float(os.environ.get('BENCH_LLM_MS', 200)) / 1000.0
+SAMPLE_RATE = 22050
+
+
+def fake_mp3(text):
+    # Roughly the size of a real clip: ~1 KB per word
+    return b'ID3' + text.encode('utf-8')[:64].ljust(64, b'\0') * (16 * max(1, len(text.split())))
+
+
+class FakeGTTS:
+    def __init__(self, text, lang='en', slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(TTS_SECONDS)
+        fp.write(fake_mp3(self.text))
+
+
+class FakeCoqui:
+    class synthesizer:
+        output_sample_rate = SAMPLE_RATE
+
+    def tts(self, text):
+        time.sleep(TTS_SECONDS)
+        return np.zeros(int(SAMPLE_RATE * 0.3 * max(1, len(text.split()))), dtype=np.float32)
+
+
+class FakeAIModel:
+    """Answers like AIModel with AI_GENERATION=model, through the real
+    batcher, but each batch is a sleep"""
+
+    model_name = 'benchmark-stub'
+    use_model = True
+
+    def __init__(self):
+        self.scheduler = BatchScheduler(self._run_batch, max_batch_size=8, max_wait_ms=10)
+        self.generation_cache = GenerationCache(db_path=None)
+
+    def _run_batch(self, key, prompts):
+        time.sleep(LLM_SECONDS)
+        return [self.generate_response(prompt) for prompt in prompts]
+
+    def submit(self, prompt, **params):
+        return self.scheduler.submit(prompt)
+
+    def stream_generate(self, prompt, cancel_event, **params):
+        time.sleep(LLM_SECONDS)
+        return iter(self.generate_response(prompt).split(' '))
+
+    def generate_response(self, prompt):
+        fact_store = get_fact_store()
+        topic = fact_store.match(prompt)
+        return fact_store.random_fact(topic) if topic is not None else "I don't know that one yet!"
+
+
+audio_cache.gTTS = FakeGTTS
+SpeechHandler._load_tts = lambda self, progress_bar=False: FakeCoqui()
+ai_model._factory = FakeAIModel
+
+from asgi import app  # noqa: E402  (after the stubs are in place)
@@ -0,0 +1,107 @@
+"""Concurrent streaming recognition: time to first partial and final latency.
+
+Opens N WebSocket sessions against a running server and streams the same
+16 kHz mono 16-bit WAV from each, paced at real time like a microphone.
+Start the server first (./manage.sh start), then from the repository root:
+
+    python -m src.scripts.benchmark_asr --wav hello.wav --clients 20
+    python -m src.scripts.benchmark_asr --wav hello.wav --clients 50 --chunk-ms 100 --output asr.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import wave
+
+import websockets
+
+
+def load_pcm(path):
+    with wave.open(path, 'rb') as wav_file:
+        if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+            raise SystemExit(f"{path} must be 16-bit mono")
+        return wav_file.getframerate(), wav_file.readframes(wav_file.getnframes())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def client(url, sample_rate, pcm, chunk_ms, realtime):
+    chunk_bytes = int(sample_rate * chunk_ms / 1000) * 2
+    result = {'first_partial': None, 'final_latency': None, 'text': '', 'error': None}
+    async with websockets.connect(f"{url}?sample_rate={sample_rate}", max_size=None) as socket:
+        started = time.perf_counter()
+
+        async def receive():
+            async for raw in socket:
+                message = json.loads(raw)
+                if message['type'] == 'error':
+                    result['error'] = message['error']
+                    return
+                if result['first_partial'] is None and message.get('text'):
+                    result['first_partial'] = time.perf_counter() - started
+                if message['type'] == 'final' and message.get('text'):
+                    result['text'] = (result['text'] + ' ' + message['text']).strip()
+
+        receiver = asyncio.create_task(receive())
+        for offset in range(0, len(pcm), chunk_bytes):
+            await socket.send(pcm[offset:offset + chunk_bytes])
+            if realtime:
+                await asyncio.sleep(chunk_ms / 1000)
+        ended = time.perf_counter()
+        await socket.send('end')
+        await receiver
+        result['final_latency'] = time.perf_counter() - ended
+    return result
+
+
+async def run(args):
+    sample_rate, pcm = load_pcm(args.wav)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        client(args.url, sample_rate, pcm, args.chunk_ms, not args.no_pace)
+        for _ in range(args.clients)
+    ), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in results if isinstance(r, Exception) or r['error']]
+    ok = [r for r in results if not isinstance(r, Exception) and not r['error']]
+    first = [r['first_partial'] for r in ok if r['first_partial'] is not None]
+    final = [r['final_latency'] for r in ok]
+    audio_seconds = len(pcm) / 2 / sample_rate
+    return {
+        'clients': args.clients,
+        'failed': len(failed),
+        'audio_seconds': round(audio_seconds, 2),
+        'wall_seconds': round(elapsed, 2),
+        'first_partial_p50_ms': round(percentile(first, 0.5) * 1000, 1) if first else None,
+        'first_partial_p95_ms': round(percentile(first, 0.95) * 1000, 1) if first else None,
+        'final_p50_ms': round(percentile(final, 0.5) * 1000, 1) if final else None,
+        'final_p95_ms': round(percentile(final, 0.95) * 1000, 1) if final else None,
+        'sample_text': ok[0]['text'] if ok else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='ws://127.0.0.1:3000/api/ai/listen/stream')
+    parser.add_argument('--wav', required=True, help='16-bit mono WAV, ideally 16 kHz')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--chunk-ms', type=int, default=128, help='audio per WebSocket message')
+    parser.add_argument('--no-pace', action='store_true', help='send audio as fast as possible')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key:<22} {value}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
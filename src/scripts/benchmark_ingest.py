@@ -0,0 +1,139 @@
+"""Sustained events/sec for stats ingestion: write-behind queue vs. one commit per event.
+
+Runs against a throwaway SQLite database, so it is safe to run anywhere.
+Run from the repository root:
+
+    python -m src.scripts.benchmark_ingest --seconds 10 --threads 8 --users 50
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from database import db, configure_sqlite
+from ingest import ActivityIngestor
+from models import ActivityEvent, LearningStats
+from datetime import datetime
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    configure_sqlite(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def random_event(users):
+    return {
+        'user_id': f'user-{random.randrange(users)}',
+        'activity': {
+            'type': random.choice(['game', 'topic']),
+            'description': 'Benchmark activity',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    }
+
+
+def drive(submit, seconds, threads, users):
+    """Call `submit(event)` from `threads` threads for `seconds`; returns events sent"""
+    stop = time.monotonic() + seconds
+    counts = [0] * threads
+
+    def worker(index):
+        while time.monotonic() < stop:
+            submit(random_event(users))
+            counts[index] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts)
+
+
+def bench_write_behind(app, args):
+    ingestor = ActivityIngestor()
+    app.config['INGEST_MAX_EVENTS'] = args.batch
+    app.config['INGEST_MAX_DELAY'] = args.delay
+    ingestor.init_app(app)
+
+    def submit(event):
+        ingestor.submit(event['user_id'], activity=event['activity'])
+
+    started = time.perf_counter()
+    sent = drive(submit, args.seconds, args.threads, args.users)
+    accepted_seconds = time.perf_counter() - started
+    ingestor.flush()
+    total_seconds = time.perf_counter() - started
+    return {
+        'mode': 'write-behind',
+        'events': sent,
+        'accepted_per_second': round(sent / accepted_seconds),
+        'durable_per_second': round(sent / total_seconds),
+        'flushes': ingestor.queue.stats()['flushes']
+    }
+
+
+def bench_sync(app, args):
+    lock = threading.Lock()
+
+    def submit(event):
+        # What /api/stats/update does: load, modify and commit per event
+        with lock, app.app_context():
+            stats = LearningStats.query.filter_by(user_id=event['user_id']).first()
+            if stats is None:
+                stats = LearningStats(user_id=event['user_id'])
+                db.session.add(stats)
+            now = datetime.utcnow()
+            stats.apply_update(now)
+            db.session.add(ActivityEvent(**ActivityEvent.row(event['user_id'], event['activity'], now)))
+            db.session.commit()
+
+    started = time.perf_counter()
+    sent = drive(submit, args.seconds, args.threads, args.users)
+    seconds = time.perf_counter() - started
+    return {
+        'mode': 'sync-commit',
+        'events': sent,
+        'accepted_per_second': round(sent / seconds),
+        'durable_per_second': round(sent / seconds)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=500, help='INGEST_MAX_EVENTS')
+    parser.add_argument('--delay', type=float, default=1.0, help='INGEST_MAX_DELAY in seconds')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, bench in (('sync', bench_sync), ('write_behind', bench_write_behind)):
+            app = make_app(os.path.join(tmp, f'{mode}.db'))
+            results.append(bench(app, args))
+
+    for r in results:
+        print(f"{r['mode']:<13} events={r['events']:<8} accepted/s={r['accepted_per_second']:<8} "
+              f"durable/s={r['durable_per_second']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
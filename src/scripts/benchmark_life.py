@@ -0,0 +1,135 @@
+"""Generations per second for the Game of Life engines.
+
+`naive` is the browser game's loop ported to Python: eight wrapped
+neighbour lookups per cell. It is only run on small boards. `dense` is
+life.step_board. Both step the same seeded random soup, half alive. Their
+results are checked against each other on the sizes both run.
+
+HashLife is timed separately on patterns it is meant for: a glider and a
+Gosper glider gun, advanced 2^k generations in one step from scratch.
+
+Results are written as JSON in the same layout as the API benchmarks. Run
+from the repository root:
+
+    python -m src.scripts.benchmark_life
+    python -m src.scripts.benchmark_life --sizes 64 256 1024 --generations 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from life import HashLife, step_board
+from src.scripts.benchmark_api import environment, save
+
+NAIVE_MAX_SIZE = 128
+
+GLIDER = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+GOSPER_GUN = [
+    (0, 24), (1, 22), (1, 24), (2, 12), (2, 13), (2, 20), (2, 21), (2, 34), (2, 35),
+    (3, 11), (3, 15), (3, 20), (3, 21), (3, 34), (3, 35), (4, 0), (4, 1), (4, 10),
+    (4, 16), (4, 20), (4, 21), (5, 0), (5, 1), (5, 10), (5, 14), (5, 16), (5, 17),
+    (5, 22), (5, 24), (6, 10), (6, 16), (6, 24), (7, 11), (7, 15), (8, 12), (8, 13)
+]
+PATTERNS = {'glider': GLIDER, 'gosper_gun': GOSPER_GUN}
+
+
+def naive_step(grid, generations):
+    size = len(grid)
+    for _ in range(generations):
+        new_grid = [[False] * size for _ in range(size)]
+        for x in range(size):
+            for y in range(size):
+                count = 0
+                for i in (-1, 0, 1):
+                    for j in (-1, 0, 1):
+                        if (i or j) and grid[(x + i) % size][(y + j) % size]:
+                            count += 1
+                new_grid[x][y] = count == 3 or (grid[x][y] and count == 2)
+        grid = new_grid
+    return grid
+
+
+def soup(size, seed):
+    return np.random.default_rng(seed).random((size, size)) < 0.5
+
+
+def best_seconds(fn, repeat):
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        rounds.append(time.perf_counter() - started)
+    return min(rounds), result
+
+
+def bench_boards(args):
+    rows = []
+    for size in args.sizes:
+        board = soup(size, args.seed)
+        seconds, dense = best_seconds(lambda: step_board(board, args.generations), args.repeat)
+        row = {
+            'size': size,
+            'generations': args.generations,
+            'dense_gens_per_second': round(args.generations / seconds, 1)
+        }
+        if size <= NAIVE_MAX_SIZE:
+            grid = board.tolist()
+            naive_seconds, naive = best_seconds(lambda: naive_step(grid, args.generations), 1)
+            if not np.array_equal(np.array(naive), dense):
+                raise SystemExit(f'error: engines disagree on a {size}x{size} board')
+            row['naive_gens_per_second'] = round(args.generations / naive_seconds, 1)
+            row['speedup'] = round(naive_seconds / seconds, 1)
+        rows.append(row)
+        print(f"{size:>5}x{size:<5} dense {row['dense_gens_per_second']:>12.1f} gen/s"
+              + (f"  naive {row['naive_gens_per_second']:>8.1f} gen/s  x{row['speedup']}"
+                 if 'speedup' in row else ''))
+    return rows
+
+
+def bench_hashlife(args):
+    rows = []
+    for name, cells in PATTERNS.items():
+        for power in args.powers:
+            generations = 1 << power
+            seconds, universe = best_seconds(lambda: _advance(cells, generations), args.repeat)
+            rows.append({
+                'pattern': name,
+                'generations': generations,
+                'population': universe.population,
+                'seconds': round(seconds, 6),
+                'gens_per_second': round(generations / seconds, 1)
+            })
+            print(f'{name:<11} 2^{power:<3} {seconds * 1000:>9.2f} ms  population {universe.population}')
+    return rows
+
+
+def _advance(cells, generations):
+    universe = HashLife(cells)
+    universe._advance(generations)
+    return universe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[16, 32, 64, 128, 256, 512, 1024])
+    parser.add_argument('--generations', type=int, default=20, help='generations per timed run')
+    parser.add_argument('--powers', nargs='+', type=int, default=[10, 20, 40],
+                        help='HashLife runs 2^power generations')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file (default: instance/benchmarks/life-<time>.json)')
+    args = parser.parse_args()
+
+    save({
+        'kind': 'life',
+        'environment': environment(),
+        'settings': {'sizes': args.sizes, 'generations': args.generations,
+                     'powers': args.powers, 'repeat': args.repeat, 'seed': args.seed},
+        'boards': bench_boards(args),
+        'hashlife': bench_hashlife(args)
+    }, args.output, 'life')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Compare AIModel load profiles: resident memory, load time and tokens/sec.
+
+Each profile is measured in a fresh subprocess so memory numbers don't
+leak between runs. Run from the repository root once the profiles' models
+are installed (python model_registry.py lists them):
+
+    python -m src.scripts.benchmark_load_profiles
+    python -m src.scripts.benchmark_load_profiles --profiles float32 int8 --output bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROMPT = "Tell me about planets"
+
+
+def rss_mb():
+    """Current resident set size of this process in MB"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(profile, new_tokens, runs):
+    import torch
+    from src.ai.model_handler import AIModel
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    baseline = rss_mb()
+
+    started = time.perf_counter()
+    model = AIModel(load_profile=profile)
+    model.ensure_loaded()
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    inputs = model.tokenizer([PROMPT], return_tensors="pt").to(model.device)
+    with torch.inference_mode():
+        # Warm-up pass so one-time kernel setup isn't counted
+        model.model.generate(**inputs, max_new_tokens=4, do_sample=False)
+        started = time.perf_counter()
+        generated = 0
+        for _ in range(runs):
+            output = model.model.generate(
+                **inputs,
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=model.tokenizer.pad_token_id
+            )
+            generated += output.shape[1] - inputs["input_ids"].shape[1]
+        generate_seconds = time.perf_counter() - started
+
+    return {
+        "profile": profile,
+        "load_seconds": round(load_seconds, 3),
+        "rss_mb": round(loaded_rss, 1),
+        "model_rss_mb": round(loaded_rss - baseline, 1),
+        "tokens_per_second": round(generated / generate_seconds, 2)
+    }
+
+
+def main():
+    from src.ai.model_handler import LOAD_PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", choices=LOAD_PROFILES, default=list(LOAD_PROFILES))
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.new_tokens, args.runs)))
+        return
+
+    results = []
+    for profile in args.profiles:
+        output = subprocess.run(
+            [sys.executable, "-m", "src.scripts.benchmark_load_profiles", "--child", profile,
+             "--new-tokens", str(args.new_tokens), "--runs", str(args.runs)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'profile':<10} {'load s':>8} {'rss MB':>9} {'model MB':>9} {'tok/s':>8}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['load_seconds']:>8} {r['rss_mb']:>9} "
+              f"{r['model_rss_mb']:>9} {r['tokens_per_second']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
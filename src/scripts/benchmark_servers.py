@@ -0,0 +1,170 @@
+"""Load test: the old sync gunicorn server vs. uvicorn serving asgi:app.
+
+Each server is started against a throwaway SQLite database and hit with
+keep-alive clients requesting cheap Flask endpoints. Optional "slow"
+clients request an uncached gTTS clip at the same time, which is where a
+single sync worker stalls. Run from the repository root:
+
+    python -m src.scripts.benchmark_servers --seconds 10 --concurrency 32
+    python -m src.scripts.benchmark_servers --slow-clients 2 --output servers.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+FAST_PATHS = [
+    '/api/stats?user_id=load-{n}',
+    '/games/api/leaderboard/spelling-bee',
+    '/api/stats/rollups?period=week&user_id=load-{n}',
+    '/api/ai/live'
+]
+
+
+def server_command(name, port, workers):
+    if name == 'gunicorn-sync':
+        # What manage.sh used to start
+        return [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1',
+                '--worker-class', 'sync', '--timeout', '120', '--log-level', 'warning', 'run:app']
+    return [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', 'asgi:app']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/stats?user_id=warmup')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f'server on port {port} did not come up')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def drive(port, seconds, concurrency, slow_clients, slow_path):
+    stop = time.monotonic() + seconds
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    slow_done = [0] * max(slow_clients, 1)
+
+    def fast(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while time.monotonic() < stop:
+            path = random.choice(FAST_PATHS).format(n=random.randrange(100))
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors[index] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            latencies[index].append(time.perf_counter() - started)
+
+    def slow(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        while time.monotonic() < stop:
+            try:
+                # A fresh word each time so the audio cache can't answer it
+                conn.request('GET', slow_path.format(word=uuid.uuid4().hex[:8]))
+                conn.getresponse().read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            slow_done[index] += 1
+
+    pool = [threading.Thread(target=fast, args=(i,)) for i in range(concurrency)]
+    pool += [threading.Thread(target=slow, args=(i,)) for i in range(slow_clients)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    flat = [latency for per_client in latencies for latency in per_client]
+    return {
+        'requests': len(flat),
+        'errors': sum(errors),
+        'slow_requests': sum(slow_done) if slow_clients else 0,
+        'requests_per_second': round(len(flat) / elapsed, 1),
+        'p50_ms': round(percentile(flat, 0.50) * 1000, 2) if flat else None,
+        'p99_ms': round(percentile(flat, 0.99) * 1000, 2) if flat else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', nargs='+', choices=['gunicorn-sync', 'uvicorn-asgi'],
+                        default=['gunicorn-sync', 'uvicorn-asgi'])
+    parser.add_argument('--workers', type=int, default=2, help='uvicorn worker processes')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='clients requesting uncached speech alongside the fast load')
+    parser.add_argument('--slow-path', default='/get_word_audio/{word}')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.servers:
+            port = free_port()
+            env = dict(
+                os.environ,
+                LEARNING_LAB_DB=os.path.join(tmp, f'{name}.db'),
+                HANDLER_WARMUP='0',
+                AUDIO_WARMUP_ON_START='0'
+            )
+            server = subprocess.Popen(server_command(name, port, args.workers), env=env,
+                                      stdout=subprocess.DEVNULL)
+            try:
+                wait_for(port)
+                result = drive(port, args.seconds, args.concurrency, args.slow_clients, args.slow_path)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            result['server'] = name
+            results.append(result)
+
+    print(f"{'server':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'slow':>6}")
+    for r in results:
+        print(f"{r['server']:<14} {r['requests_per_second']:>9} {r['p50_ms']!s:>9} "
+              f"{r['p99_ms']!s:>9} {r['errors']:>7} {r['slow_requests']:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
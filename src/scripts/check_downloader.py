@@ -0,0 +1,262 @@
+"""Exercise download_models.py against a local http.server stand-in.
+
+Serves generated files from a temp directory with a Range-capable handler
+that can cut connections mid-transfer, then checks fresh, resumed,
+mirrored, non-Range and corrupted downloads. Exits 1 if any check fails.
+Run from the repository root:
+
+    python -m src.scripts.check_downloader
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import zipfile
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import download_models
+
+SEGMENT = 256 << 10
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Static files with single-range support and fault injection"""
+
+    ranges = True
+    # Cut this many GET responses short after `cut_after` bytes
+    cuts_left = 0
+    cut_after = 0
+    served = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        header = self.headers.get("Range")
+        if header and self.ranges:
+            first, _, last = header.removeprefix("bytes=").partition("-")
+            start, end = int(first), int(last) if last else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        if self.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        f = open(path, "rb")
+        f.seek(start)
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        cls = type(self)
+        with cls.lock:
+            cut = cls.cuts_left > 0
+            cls.cuts_left -= 1 if cut else 0
+        limit = cls.cut_after if cut else self._remaining
+        sent = 0
+        while sent < min(limit, self._remaining):
+            block = source.read(min(64 << 10, limit - sent, self._remaining - sent))
+            if not block:
+                break
+            outputfile.write(block)
+            sent += len(block)
+        with cls.lock:
+            cls.served += sent
+        if cut:
+            self.close_connection = True
+
+
+class FakeHub:
+    """Stands in for the Hub API's revision listing"""
+
+    def __init__(self, listing):
+        self.listing = listing
+
+    def get(self, url, **kwargs):
+        listing = self.listing
+
+        class Response:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return listing
+        return Response()
+
+
+def make_files(root):
+    files = {
+        "big/weights.bin": os.urandom(3 * SEGMENT + 12345),
+        "big/config.json": json.dumps({"hidden": 64}).encode(),
+        "small.txt": b"hello\n" * 100
+    }
+    archive = Path(root) / "voice.zip"
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("voice-model/am/final.mdl", os.urandom(5000))
+    for path, data in files.items():
+        (Path(root) / path).parent.mkdir(parents=True, exist_ok=True)
+        (Path(root) / path).write_bytes(data)
+    files["voice.zip"] = archive.read_bytes()
+    return files
+
+
+def manifest_for(files, base_url):
+    entries = [
+        {"path": path, "url": f"{base_url}/{path}", "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        for path, data in files.items()
+    ]
+    for entry in entries:
+        if entry["path"] == "voice.zip":
+            entry["extract"] = "voice-model"
+    return {"models": {"test": {"files": entries}}}
+
+
+def fetch(manifest, dest, mirror=None):
+    return download_models.download(
+        list(download_models.manifest_files(manifest)), dest, mirror=mirror,
+        workers=4, segment_size=SEGMENT, quiet=True
+    )
+
+
+def same_files(files, dest):
+    return all((Path(dest) / path).read_bytes() == data for path, data in files.items())
+
+
+def main():
+    results = []
+
+    def check(name, ok, detail=""):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        served_dir = os.path.join(tmp, "served")
+        files = make_files(served_dir)
+        total = sum(len(data) for data in files.values())
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeHandler, directory=served_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        manifest = manifest_for(files, base_url)
+
+        # Fresh download: big file in Range segments, all verified
+        dest = os.path.join(tmp, "fresh")
+        fetch(manifest, dest)
+        check("fresh download", same_files(files, dest))
+        check("archive extracted", (Path(dest) / "voice-model/am/final.mdl").is_file())
+        RangeHandler.served = 0
+        fetch(manifest, dest)
+        check("up-to-date files are skipped", RangeHandler.served == 0)
+
+        # Interrupted download resumes instead of starting over
+        dest = os.path.join(tmp, "resume")
+        RangeHandler.served = 0
+        RangeHandler.cuts_left, RangeHandler.cut_after = 100, 100 << 10
+        try:
+            fetch(manifest, dest)
+            interrupted = False
+        except Exception:
+            interrupted = True
+        first_pass = RangeHandler.served
+        RangeHandler.cuts_left = 0
+        RangeHandler.served = 0
+        fetch(manifest, dest)
+        check("interrupted download fails", interrupted)
+        check("resume fetches only the missing bytes",
+              same_files(files, dest) and RangeHandler.served <= total - first_pass + SEGMENT,
+              f"first pass {first_pass} B, resume {RangeHandler.served} B of {total} B")
+        check("no partial files left", not list(Path(dest).rglob("*.part*")))
+
+        # Server without Range support: whole-file streams
+        RangeHandler.ranges = False
+        dest = os.path.join(tmp, "no-ranges")
+        fetch(manifest, dest)
+        check("download without Range support", same_files(files, dest))
+        RangeHandler.ranges = True
+
+        # Local mirror directory
+        dest = os.path.join(tmp, "mirrored")
+        fetch(manifest, dest, mirror=served_dir)
+        check("local mirror directory", same_files(files, dest))
+
+        # HTTP mirror overrides the manifest URLs
+        broken = json.loads(json.dumps(manifest))
+        for entry in broken["models"]["test"]["files"]:
+            entry["url"] = "http://127.0.0.1:9/unreachable"
+        dest = os.path.join(tmp, "http-mirror")
+        fetch(broken, dest, mirror=base_url)
+        check("HTTP mirror", same_files(files, dest))
+
+        # A wrong hash is caught and nothing is moved into place
+        corrupt = json.loads(json.dumps(manifest))
+        corrupt["models"]["test"]["files"][0]["sha256"] = "0" * 64
+        dest = os.path.join(tmp, "corrupt")
+        try:
+            fetch(corrupt, dest)
+            caught = False
+        except download_models.ChecksumMismatch:
+            caught = True
+        bad_path = Path(dest) / corrupt["models"]["test"]["files"][0]["path"]
+        check("checksum mismatch rejected", caught and not bad_path.exists())
+
+        # Unpinned entries are flagged, including URLs that follow a branch
+        hf = {"url": "https://huggingface.co/org/model/resolve/main/config.json", "sha256": "0" * 64, "size": 1}
+        check("unpinned entries are refused",
+              download_models.unpinned_reason(dict(hf)) is not None
+              and download_models.unpinned_reason(dict(hf, url=hf["url"].replace("main", "a" * 40))) is None
+              and download_models.unpinned_reason(dict(hf, sha256=None)) is not None)
+
+        # --pin resolves a Hub revision to a commit and takes LFS hashes from the listing
+        commit = "b" * 40
+        hub = {"models": {"hf": {"repo": "org/model", "version": None, "files": [
+            {"path": "m/config.json", "url": "https://huggingface.co/org/model/resolve/main/config.json",
+             "sha256": None, "size": None},
+            {"path": "m/weights.bin", "url": "https://huggingface.co/org/model/resolve/main/weights.bin",
+             "sha256": None, "size": None}
+        ]}}}
+        listing = {"sha": commit, "siblings": [
+            {"rfilename": "config.json", "size": 20},
+            {"rfilename": "weights.bin", "size": 130, "lfs": {"sha256": "c" * 64, "size": 123}}
+        ]}
+        download_models.resolve_revisions(hub, session=FakeHub(listing))
+        model = hub["models"]["hf"]
+        check("pin resolves the revision",
+              model["version"] == commit
+              and all(f"/resolve/{commit}/" in entry["url"] for entry in model["files"])
+              and model["files"][0]["size"] == 20 and model["files"][0]["sha256"] is None
+              and (model["files"][1]["sha256"], model["files"][1]["size"]) == ("c" * 64, 123))
+
+        # --pin records hashes for entries without one
+        unpinned = json.loads(json.dumps(manifest))
+        for entry in unpinned["models"]["test"]["files"]:
+            entry["sha256"] = entry["size"] = None
+        manifest_path = os.path.join(tmp, "manifest.json")
+        dest = os.path.join(tmp, "pinned")
+        hashes = fetch(unpinned, dest)
+        download_models.pin(manifest_path, unpinned, hashes, dest)
+        pinned = json.load(open(manifest_path))["models"]["test"]["files"]
+        check("pin records hashes", [e["sha256"] for e in pinned] ==
+              [e["sha256"] for e in manifest["models"]["test"]["files"]])
+
+        server.shutdown()
+        shutil.rmtree(served_dir)
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Check that /api/stats/increment never loses updates across worker processes.
+
+Starts gunicorn on `run:app` with several workers against a throwaway SQLite
+database, fires concurrent increments for one user from many threads, then
+reads the totals straight from the database. Exits 1 if any increment was
+lost. Run from the repository root:
+
+    python -m src.scripts.check_increment_concurrency --workers 4 --threads 16 --requests 50
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not come up at {url}')
+
+
+def post(url, payload, user_id):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-User-Id': user_id}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='increments per thread')
+    args = parser.parse_args()
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    user_id = f'concurrency-{uuid.uuid4().hex[:8]}'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'learning_lab.db')
+        env = dict(os.environ, LEARNING_LAB_DB=db_path, AUDIO_WARMUP_ON_START='0')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'run:app'],
+            env=env
+        )
+        errors = []
+        try:
+            wait_for(f'{base}/api/stats?user_id=warmup')
+
+            def worker(index):
+                for i in range(args.requests):
+                    # Alternate counters so both columns see contention
+                    counter = 'topics_explored' if (index + i) % 2 else 'games_played'
+                    try:
+                        post(f'{base}/api/stats/increment', {counter: 1}, user_id)
+                    except Exception as e:
+                        errors.append(repr(e))
+
+            started = time.perf_counter()
+            pool = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+            for t in pool:
+                t.start()
+            for t in pool:
+                t.join()
+            seconds = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        with sqlite3.connect(db_path) as conn:
+            row = conn.execute(
+                'SELECT topics_explored, games_played FROM learning_stats WHERE user_id = ?',
+                (user_id,)
+            ).fetchone()
+
+    sent = args.threads * args.requests
+    expected = sent - len(errors)
+    stored = sum(row) if row else 0
+    print(f'workers={args.workers} threads={args.threads} sent={sent} failed={len(errors)} '
+          f'stored={stored} req/s={round(sent / seconds)}')
+    for error in errors[:5]:
+        print(f'  error: {error}')
+    if stored != expected:
+        print(f'LOST {expected - stored} increments')
+        sys.exit(1)
+    print('OK: no increments lost')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Build the pre-converted model artifacts listed in models/manifest.json.
+
+Each entry with a "build" section is made from its source entry: the
+weights are cast to the serving dtype and saved as safetensors next to the
+tokenizer, and the resulting files are pinned (sha256 and size) in the
+manifest under the source's version. Built entries ship with no version
+and no files, and the registry refuses them until this has run. At startup AIModel then only memory-maps these files.
+Run from the repository root after download_models.py:
+
+    python -m src.scripts.convert_model                 # every buildable entry
+    python -m src.scripts.convert_model opt-350m-bfloat16
+"""
+import argparse
+import shutil
+import sys
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from model_registry import ModelUnavailable, get_registry
+
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16}
+
+
+def convert(name):
+    registry = get_registry()
+    record = registry.get(name)
+    if not record.build:
+        raise ModelUnavailable(f"{name} is downloaded, not built")
+    source = registry.resolve(record.build["from"])
+
+    print(f"Building {name} ({record.build['dtype']}) from {source.name}...")
+    tokenizer = AutoTokenizer.from_pretrained(source.path, local_files_only=True)
+    model = AutoModelForCausalLM.from_pretrained(
+        source.path,
+        local_files_only=True,
+        low_cpu_mem_usage=True,
+        torch_dtype=DTYPES[record.build["dtype"]]
+    )
+
+    # Start clean so files from an older build can't linger in the manifest
+    shutil.rmtree(record.path, ignore_errors=True)
+    record.path.mkdir(parents=True)
+    tokenizer.save_pretrained(record.path)
+    # safetensors so the weights can be memory-mapped at load time
+    model.save_pretrained(record.path, safe_serialization=True)
+
+    paths = [p.relative_to(registry.models_dir) for p in record.path.rglob("*") if p.is_file()]
+    record = registry.record_files(name, paths, source.version)
+    print(f"Built {name}: {len(record.files)} files, {record.size / 1e6:.1f} MB")
+
+
+def main():
+    registry = get_registry()
+    buildable = [name for name in registry.names() if registry.get(name).build]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", choices=buildable, default=buildable, metavar="name")
+    args = parser.parse_args()
+
+    try:
+        for name in args.names:
+            convert(name)
+    except ModelUnavailable as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
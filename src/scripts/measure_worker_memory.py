@@ -0,0 +1,177 @@
+"""Total PSS of N workers: independent loads vs. preload-and-fork.
+
+Modes, each measured in a fresh process tree:
+  independent  N processes each import the app and load models themselves
+  fork         one parent loads everything and forks N workers
+  fork-freeze  as fork, with the prefork.py gc.disable()/gc.freeze() recipe
+
+Every worker serves a few requests and runs a full collection before being
+measured, since that is what un-shares copy-on-write pages. PSS splits
+shared pages between the processes mapping them, so the sums are
+comparable. Set AI_GENERATION=model to include the language model weights.
+Run from the repository root (Linux only, reads /proc):
+
+    python -m src.scripts.measure_worker_memory --workers 4
+    python -m src.scripts.measure_worker_memory --workers 4 --extra-objects 2000000 --output pss.json
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ('independent', 'fork', 'fork-freeze')
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_state(extra_objects):
+    """What a worker holds: the whole app plus preloaded handlers and data"""
+    import asgi
+    import prefork
+
+    prefork.preload()
+    # Stand-in for large Python-object state (e.g. tokenizer vocabularies)
+    # when the real models aren't available
+    ballast = [{'id': i, 'token': f'tok{i}'} for i in range(extra_objects)]
+    return asgi, ballast
+
+
+def work(flask_app, requests):
+    client = flask_app.test_client()
+    for i in range(requests):
+        client.get(f'/api/stats?user_id=mem-{os.getpid()}-{i % 5}')
+        client.get('/games/api/leaderboard/spelling-bee')
+    gc.collect()
+
+
+def run_independent(args):
+    children = [
+        subprocess.Popen(
+            [sys.executable, "-m", "src.scripts.measure_worker_memory", "--child",
+             "--extra-objects", str(args.extra_objects), "--requests", str(args.requests)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(args.workers)
+    ]
+    try:
+        for child in children:
+            while child.stdout.readline().strip() != "ready":
+                pass
+        workers = [pss_mb(child.pid) for child in children]
+    finally:
+        for child in children:
+            child.stdin.close()
+            child.wait()
+    return {'parent_mb': 0.0, 'workers_mb': workers}
+
+
+def run_fork(args, freeze):
+    import prefork
+
+    if freeze:
+        prefork.disable_gc()
+    asgi, ballast = load_state(args.extra_objects)
+    if freeze:
+        prefork.freeze()
+
+    ready_r, ready_w = os.pipe()
+    release_r, release_w = os.pipe()
+    pids = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(release_w)
+            prefork.reinit_worker(asgi.flask_app)
+            work(asgi.flask_app, args.requests)
+            os.write(ready_w, b"r")
+            os.read(release_r, 1)
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_w)
+    os.close(release_r)
+
+    received = 0
+    while received < args.workers:
+        received += len(os.read(ready_r, args.workers))
+    result = {'parent_mb': pss_mb(os.getpid()), 'workers_mb': [pss_mb(pid) for pid in pids]}
+    os.close(release_w)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    return result
+
+
+def measure(mode, args):
+    started = time.perf_counter()
+    if mode == 'independent':
+        result = run_independent(args)
+    else:
+        result = run_fork(args, freeze=(mode == 'fork-freeze'))
+    return {
+        'mode': mode,
+        'workers': args.workers,
+        'parent_mb': round(result['parent_mb'], 1),
+        'per_worker_mb': round(sum(result['workers_mb']) / len(result['workers_mb']), 1),
+        'total_pss_mb': round(result['parent_mb'] + sum(result['workers_mb']), 1),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=20, help="requests each worker serves before measuring")
+    parser.add_argument("--extra-objects", type=int, default=0,
+                        help="small Python objects added to the preloaded state")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # One independently loaded worker, held until the parent closes stdin
+        asgi, ballast = load_state(args.extra_objects)
+        work(asgi.flask_app, args.requests)
+        print("ready", flush=True)
+        sys.stdin.read()
+        return
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            env = dict(os.environ, LEARNING_LAB_DB=os.path.join(tmp, f"{mode}.db"))
+            output = subprocess.run(
+                [sys.executable, "-m", "src.scripts.measure_worker_memory", "--mode", mode,
+                 "--workers", str(args.workers), "--requests", str(args.requests),
+                 "--extra-objects", str(args.extra_objects)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<12} {'workers':>7} {'parent MB':>10} {'worker MB':>10} {'total PSS MB':>13}")
+    for r in results:
+        print(f"{r['mode']:<12} {r['workers']:>7} {r['parent_mb']:>10} "
+              f"{r['per_worker_mb']:>10} {r['total_pss_mb']:>13}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
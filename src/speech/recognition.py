@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from metrics import inference_seconds
+from model_registry import get_registry
+import asyncio
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Entry in models/manifest.json
+VOSK_MODEL = "vosk-small-en-us"
+SAMPLE_RATE = 16000
+
+
+class RecognizerBusy(Exception):
+    """Raised when every recognition session slot is taken"""
+
+
+class StreamingRecognizer:
+    """Offline speech recognition shared by every connection.
+
+    One Vosk model is loaded per process; each connection gets its own
+    KaldiRecognizer. Decoding runs on a small thread pool (Kaldi releases
+    the GIL), so many streams share the CPU without blocking the event loop.
+    """
+
+    def __init__(self, model_path: str = None, max_workers: int = None, max_sessions: int = None):
+        # Imported here so the app starts without vosk installed
+        from vosk import Model, SetLogLevel
+
+        SetLogLevel(-1)
+        self.model_path = model_path or os.environ.get('VOSK_MODEL_PATH')
+        if self.model_path is None:
+            self.model_path = str(get_registry().resolve(VOSK_MODEL).path)
+        elif not os.path.isdir(self.model_path):
+            raise FileNotFoundError(f"Vosk model not found at {self.model_path}")
+        self.model = Model(self.model_path)
+
+        self.max_workers = max_workers or int(os.environ.get('ASR_WORKERS', os.cpu_count() or 1))
+        self.max_sessions = max_sessions or int(os.environ.get('ASR_MAX_SESSIONS', self.max_workers * 8))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='asr')
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self.active = 0
+        logger.info(f"Speech recognizer loaded from {self.model_path} with {self.max_workers} workers")
+
+    def open(self, sample_rate: int = SAMPLE_RATE) -> "RecognitionSession":
+        from vosk import KaldiRecognizer
+
+        if not self._slots.acquire(blocking=False):
+            raise RecognizerBusy(f"{self.max_sessions} recognition sessions already open")
+        self.active += 1
+        return RecognitionSession(self, KaldiRecognizer(self.model, sample_rate))
+
+    def _release(self):
+        self.active -= 1
+        self._slots.release()
+
+
+class RecognitionSession:
+    """One audio stream: feed 16-bit mono PCM chunks, get transcript updates"""
+
+    def __init__(self, owner: StreamingRecognizer, recognizer):
+        self._owner = owner
+        self._recognizer = recognizer
+        self._last_partial = ""
+        self._closed = False
+
+    def _accept(self, pcm: bytes):
+        with inference_seconds.time(VOSK_MODEL, 'asr'):
+            is_final = self._recognizer.AcceptWaveform(pcm)
+        if is_final:
+            self._last_partial = ""
+            return {"type": "final", "text": json.loads(self._recognizer.Result()).get("text", "")}
+        partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        # Only changes are worth a message
+        if partial == self._last_partial:
+            return None
+        self._last_partial = partial
+        return {"type": "partial", "text": partial}
+
+    def _finish(self):
+        return {"type": "final", "text": json.loads(self._recognizer.FinalResult()).get("text", "")}
+
+    async def feed(self, pcm: bytes):
+        """Decode a chunk; returns a partial/final update or None"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._owner._executor, self._accept, pcm)
+
+    async def finish(self):
+        """Flush the decoder and return the last final transcript"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._owner._executor, self._finish)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._owner._release()
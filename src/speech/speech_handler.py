@@ -1,55 +1,198 @@
-from TTS.api import TTS
-import sounddevice as sd
+from audio_cache import audio_cache, cache_key
+from tts_stream import split_sentences, synthesize_pipeline_async
+from metrics import tts_seconds, tts_text_length
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
+import numpy as np
+import asyncio
+import io
 import logging
+import os
+import struct
+import threading
+import wave
+import weakref
 
 logger = logging.getLogger(__name__)
 
+TTS_MODEL_NAME = "tts_models/en/ljspeech/tacotron2-DDC"
+
+
+class SpeechQueueFull(Exception):
+    """Raised when more utterances are waiting than the handler accepts"""
+
+
+def encode_wav(samples, sample_rate: int) -> bytes:
+    """Encode float samples in [-1, 1] as 16-bit mono WAV"""
+    pcm = (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """WAV header for a 16-bit mono stream of unknown length.
+
+    The RIFF and data sizes are set to 0xFFFFFFFF, which players treat as
+    "read until the connection closes".
+    """
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', 0xFFFFFFFF
+    )
+
+
+def wav_frames(data: bytes) -> bytes:
+    """Strip the header from a WAV clip and return its PCM frames"""
+    with wave.open(io.BytesIO(data), 'rb') as wav_file:
+        return wav_file.readframes(wav_file.getnframes())
+
+
 class SpeechHandler:
-    def __init__(self):
+    def __init__(self, max_workers: int = None, max_pending: int = None):
         try:
-            # Initialize TTS with a basic model that's easier to download
-            self.tts = TTS(
-                model_name="tts_models/en/ljspeech/tacotron2-DDC",
-                progress_bar=True,  # Show download progress
-                gpu=False
-            )
-            
+            # Coqui models keep decoder state on the module, so each synthesis
+            # thread gets its own instance; this one serves the first worker.
+            self._local = threading.local()
+            self.tts = self._load_tts(progress_bar=True)
+            self.sample_rate = getattr(self.tts.synthesizer, 'output_sample_rate', 22050)
+
+            self.max_workers = max_workers or int(
+                os.environ.get('TTS_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+            self.max_pending = max_pending or int(
+                os.environ.get('TTS_MAX_PENDING', self.max_workers * 4))
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tts')
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+            self._claimed_first = False
+            self._claim_lock = threading.Lock()
+
             # Initialize speech recognition
             self.recognizer = sr.Recognizer()
-            
-            logger.info("Speech handler initialized successfully")
-            
+
+            logger.info(f"Speech handler initialized with {self.max_workers} synthesis workers")
+
         except Exception as e:
             logger.error(f"Error initializing TTS: {str(e)}")
             raise
 
-    async def speak(self, text: str):
-        """Text to speech function using Coqui TTS"""
+    def _load_tts(self, progress_bar: bool = False):
+        # Imported here: pulling in Coqui (and torch) takes seconds
+        from TTS.api import TTS
+        return TTS(
+            model_name=TTS_MODEL_NAME,
+            progress_bar=progress_bar,  # Show download progress
+            gpu=False
+        )
+
+    def _worker_tts(self):
+        tts = getattr(self._local, 'tts', None)
+        if tts is None:
+            with self._claim_lock:
+                if not self._claimed_first:
+                    self._claimed_first = True
+                    tts = self.tts
+            if tts is None:
+                tts = self._load_tts()
+            self._local.tts = tts
+        return tts
+
+    def synthesize(self, text: str) -> bytes:
+        """Blocking synthesis of `text` to WAV bytes; runs on the worker pool"""
+        tts = self._worker_tts()
+        tts_text_length.observe(len(text), 'coqui')
+        with tts_seconds.time('coqui'):
+            wav = tts.tts(text=text)
+        return encode_wav(wav, self.sample_rate)
+
+    async def speak(self, text: str) -> bytes:
+        """Text to speech function using Coqui TTS; returns WAV bytes"""
+        key = cache_key(text, 'en', False, 'coqui')
+        cached = audio_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if not self._slots.acquire(blocking=False):
+            raise SpeechQueueFull(f"{self.max_pending} utterances already queued")
         try:
             logger.info(f"Generating speech for: {text}")
-            
-            # Generate speech
-            wav = self.tts.tts(text=text)
-            
-            # Play audio using sounddevice
-            sd.play(wav, samplerate=22050)
-            sd.wait()  # Wait until audio is finished playing
-            
-            logger.info("Speech completed successfully")
-            
+            loop = asyncio.get_running_loop()
+            audio = await loop.run_in_executor(
+                self._executor,
+                audio_cache.get_or_create,
+                key,
+                lambda: self.synthesize(text)
+            )
+            logger.info("Speech generated successfully")
+            return audio
         except Exception as e:
             logger.error(f"Error in speak: {str(e)}")
             raise
+        finally:
+            self._slots.release()
+
+    def speak_stream(self, text: str):
+        """Stream WAV audio for `text` one sentence at a time.
+
+        Returns an async iterator of chunks: a streaming WAV header followed
+        by each sentence's PCM frames as soon as it is synthesized (cached
+        sentences are sent immediately). Holds one queue slot until the
+        stream finishes or the iterator is discarded, even if it is never
+        started.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise SpeechQueueFull(f"{self.max_pending} utterances already queued")
+        released = threading.Lock()
+
+        def release():
+            # Called from the stream's finally and when it is garbage
+            # collected; only the first call frees the slot
+            if released.acquire(blocking=False):
+                self._slots.release()
+
+        async def chunks():
+            try:
+                yield wav_stream_header(self.sample_rate)
+                clips = synthesize_pipeline_async(
+                    split_sentences(text),
+                    audio_cache,
+                    lambda sentence: cache_key(sentence, 'en', False, 'coqui'),
+                    self.synthesize,
+                    self._executor
+                )
+                async for clip in clips:
+                    yield wav_frames(clip)
+            except Exception as e:
+                logger.error(f"Error in speak_stream: {str(e)}")
+                raise
+            finally:
+                release()
+
+        stream = chunks()
+        # An iterator that never starts never reaches its finally
+        weakref.finalize(stream, release)
+        return stream
+
+    def _listen(self, duration: int) -> str:
+        with sr.Microphone() as source:
+            self.recognizer.adjust_for_ambient_noise(source)
+            audio = self.recognizer.listen(source, timeout=duration)
+            return self.recognizer.recognize_google(audio)
 
     async def listen(self, duration: int = 7) -> str:
-        """Speech to text function"""
+        """Speech to text from the server's microphone.
+
+        Browsers should use the /listen/stream WebSocket instead, which is
+        offline and incremental. This runs on a thread so the event loop
+        isn't blocked while it records.
+        """
         try:
-            with sr.Microphone() as source:
-                self.recognizer.adjust_for_ambient_noise(source)
-                audio = self.recognizer.listen(source, timeout=duration)
-                text = self.recognizer.recognize_google(audio)
-                return text
+            return await asyncio.to_thread(self._listen, duration)
         except Exception as e:
             logger.error(f"Error in listen: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
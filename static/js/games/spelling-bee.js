@@ -11,6 +11,30 @@ document.addEventListener('DOMContentLoaded', function() {
     ];
 
     let currentWord = null;
+    // Object URLs for clips fetched in one batch, keyed by word
+    const wordAudio = {};
+
+    async function preloadWordAudio() {
+        try {
+            const response = await fetch('/api/audio/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ texts: words.map(w => w.word) })
+            });
+            if (!response.ok) return;
+
+            const form = await response.formData();
+            const index = JSON.parse(form.get('index'));
+            index.forEach(clip => {
+                if (clip.part !== null) {
+                    wordAudio[clip.text] = URL.createObjectURL(form.get(clip.part));
+                }
+            });
+        } catch (error) {
+            // Fall back to fetching each word on demand
+            console.error('Error preloading word audio:', error);
+        }
+    }
 
     function newSpellingWord() {
         currentWord = words[Math.floor(Math.random() * words.length)];
@@ -21,8 +45,8 @@ document.addEventListener('DOMContentLoaded', function() {
     function speakWord() {
         if (!currentWord) return;
         
-        // Use the gTTS endpoint
-        const audioUrl = `/get_word_audio/${currentWord.word}`;
+        // Use the preloaded clip, or the gTTS endpoint if it isn't loaded yet
+        const audioUrl = wordAudio[currentWord.word] || `/get_word_audio/${currentWord.word}`;
         const audio = new Audio(audioUrl);
         audio.play().catch(error => {
             console.error('Error playing audio:', error);
@@ -50,6 +74,8 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    preloadWordAudio();
+
     window.newSpellingWord = newSpellingWord;
     window.speakWord = speakWord;
     window.checkSpelling = checkSpelling;
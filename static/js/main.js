@@ -332,6 +332,13 @@ const gameStyle = document.createElement('style');
 gameStyle.textContent = gameCSS;
 document.head.appendChild(gameStyle);
 
+// Play speech for text as it streams in, sentence by sentence
+async function playSpeech(text) {
+    const audio = new Audio(`/api/speak/stream?text=${encodeURIComponent(text)}`);
+    await audio.play();
+    return audio;
+}
+
 // Function to handle preset topic buttons
 async function askPresetQuestion(question) {
     const responseDiv = document.getElementById('fun-facts-response');
@@ -364,8 +371,7 @@ async function askPresetQuestion(question) {
         const data = await response.json();
 
         // Track topic exploration
-        learningStats.topicsExplored++;
-        learningStats.saveToServer();
+        learningStats.increment({ topics_explored: 1 });
         learningStats.addActivity({
             type: 'topic',
             description: `Learned about ${question.replace('Tell me about ', '')}`
@@ -388,21 +394,7 @@ async function askPresetQuestion(question) {
 
         // Speak the response
         try {
-            const speakResponse = await fetch('/api/speak', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ text: data.response })
-            });
-
-            if (!speakResponse.ok) {
-                throw new Error(`HTTP error! status: ${speakResponse.status}`);
-            }
-
-            const blob = await speakResponse.blob();
-            const audio = new Audio(URL.createObjectURL(blob));
-            await audio.play();
+            await playSpeech(data.response);
 
             // Update display after speaking
             responseDiv.innerHTML = `
@@ -462,19 +454,93 @@ async function askQuestion() {
         responseDiv.textContent = data.response;
         
         // Speak the response
-        await fetch('/api/speak', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ text: data.response }),
-        });
+        await playSpeech(data.response);
     } catch (error) {
         console.error('Error:', error);
         responseDiv.textContent = 'Sorry, something went wrong! 😕';
     }
 }
 
+// Stream microphone audio to the offline recognizer and resolve with the
+// transcript; onPartial is called with the words heard so far
+function recognizeSpeech(stream, maxSeconds, onPartial) {
+    return new Promise((resolve, reject) => {
+        const sampleRate = 16000;
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/api/ai/listen/stream?sample_rate=${sampleRate}`);
+        socket.binaryType = 'arraybuffer';
+
+        // The browser resamples the microphone to 16 kHz for us
+        const context = new AudioContext({ sampleRate });
+        const source = context.createMediaStreamSource(stream);
+        // 2048 samples = 128 ms per chunk, small enough for quick partials
+        const processor = context.createScriptProcessor(2048, 1, 1);
+        const finals = [];
+        let stopped = false;
+        let timer = null;
+
+        const stop = () => {
+            if (stopped) {
+                return;
+            }
+            stopped = true;
+            clearTimeout(timer);
+            processor.disconnect();
+            source.disconnect();
+            context.close();
+            if (socket.readyState === WebSocket.OPEN) {
+                socket.send('end');
+            }
+        };
+
+        processor.onaudioprocess = (event) => {
+            if (stopped || socket.readyState !== WebSocket.OPEN) {
+                return;
+            }
+            const samples = event.inputBuffer.getChannelData(0);
+            const pcm = new Int16Array(samples.length);
+            for (let i = 0; i < samples.length; i++) {
+                const s = Math.max(-1, Math.min(1, samples[i]));
+                pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+            }
+            socket.send(pcm.buffer);
+        };
+
+        socket.onopen = () => {
+            source.connect(processor);
+            processor.connect(context.destination);
+            timer = setTimeout(stop, maxSeconds * 1000);
+        };
+
+        socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'partial') {
+                onPartial([...finals, message.text].join(' ').trim());
+            } else if (message.type === 'final') {
+                if (message.text) {
+                    finals.push(message.text);
+                    onPartial(finals.join(' '));
+                    // The recognizer detected the end of an utterance
+                    stop();
+                }
+            } else if (message.type === 'error') {
+                stop();
+                reject(new Error(message.error));
+            }
+        };
+
+        socket.onerror = () => {
+            stop();
+            reject(new Error('Speech recognition connection failed'));
+        };
+
+        socket.onclose = () => {
+            stop();
+            resolve(finals.join(' ').trim());
+        };
+    });
+}
+
 async function startListening() {
     const responseDiv = document.getElementById('response');
     
@@ -494,6 +560,7 @@ async function startListening() {
                 <div>
                     <div class="font-bold">Recording...</div>
                     <div class="text-sm">Please speak now! I'm listening...</div>
+                    <div id="partial-transcript" class="text-sm italic"></div>
                     <div class="flex space-x-1 mt-1">
                         <div class="w-2 h-2 bg-red-500 rounded-full animate-bounce"></div>
                         <div class="w-2 h-2 bg-red-500 rounded-full animate-bounce" style="animation-delay: 0.2s"></div>
@@ -503,11 +570,13 @@ async function startListening() {
             </div>
         `;
 
-        const response = await fetch('/api/listen', {
-            method: 'POST',
+        const text = await recognizeSpeech(window.audioStream, 7, (partial) => {
+            const partialDiv = document.getElementById('partial-transcript');
+            if (partialDiv) {
+                partialDiv.textContent = partial;
+            }
         });
-        
-        const data = await response.json();
+        const data = text ? { text, status: 'success' } : { text: '', status: 'no_speech_detected' };
         
         if (data.status === 'no_speech_detected') {
             responseDiv.innerHTML = `
@@ -586,13 +655,7 @@ async function startListening() {
             `;
             
             // Speak the response
-            await fetch('/api/speak', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ text: aiData.response }),
-            });
+            await playSpeech(aiData.response);
             
             // Show completion state
             responseDiv.innerHTML = `
@@ -1221,6 +1284,13 @@ function initializeView(viewId) {
     }
 }
 
+// Fingerprinted URL for a file under static/; the manifest is injected
+// into the page by assets.py (absent with ASSETS_FINGERPRINT=0)
+function assetUrl(path) {
+    const manifest = window.ASSET_MANIFEST || {};
+    return manifest[path] || `/static/${path}`;
+}
+
 // Load required scripts dynamically
 function loadScript(src) {
     return new Promise((resolve, reject) => {
@@ -1235,12 +1305,12 @@ function loadScript(src) {
 async function initializeGames() {
     try {
         await Promise.all([
-            loadScript('/static/js/games/tic-tac-toe.js'),
-            loadScript('/static/js/games/word-scramble.js'),
-            loadScript('/static/js/games/math-quiz.js'),
-            loadScript('/static/js/games/memory-match.js'),
-            loadScript('/static/js/games/spelling-bee.js'),
-            loadScript('/static/js/games/animal-quiz.js')
+            loadScript(assetUrl('js/games/tic-tac-toe.js')),
+            loadScript(assetUrl('js/games/word-scramble.js')),
+            loadScript(assetUrl('js/games/math-quiz.js')),
+            loadScript(assetUrl('js/games/memory-match.js')),
+            loadScript(assetUrl('js/games/spelling-bee.js')),
+            loadScript(assetUrl('js/games/animal-quiz.js'))
         ]);
         
         // Initialize each game
@@ -1287,8 +1357,7 @@ function checkWord() {
         resultElement.className += ' text-green-600';
         resultElement.textContent = '🎉 Correct! Well done!';
         // Track game completion
-        learningStats.gamesPlayed++;
-        learningStats.saveToServer();
+        learningStats.increment({ games_played: 1 });
         learningStats.addActivity({
             type: 'game',
             description: 'Completed Word Scramble!'
@@ -1333,8 +1402,7 @@ function checkMathAnswer() {
         resultElement.className += ' text-green-600';
         resultElement.textContent = '🎉 Correct! Great job!';
         // Track game completion
-        learningStats.gamesPlayed++;
-        learningStats.saveToServer();
+        learningStats.increment({ games_played: 1 });
         learningStats.addActivity({
             type: 'game',
             description: 'Solved Math Problem!'
@@ -1610,24 +1678,20 @@ const learningStats = {
         }
     },
     
-    async saveToServer() {
+    async increment(deltas) {
+        // Show the change right away; the server applies the same deltas
+        // atomically and sends back the authoritative totals
+        this.topicsExplored += deltas.topics_explored || 0;
+        this.gamesPlayed += deltas.games_played || 0;
+        this.updateDisplay();
+
         try {
-            console.log('Saving stats:', {
-                topics_explored: this.topicsExplored,
-                games_played: this.gamesPlayed,
-                update_streak: true  // Add this flag to trigger streak update
-            });
-            
-            const response = await fetch('/api/stats/update', {
+            const response = await fetch('/api/stats/increment', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    topics_explored: this.topicsExplored,
-                    games_played: this.gamesPlayed,
-                    update_streak: true  // Add this to the request
-                })
+                body: JSON.stringify(deltas)
             });
             
             if (!response.ok) {
@@ -1636,14 +1700,12 @@ const learningStats = {
             }
             
             const stats = await response.json();
-            console.log('Received updated stats:', stats);
-            this.updateFromStats(stats);
+            this.topicsExplored = stats.topics_explored;
+            this.gamesPlayed = stats.games_played;
+            this.streakDays = stats.streak_days;
+            this.updateDisplay();
         } catch (error) {
             console.error('Error saving stats:', error);
-            console.error('Full error details:', {
-                message: error.message,
-                stack: error.stack
-            });
         }
     },
     
@@ -1651,25 +1713,27 @@ const learningStats = {
         try {
             console.log('Adding activity:', activity);
             
-            const response = await fetch('/api/stats/update', {
+            const entry = {
+                type: activity.type,
+                description: activity.description,
+                timestamp: new Date().toISOString()
+            };
+
+            // Queued server-side and written in the background
+            const response = await fetch('/api/stats/ingest', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ activity: {
-                    type: activity.type,
-                    description: activity.description,
-                    timestamp: new Date().toISOString()
-                }})
+                body: JSON.stringify({ activity: entry })
             });
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const stats = await response.json();
-            console.log('Received updated stats after activity:', stats);
-            this.updateFromStats(stats);
+            this.activities = [entry, ...this.activities].slice(0, 10);
+            this.updateDisplay();
         } catch (error) {
             console.error('Error adding activity:', error);
             alert('Failed to save activity. Please try again.');
@@ -2773,7 +2837,7 @@ function displayResults(matches) {
 // View loading system
 async function loadView(viewName) {
     try {
-        const response = await fetch(`/static/views/${viewName}.html`);
+        const response = await fetch(assetUrl(`views/${viewName}.html`));
         if (!response.ok) {
             throw new Error(`Failed to load ${viewName} view`);
         }
@@ -0,0 +1,85 @@
+from flask import jsonify, request
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import threading
+import time
+
+
+class StatsCache:
+    """Per-user cache of the /api/stats payload.
+
+    Writes in this process update or drop the entry directly. Entries also
+    expire after `max_age` seconds, which bounds staleness from writes made
+    by other worker processes.
+    """
+
+    def __init__(self, max_users=10000, max_age=60.0):
+        self.max_users = max_users
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_users = app.config.get('STATS_CACHE_USERS', self.max_users)
+        self.max_age = app.config.get('STATS_CACHE_MAX_AGE', self.max_age)
+        app.extensions['stats_cache'] = self
+
+    def get(self, user_id, today):
+        """The cached entry for `user_id` if its streak was already checked
+        `today` and it hasn't expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if (entry is None or entry['streak_checked'] != today
+                    or time.monotonic() - entry['stored'] > self.max_age):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def set(self, user_id, payload, streak_checked):
+        body = json.dumps(payload, sort_keys=True)
+        entry = {
+            'payload': payload,
+            'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            'last_modified': datetime.utcnow().replace(microsecond=0),
+            'streak_checked': streak_checked,
+            'stored': time.monotonic()
+        }
+        with self._lock:
+            previous = self._entries.get(user_id)
+            # Unchanged payload keeps its validators so clients still get 304
+            if previous is not None and previous['etag'] == entry['etag']:
+                entry['last_modified'] = previous['last_modified']
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'users': len(self._entries)}
+
+
+stats_cache = StatsCache()
+
+
+def stats_response(entry):
+    """JSON response for a cache entry, answering 304 when the client's copy is current"""
+    response = jsonify(entry['payload'])
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    # Let the browser keep a copy but revalidate it on every load
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response.make_conditional(request)
@@ -0,0 +1,89 @@
+import atexit
+
+from ingest import WriteBehindQueue
+
+
+class FlakyWriter:
+    """Fails any batch containing a bad item, or every batch until `healthy`"""
+
+    def __init__(self, bad=(), healthy=True):
+        self.bad = set(bad)
+        self.healthy = healthy
+        self.written = []
+        self.calls = 0
+
+    def __call__(self, items):
+        self.calls += 1
+        if not self.healthy or self.bad.intersection(items):
+            raise RuntimeError('write failed')
+        self.written.extend(items)
+
+
+def make_queue(writer, **kwargs):
+    # A long delay keeps the background thread out of the way; tests flush
+    queue = WriteBehindQueue(writer, max_items=1000, max_delay=3600, **kwargs)
+    atexit.unregister(queue.flush)
+    return queue
+
+
+def test_flush_writes_batch_once():
+    writer = FlakyWriter()
+    queue = make_queue(writer)
+    for item in range(5):
+        assert queue.put(item)
+
+    assert queue.flush() == 5
+    assert writer.written == [0, 1, 2, 3, 4]
+    assert writer.calls == 1
+    assert queue.stats()['pending'] == 0
+    assert queue.flush() == 0
+
+
+def test_bad_item_does_not_hold_back_the_batch():
+    writer = FlakyWriter(bad={'bad'})
+    queue = make_queue(writer, max_attempts=3)
+    for item in ('a', 'bad', 'b'):
+        queue.put(item)
+
+    assert queue.flush() == 2
+    assert writer.written == ['a', 'b']
+    assert queue.failures == 1
+    assert queue.stats()['pending'] == 1
+
+    # The bad item is retried alone until it runs out of attempts
+    queue.flush()
+    queue.flush()
+    assert queue.dropped == 1
+    assert list(queue.dead_letters) == ['bad']
+    assert queue.stats()['pending'] == 0
+    assert writer.written == ['a', 'b']
+
+
+def test_failed_items_are_retried_before_new_ones():
+    writer = FlakyWriter(healthy=False)
+    queue = make_queue(writer)
+    queue.put('first')
+    queue.put('second')
+
+    assert queue.flush() == 0
+    assert queue.stats()['pending'] == 2
+
+    writer.healthy = True
+    queue.put('third')
+    assert queue.flush() == 3
+    assert writer.written == ['first', 'second', 'third']
+    assert queue.dropped == 0
+
+
+def test_put_refuses_when_full():
+    writer = FlakyWriter(healthy=False)
+    queue = make_queue(writer, max_pending=2)
+    assert queue.put(1)
+    assert queue.put(2)
+    assert not queue.put(3)
+    assert queue.rejected == 1
+
+    # Items waiting for a retry still count against the limit
+    queue.flush()
+    assert not queue.put(4)
+    assert queue.rejected == 2
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from life import HashLife, LifeTooComplex, step_board
+
+GLIDER = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+R_PENTOMINO = [(0, 1), (0, 2), (1, 0), (1, 1), (2, 1)]
+
+
+def dense_cells(cells, generations, margin):
+    """Step `cells` on an unwrapped board wide enough that nothing reaches the edge"""
+    size = 2 * margin
+    board = np.zeros((size, size), dtype=bool)
+    for row, col in cells:
+        board[row + margin, col + margin] = True
+    board = step_board(board, generations, wrap=False)
+    assert not (board[0].any() or board[-1].any() or board[:, 0].any() or board[:, -1].any())
+    return {(int(row) - margin, int(col) - margin) for row, col in zip(*np.nonzero(board))}
+
+
+@pytest.mark.parametrize('cells', [GLIDER, R_PENTOMINO])
+@pytest.mark.parametrize('generations', [1, 2, 3, 7, 16, 45, 100])
+def test_hashlife_matches_dense(cells, generations):
+    universe = HashLife(cells)
+    universe.step(generations)
+    assert set(universe.cells()) == dense_cells(cells, generations, margin=128)
+    assert universe.generation == generations
+
+
+def test_hashlife_matches_dense_across_steps():
+    soup = np.random.default_rng(0).random((16, 16)) < 0.5
+    cells = [(int(row), int(col)) for row, col in zip(*np.nonzero(soup))]
+    universe = HashLife(cells)
+    total = 0
+    for generations in (1, 5, 10, 32):
+        universe.step(generations)
+        total += generations
+        assert set(universe.cells()) == dense_cells(cells, total, margin=128)
+
+
+def test_wrapped_glider_returns_home():
+    board = np.zeros((8, 8), dtype=bool)
+    for row, col in GLIDER:
+        board[row, col] = True
+    # A glider moves one cell diagonally every 4 generations
+    assert np.array_equal(step_board(board, 32), board)
+
+
+def test_hashlife_node_limit():
+    with pytest.raises(LifeTooComplex):
+        HashLife(R_PENTOMINO, max_nodes=50).step(1000)
@@ -0,0 +1,117 @@
+from flask import Response, stream_with_context
+from audio_cache import audio_cache, cache_key, synthesize_gtts
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import re
+import threading
+
+# A sentence runs up to ., ! or ? (plus any closing quotes) or a line break
+_SENTENCE = re.compile(r'[^.!?\n]+(?:[.!?]+["\')\]]*)?|[.!?]+')
+
+DEFAULT_LOOKAHEAD = 2
+DEFAULT_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def split_sentences(text):
+    """Split text into sentences for incremental synthesis"""
+    return [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+
+
+def _fill(queue, sentences, cache, key_fn, submit, lookahead, in_flight):
+    # Queue cached clips as-is and start synthesis for misses until
+    # `lookahead` syntheses are in flight
+    if in_flight >= lookahead:
+        return in_flight
+    for sentence in sentences:
+        key = key_fn(sentence)
+        data = cache.get(key)
+        if data is not None:
+            queue.append(data)
+            continue
+        queue.append(submit(key, sentence))
+        in_flight += 1
+        if in_flight >= lookahead:
+            break
+    return in_flight
+
+
+def synthesize_pipeline(sentences, cache, key_fn, synthesize, executor, lookahead=DEFAULT_LOOKAHEAD):
+    """Yield audio for `sentences` in order as each clip becomes ready.
+
+    Cached sentences are yielded as soon as everything before them has been
+    sent; misses are synthesized on `executor` with at most `lookahead` in
+    flight, so the first sentence is never stuck behind the last.
+    """
+    queue = deque()
+    sentences = iter(sentences)
+    in_flight = 0
+
+    def submit(key, sentence):
+        return executor.submit(cache.get_or_create, key, lambda: synthesize(sentence))
+
+    try:
+        while True:
+            in_flight = _fill(queue, sentences, cache, key_fn, submit, lookahead, in_flight)
+            if not queue:
+                return
+            item = queue.popleft()
+            if isinstance(item, Future):
+                item = item.result()
+                in_flight -= 1
+            yield item
+    finally:
+        # The client went away or synthesis failed: drop work not yet started
+        for item in queue:
+            if isinstance(item, Future):
+                item.cancel()
+
+
+async def synthesize_pipeline_async(sentences, cache, key_fn, synthesize, executor,
+                                    lookahead=DEFAULT_LOOKAHEAD):
+    """Async counterpart of `synthesize_pipeline` for the FastAPI app"""
+    loop = asyncio.get_running_loop()
+    queue = deque()
+    sentences = iter(sentences)
+    in_flight = 0
+
+    def submit(key, sentence):
+        return loop.run_in_executor(executor, cache.get_or_create, key, lambda: synthesize(sentence))
+
+    try:
+        while True:
+            in_flight = _fill(queue, sentences, cache, key_fn, submit, lookahead, in_flight)
+            if not queue:
+                return
+            item = queue.popleft()
+            if isinstance(item, asyncio.Future):
+                item = await item
+                in_flight -= 1
+            yield item
+    finally:
+        for item in queue:
+            if isinstance(item, asyncio.Future):
+                item.cancel()
+
+
+def _gtts_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS, thread_name_prefix='tts-stream')
+        return _executor
+
+
+def speech_stream_response(text, lang='en', slow=False):
+    """Stream gTTS audio for `text` sentence by sentence as a chunked MP3 response"""
+    chunks = synthesize_pipeline(
+        split_sentences(text),
+        audio_cache,
+        lambda sentence: cache_key(sentence, lang, slow, 'gtts'),
+        lambda sentence: synthesize_gtts(sentence, lang, slow),
+        _gtts_executor()
+    )
+    return Response(stream_with_context(chunks), mimetype='audio/mpeg')